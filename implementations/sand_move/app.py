@@ -0,0 +1,550 @@
+import pyglet
+from pyglet.window import key, mouse
+import implementations.sand_move.camera as cam
+from OpenGL import GL
+import numpy as np
+import os
+from pathlib import Path
+from utils.load_pipeline import load_pipeline
+from utils.elementos import rectangulo, cubo_unitario
+from utils.gpu_timer import GPUTimer
+from utils.tracing import tracer
+from utils.gl_utils import SSBO, AsyncReadback, RenderingInstance, setInstanceArrayAttribute, setInstanceArrayIAttribute
+from implementations.sand_move.terreno import N, top_sand_height, generar_datos_iniciales
+from implementations.sand_move.surface_mesh import SurfaceMeshRenderer
+from implementations.sand_move.terrain_lod import TerrainLODRenderer
+from implementations.sand_move.gpu_sim import GPUSandSimulation, CASCADE_MODES, SHADOW_MODES
+from implementations.sand_move.scheduler import FixedStepScheduler
+from implementations.sand_move.recorder import SandRecorder
+import ctypes
+import time
+
+import imgui
+from imgui.integrations.pyglet import create_renderer
+
+# --- CONFIGURACIÓN GLOBAL ---
+w_width = 1920
+w_height = 1080
+group_size_x = 32
+group_size_y = 32
+
+# Parámetros iniciales (el tamaño N y las alturas del terreno están en terreno.py)
+max_steps = 10 
+cell_size_m = 1.0
+h_max = 24
+kb = 0.1
+slope_deg_thresh = 55.0
+sand_transport_block_count = 2
+repose_angle = 33.0
+transfer_rate = 0.25
+cascade_iterations = 10
+
+# Cascada adaptativa: corta cuando una iteración mueve <= tolerancia slabs
+# (cascade_iterations pasa a ser el máximo)
+usar_cascada_adaptativa = True
+cascade_tolerance = 0
+# Iteraciones entre lecturas de los contadores (cada lectura espera a la GPU)
+cascade_check_interval = 4
+
+# Kernel de cascada (índice en CASCADE_MODES): atómico o por tiles en memoria
+# compartida con varias sub-iteraciones por dispatch
+cascade_mode = 0
+cascade_sub_iterations = 4
+
+# Pasos entre recálculos de las alturas suavizadas H_50 y H_200 (desvío del viento)
+smoothing_interval = 1
+
+# Sombra de viento (índice en SHADOW_MODES): marcha de R_s pasos o barridos de
+# horizonte sin límite de alcance (no disponible con usar_tiles_activos)
+shadow_mode = 0
+
+# Muestreo de la arena a la CPU después de cada paso (lectura asíncrona, con
+# unos frames de retraso y sin detener el render). El bedrock no cambia
+# durante la simulación, así que basta con la arena.
+muestrear_arena = False
+readback_ring_size = 3
+
+# Tiempos de GPU por etapa (timestamp queries) y CSV de exportación
+medir_gpu = True
+gpu_timer_csv = "gpu_timings.csv"
+
+# Traza de CPU en formato Chrome (chrome://tracing / Perfetto). Con la variable
+# de entorno SAND_MOVE_TRACE=<archivo> se graba desde el inicio y se exporta al cerrar.
+trace_path = os.environ.get("SAND_MOVE_TRACE", "sand_move_trace.json")
+
+# Checkpoint: estado completo (arena, bedrock, obstáculos, viento y máscaras) y
+# parámetros en un archivo, para pausar y retomar corridas largas
+checkpoint_path = "sand_move.sandckpt"
+checkpoint_comprimido = True
+
+# Grabación de la arena cada `grabar_cada` pasos (lectura asíncrona + escritor en
+# un hilo de fondo). Si el escritor no da abasto los frames se descartan en vez
+# de frenar la simulación.
+grabar_cada = 10
+grabacion_dir = "sand_move_recording"
+grabacion_cola = 8
+
+# Viento, sombra y máscaras en un solo dispatch (wind_fused_compute.glsl)
+usar_viento_fusionado = True
+
+# Estado en el layout compacto (shaders/cell_state.glsl, ~16 bytes por celda en
+# vez de 40). Se fija al crear la simulación; obliga a usar el viento fusionado.
+usar_estado_compacto = False
+
+# Procesar solo los tiles donde se mueve arena (shaders/sparse_tiles.glsl). Se
+# fija al crear la simulación; obliga a usar el viento fusionado.
+usar_tiles_activos = False
+
+# Pasos de simulación por segundo (tasa fija, independiente del render). Si va
+# atrasada se hacen varios pasos por tick, hasta max_pasos_por_tick.
+steps_per_second = 1.0
+sin_limite_pasos = False
+max_pasos_por_tick = 8
+sim_tick_interval = 1/120.0
+
+# Modo de render: cubos instanciados, malla de superficie o chunks con LOD
+RENDER_MODES = ["Cubos instanciados", "Malla de superficie", "LOD por chunks"]
+render_mode = 1
+
+# LOD por chunks: tamaño del chunk (celdas por lado) y distancia de subdivisión
+# (en múltiplos del tamaño del nodo)
+lod_chunk_size = 64
+lod_distance = 2.0
+
+# Luces
+lightDir = np.array([1.0, -1.0, 0.0], dtype=np.float32) * (1.0/(2.0**(1.0/2.0)))
+lightColor = np.array([1.0, 1.0, 1.0], dtype=np.float32)
+
+def setCameraUniforms(c_camera, pipeline):
+    pipeline["camPos"] = c_camera.get_pos()
+    pipeline["projection"] = c_camera.get_perspective().reshape(16, 1, order="F")
+    pipeline["view"] = c_camera.get_view().reshape(16, 1, order="F")
+    pipeline["model"] = c_camera.get_model().reshape(16, 1, order="F")
+
+def run():
+    global transfer_rate, repose_angle, max_steps, sand_transport_block_count, kb, render_mode
+
+    # Generamos datos iniciales (para setup de ventana)
+    model_matrices_init, sand_slabs_init, bedrock_slabs_init, obstacles_data_init = generar_datos_iniciales()
+    camera = cam.Camera(w_width, w_height)
+
+    # --- SETUP PYGLET ---
+    config = pyglet.gl.Config(
+        major_version=4, 
+        minor_version=5, 
+        depth_size=24, 
+        double_buffer=True
+    )
+
+    window = pyglet.window.Window(width=w_width, height=w_height, caption="Sand Dunes Simulations", resizable=True, config=config)
+
+    # Maximizar ventana si se desea (opcional, mejor que fullscreen para debug)
+    # window.maximize() 
+
+    keys = key.KeyStateHandler()
+    window.push_handlers(keys)
+
+    # --- SETUP IMGUI ---
+    imgui.create_context()
+    impl = create_renderer(window)
+
+    # === SOLUCIÓN 1: ESCALAR LA UI ===
+    io = imgui.get_io()
+    io.font_global_scale = 1.5  # Aumenta esto (ej. 2.0) si sigue siendo pequeño
+
+    print("Iniciando simulación de movimiento de arena...")
+    # --- SHADERS ---
+    # (Tu código de carga de shaders se mantiene igual)
+    shader_path = Path(os.path.dirname(__file__)) / "shaders"
+    print(f"Cargando shaders desde: {shader_path}")
+
+    cube_data = cubo_unitario()
+    
+    # Arena, bedrock y obstáculos en un solo pipeline (un draw instanciado)
+    terrain_pipeline = load_pipeline(shader_path / "terrain_vs.glsl", shader_path / "terrain_fs.glsl")
+
+    # --- SETUP VBO/VAO ---
+    sand_render = RenderingInstance()
+    sand_render.setup_vbo_buffer_data(cube_data["position_normals"].nbytes, cube_data["position_normals"], GL.GL_STATIC_DRAW)
+    sand_render.setup_vbo_attribs([0, 1], [3, 3], [GL.GL_FLOAT, GL.GL_FLOAT], [24, 24], [0, 12])
+    sand_render.setup_ibo_buffer_data(cube_data["indices"].nbytes, cube_data["indices"], GL.GL_STATIC_DRAW)
+
+    # Malla de superficie (alternativa a los cubos)
+    surface_mesh = SurfaceMeshRenderer(shader_path, N, group_size_x, group_size_y)
+
+    # Chunks con frustum culling y LOD (para mapas grandes). Se crea al elegir el
+    # modo por primera vez: necesita N potencia de 2 y los otros modos no.
+    terrain_lod = None
+    terrain_lod_error = None
+
+    def crear_terrain_lod():
+        """Crea el render LOD si hace falta; devuelve False si no se puede con este N."""
+        nonlocal terrain_lod, terrain_lod_error
+        if terrain_lod is None and terrain_lod_error is None:
+            try:
+                terrain_lod = TerrainLODRenderer(shader_path, N, cube_data, lod_chunk_size, lod_distance,
+                                                 group_size_x, group_size_y)
+            except ValueError as e:
+                terrain_lod_error = str(e)
+                print(f"Render LOD no disponible: {e}")
+        return terrain_lod is not None
+
+    def mallas_desactualizadas():
+        # La arena cambió: la malla de superficie y la pirámide del LOD quedan desactualizadas
+        surface_mesh.dirty = True
+        if terrain_lod is not None:
+            terrain_lod.dirty = True
+
+    # --- CREACIÓN INICIAL DE SSBOs ---
+    # Usamos los datos globales generados al inicio
+    global_positions_ssbo = SSBO(model_matrices_init, model_matrices_init.nbytes, GL.GL_STATIC_DRAW)
+
+    # Compute shaders de la simulación y sus SSBOs (arena, bedrock, obstáculos e intermedios)
+    sim = GPUSandSimulation(shader_path, N, sand_slabs_init, bedrock_slabs_init, obstacles_data_init,
+                            group_size_x, group_size_y, cell_size_m=cell_size_m, h_max=h_max,
+                            slope_deg_thresh=slope_deg_thresh, fused_wind=usar_viento_fusionado,
+                            packed_state=usar_estado_compacto, sparse_tiles=usar_tiles_activos)
+    sand_ssbo = sim.sand_ssbo
+    bedrock_ssbo = sim.bedrock_ssbo
+    obstacles_ssbo = sim.obstacles_ssbo
+
+    sand_readback = AsyncReadback(N * N * 4, readback_ring_size)
+
+    if render_mode == 2 and not crear_terrain_lod():
+        render_mode = 1
+
+    gpu_timer = GPUTimer()
+    gpu_timer.enabled = medir_gpu
+    sim.timer = gpu_timer
+
+    # === SOLUCIÓN 2: FUNCIÓN DE REINICIO ===
+    def reiniciar_simulacion():
+        print("Reiniciando simulación...")
+        detener_grabacion()
+        # 1. Regenerar datos en CPU
+        _, new_sand, new_bedrock, new_obstacles = generar_datos_iniciales()
+        
+        # 2. Subir a GPU (reutilizando los SSBOs existentes) y limpiar el "viento viejo"
+        sim.upload(new_sand, new_bedrock, new_obstacles)
+        scheduler.reset()
+        mallas_desactualizadas()
+
+    def guardar_checkpoint():
+        t0 = time.perf_counter()
+        try:
+            sim.save_checkpoint(checkpoint_path, checkpoint_comprimido)
+        except OSError as e:
+            print(f"No se pudo guardar el checkpoint: {e}")
+            return
+        print(f"Checkpoint guardado en {checkpoint_path} ({(time.perf_counter() - t0) * 1000.0:.0f} ms)")
+
+    def cargar_checkpoint():
+        global max_steps, kb, repose_angle, transfer_rate, cascade_iterations, sand_transport_block_count, usar_viento_fusionado, usar_cascada_adaptativa, cascade_tolerance, cascade_check_interval, cascade_mode, cascade_sub_iterations, smoothing_interval, shadow_mode
+        detener_grabacion()
+        t0 = time.perf_counter()
+        try:
+            sim.load_checkpoint(checkpoint_path)
+        except (OSError, ValueError) as e:
+            print(f"No se pudo cargar el checkpoint: {e}")
+            return
+        print(f"Checkpoint cargado de {checkpoint_path} ({(time.perf_counter() - t0) * 1000.0:.0f} ms, paso {sim.steps})")
+
+        # sim_tick vuelve a aplicar los parámetros del panel: se actualizan con los del checkpoint
+        max_steps = sim.R_s
+        kb = sim.kb
+        repose_angle = sim.repose_angle
+        transfer_rate = sim.transfer_rate
+        cascade_iterations = sim.cascade_iterations
+        sand_transport_block_count = sim.sand_transport_block_count
+        usar_viento_fusionado = sim.fused_wind
+        usar_cascada_adaptativa = sim.adaptive_cascade
+        cascade_tolerance = sim.cascade_tolerance
+        cascade_check_interval = sim.cascade_check_interval
+        cascade_mode = CASCADE_MODES.index(sim.cascade_mode)
+        cascade_sub_iterations = sim.cascade_sub_iterations
+        smoothing_interval = sim.smoothing_interval
+        shadow_mode = SHADOW_MODES.index(sim.shadow_mode)
+
+        scheduler.reset()
+        mallas_desactualizadas()
+
+    def instanceAttributes(positions, sand, bedrock, obstacle):
+        if positions: setInstanceArrayAttribute(global_positions_ssbo.get_SSBO_id(), 2, 2, GL.GL_FLOAT, 8, 1)
+        if sand:      setInstanceArrayIAttribute(sand_ssbo.get_SSBO_id(), 3, 1, GL.GL_UNSIGNED_INT, 4, 1)
+        if bedrock:   setInstanceArrayIAttribute(bedrock_ssbo.get_SSBO_id(), 4, 1, GL.GL_UNSIGNED_INT, 4, 1)
+        if obstacle:  setInstanceArrayIAttribute(obstacles_ssbo.get_SSBO_id(), 5, 1, GL.GL_UNSIGNED_INT, 4, 1)
+
+    # Los atributos por instancia quedan guardados en el VAO: los SSBOs conservan
+    # su id al reiniciar (setup_SSBO solo hace glBufferData), así que basta con
+    # configurarlos una vez en vez de en cada frame.
+    sand_render.bind_vao()
+    instanceAttributes(True, True, True, True)
+    sand_render.unbind_vao()
+
+    fps_display = pyglet.window.FPSDisplay(window=window)
+    fps_display.label.font_size = 24
+    fps_display.label.color = (255, 0, 0, 255)
+    
+    scheduler = FixedStepScheduler(steps_per_second, max_pasos_por_tick)
+
+    grabador = None
+
+    def iniciar_grabacion():
+        nonlocal grabador
+        estaticos = {
+            "bedrock": bedrock_ssbo.read_data((N, N), np.uint32),
+            "obstacles": obstacles_ssbo.read_data((N, N), np.uint32),
+        }
+        origen, transformar = sim.sand_readback_source()
+        grabador = SandRecorder(grabacion_dir, origen, N, grabar_cada, queue_size=grabacion_cola,
+                                static=estaticos, attrs={"first_step": sim.steps}, transform=transformar)
+        print(f"Grabando la arena cada {grabar_cada} pasos en {grabacion_dir}")
+
+    def detener_grabacion():
+        nonlocal grabador
+        if grabador is None:
+            return
+        grabador.close()
+        print(f"Grabación cerrada: {grabador.recorded} frames, {grabador.dropped} descartados")
+        grabador = None
+
+    def paso_simulacion():
+        sim.step()
+        if grabador is not None:
+            with tracer.span("recorder"):
+                grabador.after_step(sim.steps)
+
+    @tracer.traced("sim_tick")
+    def sim_tick(dt):
+        # Los parámetros del panel se aplican una vez por tick
+        sim.R_s = max_steps
+        sim.kb = kb
+        sim.repose_angle = repose_angle
+        sim.transfer_rate = transfer_rate
+        sim.cascade_iterations = cascade_iterations
+        sim.sand_transport_block_count = sand_transport_block_count
+        sim.fused_wind = usar_viento_fusionado
+        sim.adaptive_cascade = usar_cascada_adaptativa
+        sim.cascade_tolerance = cascade_tolerance
+        sim.cascade_check_interval = cascade_check_interval
+        sim.cascade_mode = CASCADE_MODES[cascade_mode]
+        sim.cascade_sub_iterations = cascade_sub_iterations
+        sim.smoothing_interval = smoothing_interval
+        sim.shadow_mode = SHADOW_MODES[shadow_mode]
+        scheduler.steps_per_second = None if sin_limite_pasos else steps_per_second
+        scheduler.max_steps_per_tick = max_pasos_por_tick
+
+        if grabador is not None:
+            grabador.collect()
+
+        if scheduler.tick(paso_simulacion):
+            # Con el layout compacto, las copias que lee el render se actualizan una vez por tick
+            sim.sync_unpacked()
+            mallas_desactualizadas()
+            # Una muestra por tick: con varios pasos por tick solo importa la última
+            if muestrear_arena:
+                with tracer.span("readback_request"):
+                    sand_readback.request(sand_ssbo)
+
+    if "SAND_MOVE_TRACE" in os.environ:
+        tracer.start()
+
+    @window.event
+    @tracer.traced("on_draw")
+    def on_draw():
+        global cascade_iterations, transfer_rate, repose_angle, max_steps, sand_transport_block_count, kb, steps_per_second, sin_limite_pasos, max_pasos_por_tick, render_mode, usar_viento_fusionado, usar_cascada_adaptativa, cascade_tolerance, cascade_check_interval, cascade_mode, cascade_sub_iterations, smoothing_interval, shadow_mode, muestrear_arena, medir_gpu, checkpoint_path, checkpoint_comprimido, grabacion_dir, grabar_cada
+        
+        imgui.new_frame()
+        # Resultados de timestamps de frames anteriores que ya estén listos
+        with tracer.span("gpu_timer_collect"):
+            gpu_timer.collect()
+
+        GL.glClearColor(0.5, 0.5, 0.5, 1.0)
+        GL.glLineWidth(1.0)
+        GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_FILL)
+        window.clear()
+
+        # --- UPDATE COMPUTE SHADERS ---
+        # Los pasos de simulación los ejecuta sim_tick (pyglet.clock), no el render
+
+        # --- RENDERING ---
+        GL.glEnable(GL.GL_DEPTH_TEST)
+
+        with tracer.span("render"):
+            if render_mode == 1:
+                # Malla de superficie (solo caras visibles)
+                if surface_mesh.dirty:
+                    with gpu_timer.scope("surface_mesh_rebuild"):
+                        surface_mesh.rebuild(bedrock_ssbo, sand_ssbo, obstacles_ssbo, top_sand_height)
+                with gpu_timer.scope("render"):
+                    surface_mesh.pipeline.use()
+                    surface_mesh.pipeline["lightDir"] = lightDir
+                    surface_mesh.pipeline["lightColor"] = lightColor
+                    setCameraUniforms(camera, surface_mesh.pipeline)
+                    surface_mesh.draw()
+            elif render_mode == 2:
+                # Solo los chunks visibles, los lejanos con menos columnas
+                if terrain_lod.dirty:
+                    with gpu_timer.scope("lod_pyramid_rebuild"):
+                        terrain_lod.rebuild(bedrock_ssbo, sand_ssbo, obstacles_ssbo, top_sand_height)
+                with gpu_timer.scope("render"):
+                    terrain_lod.pipeline.use()
+                    terrain_lod.pipeline["lightDir"] = lightDir
+                    terrain_lod.pipeline["lightColor"] = lightColor
+                    terrain_lod.pipeline["topheight"] = top_sand_height
+                    setCameraUniforms(camera, terrain_lod.pipeline)
+                    view_proj = camera.get_perspective() @ camera.get_view() @ camera.get_model()
+                    terrain_lod.draw(view_proj, camera.get_pos())
+            else:
+                # Arena + bedrock + obstáculos en una sola pasada
+                with gpu_timer.scope("render"):
+                    terrain_pipeline.use()
+                    terrain_pipeline["lightDir"] = lightDir
+                    terrain_pipeline["lightColor"] = lightColor
+                    terrain_pipeline["topheight"] = top_sand_height
+                    setCameraUniforms(camera, terrain_pipeline)
+                    sand_render.bind_all()
+                    GL.glDrawElementsInstanced(GL.GL_TRIANGLES, len(cube_data['indices']), GL.GL_UNSIGNED_INT, None, N*N)
+                    sand_render.unbind_all()
+
+        # --- IMGUI INTERFACE ---
+        with tracer.span("imgui_build"):
+            imgui.begin("Panel de Control - Sand Sim")
+            imgui.separator()
+
+            imgui.text("Configuración de Avalancha")
+            _, transfer_rate = imgui.slider_float("Velocidad Caída", transfer_rate, 0.0, 1.0)
+            _, repose_angle = imgui.slider_float("Angulo Reposo", repose_angle, 10.0, 89.0)
+            _, kb = imgui.slider_float("Kb (Sticky)", kb, 0.0, 1.0)
+            _, cascade_iterations = imgui.slider_int("Iteraciones", cascade_iterations, 1, 50)
+            _, cascade_mode = imgui.combo("Kernel cascada", cascade_mode, CASCADE_MODES)
+            if CASCADE_MODES[cascade_mode] == "tiled":
+                _, cascade_sub_iterations = imgui.slider_int("Sub-iteraciones", cascade_sub_iterations, 1, 4)
+            _, usar_cascada_adaptativa = imgui.checkbox("Cascada adaptativa", usar_cascada_adaptativa)
+            if usar_cascada_adaptativa:
+                _, cascade_tolerance = imgui.slider_int("Tolerancia (slabs)", cascade_tolerance, 0, 1000)
+                _, cascade_check_interval = imgui.slider_int("Revisar cada (iter.)", cascade_check_interval, 1, 16)
+                imgui.text(f"Iteraciones usadas: {sim.last_cascade_iterations}/{cascade_iterations}"
+                           f"  movidos: {sim.last_cascade_moved}  exceso máx: {sim.last_cascade_max_excess:.2f}")
+
+            imgui.separator()
+            imgui.text("Transporte Eólico")
+            _, max_steps = imgui.slider_int("Pasos (R_s)", max_steps, 1, 50)
+            _, sand_transport_block_count = imgui.slider_int("Bloques/Frame", sand_transport_block_count, 1, 10)
+            _, smoothing_interval = imgui.slider_int("Recalcular H_50/H_200 cada", smoothing_interval, 1, 32)
+            if not usar_tiles_activos:
+                _, shadow_mode = imgui.combo("Sombra", shadow_mode, SHADOW_MODES)
+            _, usar_viento_fusionado = imgui.checkbox("Viento fusionado (1 dispatch)", usar_viento_fusionado)
+
+            imgui.separator()
+            cambiado, nuevo_modo = imgui.combo("Render", render_mode, RENDER_MODES)
+            if cambiado and (nuevo_modo != 2 or crear_terrain_lod()):
+                render_mode = nuevo_modo
+            if terrain_lod_error is not None:
+                imgui.text(f"LOD no disponible: {terrain_lod_error}")
+            if render_mode == 2:
+                imgui.text(f"Chunks dibujados: {terrain_lod.n_items}  descartados: {terrain_lod.n_culled}")
+
+            imgui.separator()
+            imgui.text("Planificador")
+            _, sin_limite_pasos = imgui.checkbox("Sin límite de pasos/seg", sin_limite_pasos)
+            if not sin_limite_pasos:
+                _, steps_per_second = imgui.slider_float("Pasos/seg", steps_per_second, 0.1, 120.0)
+            _, max_pasos_por_tick = imgui.slider_int("Máx. pasos por tick", max_pasos_por_tick, 1, 32)
+            _, scheduler.paused = imgui.checkbox("Pausa", scheduler.paused)
+            imgui.text(f"Pasos/seg logrados: {scheduler.achieved_steps_per_second:.2f}"
+                       f"  total: {scheduler.total_steps}  descartados: {scheduler.dropped_steps}")
+
+            imgui.separator()
+            # BOTÓN DE REINICIO CONECTADO
+            _, muestrear_arena = imgui.checkbox("Muestrear arena (async)", muestrear_arena)
+            if muestrear_arena:
+                muestra = sand_readback.latest((N, N), np.uint32)
+                if muestra is not None:
+                    arena, paso = muestra
+                    imgui.text(f"Muestra #{paso}: {int(arena.sum(dtype=np.uint64))} slabs, máx {int(arena.max())}")
+            imgui.separator()
+            _, medir_gpu = imgui.checkbox("Tiempos GPU", medir_gpu)
+            gpu_timer.enabled = medir_gpu
+            if medir_gpu:
+                imgui.text("Etapa                  min    prom   p95 (ms)")
+                for stage, (n, vmin, avg, p95) in gpu_timer.stats().items():
+                    imgui.text(f"{stage:<20} {vmin:6.2f} {avg:6.2f} {p95:6.2f}")
+                if imgui.button("Exportar CSV"):
+                    gpu_timer.export_csv(gpu_timer_csv)
+                    print(f"Tiempos GPU exportados a {gpu_timer_csv}")
+                imgui.same_line()
+                if imgui.button("Reiniciar tiempos"):
+                    gpu_timer.reset()
+
+                imgui.separator()
+                if not tracer.enabled:
+                    if imgui.button("Grabar traza CPU"):
+                        gpu_timer.reset()
+                        tracer.start()
+                else:
+                    imgui.text(f"Grabando traza: {len(tracer.events)} spans")
+                    if imgui.button("Detener y exportar traza"):
+                        exportar_traza()
+            if imgui.button("Imprimir Sand SSBO"):
+                 sand_ssbo.print_content((N, N), np.uint32, label="Arena")
+            if imgui.button("Reiniciar Simulación"):
+                 reiniciar_simulacion()
+
+            imgui.separator()
+            _, checkpoint_path = imgui.input_text("Checkpoint", checkpoint_path, 256)
+            _, checkpoint_comprimido = imgui.checkbox("Comprimir checkpoint", checkpoint_comprimido)
+            if imgui.button("Guardar checkpoint"):
+                guardar_checkpoint()
+            imgui.same_line()
+            if imgui.button("Cargar checkpoint"):
+                cargar_checkpoint()
+
+            imgui.separator()
+            if grabador is None:
+                _, grabacion_dir = imgui.input_text("Directorio grabación", grabacion_dir, 256)
+                _, grabar_cada = imgui.slider_int("Grabar cada (pasos)", grabar_cada, 1, 1000)
+                if imgui.button("Grabar arena"):
+                    iniciar_grabacion()
+            else:
+                imgui.text(f"Grabando en {grabacion_dir} cada {grabar_cada} pasos")
+                imgui.text(f"Escritos: {grabador.recorded}  en cola: {grabador.recorder.queued}  "
+                           f"descartados: {grabador.dropped}")
+                if imgui.button("Detener grabación"):
+                    detener_grabacion()
+
+            imgui.end()
+
+        imgui.render()
+        with tracer.span("imgui_render"), gpu_timer.scope("imgui"):
+            impl.render(imgui.get_draw_data())
+        fps_display.draw()
+
+    @window.event
+    def on_mouse_drag(x, y, dx, dy, buttons, modifiers):
+        if buttons & mouse.RIGHT:
+            camera.on_mouse(x, y)
+
+    @window.event
+    def on_mouse_scroll(x, y, scroll_x, scroll_y):
+        camera.on_scroll(scroll_y) 
+
+    @tracer.traced("update")
+    def update(dt):
+        camera.on_render(dt)
+        camera.on_keyboard(keys, dt)
+
+    def exportar_traza():
+        tracer.stop()
+        n = tracer.export(trace_path, gpu_timer.spans, gpu_timer.clock_offset_ns())
+        print(f"Traza exportada a {trace_path} ({n} spans de CPU, {len(gpu_timer.spans)} de GPU)")
+
+    @window.event
+    def on_close():
+        if tracer.enabled:
+            exportar_traza()
+        detener_grabacion()
+
+    pyglet.clock.schedule_interval(update, 1/60.0)
+    pyglet.clock.schedule_interval(sim_tick, sim_tick_interval)
+    pyglet.app.run()
\ No newline at end of file
@@ -0,0 +1,347 @@
+import itertools
+import json
+import os
+import platform
+import time
+from pathlib import Path
+
+import numpy as np
+
+from implementations.sand_move import terreno
+
+# Benchmark de `sand_move`: mide la generación del terreno, cada etapa de la
+# simulación y pasos completos sobre una matriz de tamaños de grilla, R_s,
+# cascade_iterations y modos de sombra, con el motor GPU (contexto offscreen, ver headless.py)
+# y el motor NumPy (en un proceso o por tiles en varios, ver tiled_engine.py).
+# El resultado es un JSON comparable contra otro guardado
+# como referencia (baseline).
+#
+# Las comparaciones usan medianas y solo marcan una regresión si la caída supera
+# tanto el umbral como NOISE_FACTOR veces la dispersión medida (la de la corrida
+# o la del baseline, la mayor). Entre procesos distintos la velocidad varía
+# bastante más que dentro de una corrida, así que conviene armar el baseline
+# con varias corridas (`combinar`): su dispersión incluye la de entre corridas.
+# Las métricas por debajo de `min_ms` no se comparan: a esa escala el ruido del
+# reloj y del sistema domina.
+
+FORMAT_VERSION = 1
+
+# Repeticiones de la generación del terreno (se compara la mediana)
+TERRAIN_REPETITIONS = 5
+# Cuántas dispersiones tiene que superar una caída para contar como regresión
+NOISE_FACTOR = 3.0
+# Mediana mínima (ms) de una métrica para compararla
+MIN_COMPARE_MS = 1.0
+
+
+def clave(caso):
+    """Identifica un caso para compararlo con el mismo caso del baseline."""
+    return (caso["engine"], caso["cascade_mode"], caso["N"], caso["R_s"], caso["cascade_iterations"],
+            caso.get("workers"), caso.get("shadow_mode", "march"))
+
+
+def resumen_ms(valores):
+    """
+    Estadísticas en ms. `spread` es la dispersión relativa: desviación absoluta
+    mediana sobre la mediana.
+    """
+    v = np.asarray(valores, dtype=np.float64) * 1000.0
+    mediana = float(np.median(v))
+    return {"n": int(v.size), "min": float(v.min()), "avg": float(v.mean()),
+            "median": mediana, "p95": float(np.percentile(v, 95)),
+            "spread": float(np.median(np.abs(v - mediana)) / mediana) if mediana > 0 else 0.0}
+
+
+def medir_terreno(n, repeticiones=TERRAIN_REPETITIONS):
+    """Genera el terreno de tamaño n sin caché. Devuelve (terreno, tiempos en s)."""
+    tiempos = []
+    datos = None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        datos = terreno.generar_terreno(n)
+        tiempos.append(time.perf_counter() - t0)
+    return datos, tiempos
+
+
+def _caso(engine, cascade_mode, n, R_s, cascade_iterations, tiempos_paso, etapas, workers=None,
+          shadow_mode="march"):
+    """Arma el resultado de un caso con celdas/seg por paso y por etapa."""
+    celdas = n * n
+    paso = resumen_ms(tiempos_paso)
+    return {
+        "engine": engine,
+        "cascade_mode": cascade_mode,
+        "N": n,
+        "R_s": R_s,
+        "cascade_iterations": cascade_iterations,
+        "workers": workers,
+        "shadow_mode": shadow_mode,
+        "step_ms": paso,
+        "cells_per_second": celdas / (paso["median"] / 1000.0) if paso["median"] > 0 else 0.0,
+        "stages_ms": {stage: {**ms, "cells_per_second": celdas / (ms["median"] / 1000.0) if ms["median"] > 0 else 0.0}
+                      for stage, ms in etapas.items()},
+    }
+
+
+def bench_numpy(datos, n, R_s, cascade_iterations, steps, warmup, adaptive_cascade, workers=None,
+                shadow_mode="march"):
+    """Motor NumPy; con `workers` se mide TiledSandEngine con ese número de procesos."""
+    from implementations.sand_move.cpu_engine import NumpySandEngine
+    from implementations.sand_move.tiled_engine import TiledSandEngine
+
+    # Con tolerancia -1 la cascada nunca corta antes: siempre `cascade_iterations`
+    params = dict(R_s=R_s, cascade_iterations=cascade_iterations, cascade_tolerance=0 if adaptive_cascade else -1,
+                  shadow_mode=shadow_mode)
+    if workers:
+        engine = TiledSandEngine(datos["bedrock"], datos["sand"], datos["obstacles"], n, workers=workers, **params)
+    else:
+        engine = NumpySandEngine(datos["bedrock"], datos["sand"], datos["obstacles"], n, **params)
+    try:
+        tiempos, etapas = _medir_cpu(engine, steps, warmup)
+    finally:
+        if workers:
+            engine.close()
+    return _caso("tiled" if workers else "numpy", "gather", n, R_s, cascade_iterations, tiempos,
+                 {stage: resumen_ms(v) for stage, v in etapas.items()}, workers, shadow_mode)
+
+
+def _medir_cpu(engine, steps, warmup):
+    stages = ["smooth_heights", "wind_heightfield", "wind_update", "wind_shadow_sweep", "sticky_mask",
+              "sand_transport", "sand_cascade"]
+    if engine.shadow_mode != "sweep":
+        # Sin barridos la etapa no hace nada: no se mide ni se informa
+        stages.remove("wind_shadow_sweep")
+    etapas = {stage: [] for stage in stages}
+    tiempos = []
+    for i in range(warmup + steps):
+        t_paso = time.perf_counter()
+        parciales = []
+        for stage in stages:
+            t0 = time.perf_counter()
+            getattr(engine, "run_" + stage)()
+            parciales.append(time.perf_counter() - t0)
+        t_paso = time.perf_counter() - t_paso
+        if i >= warmup:
+            tiempos.append(t_paso)
+            for stage, t in zip(stages, parciales):
+                etapas[stage].append(t)
+    return tiempos, etapas
+
+
+def bench_gpu(datos, n, R_s, cascade_iterations, steps, warmup, adaptive_cascade, cascade_mode, shadow_mode="march"):
+    from OpenGL import GL
+    from utils.gpu_timer import GPUTimer
+    from implementations.sand_move.gpu_sim import GPUSandSimulation
+
+    shader_path = Path(os.path.dirname(__file__)) / "shaders"
+    sim = GPUSandSimulation(shader_path, n, datos["sand"], datos["bedrock"], datos["obstacles"],
+                            R_s=R_s, cascade_iterations=cascade_iterations,
+                            adaptive_cascade=adaptive_cascade, cascade_mode=cascade_mode, shadow_mode=shadow_mode)
+    try:
+        for _ in range(warmup):
+            sim.step()
+        GL.glFinish()
+
+        sim.timer = GPUTimer(window=max(steps, 1))
+        tiempos = []
+        for _ in range(steps):
+            t0 = time.perf_counter()
+            sim.step()
+            GL.glFinish()
+            tiempos.append(time.perf_counter() - t0)
+        sim.timer.collect()
+
+        etapas = {}
+        for stage, values in sim.timer.samples.items():
+            if values:
+                etapas[stage] = resumen_ms(np.fromiter(values, dtype=np.float64) / 1000.0)
+    finally:
+        sim.release()
+    return _caso("gpu", cascade_mode, n, R_s, cascade_iterations, tiempos, etapas, shadow_mode=shadow_mode)
+
+
+def entorno(gl_info=None):
+    info = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+    if gl_info:
+        info["gl"] = gl_info
+    return info
+
+
+def run_benchmark(sizes, radii, cascade_iterations, engines, cascade_modes=("atomic",), steps=5, warmup=1,
+                  adaptive_cascade=False, workers=(), shadow_modes=("march",), log=print,
+                  terrain_repetitions=TERRAIN_REPETITIONS):
+    """
+    Corre la matriz completa y devuelve el resultado (serializable a JSON).
+
+    Por defecto la cascada hace siempre `cascade_iterations` iteraciones
+    (`adaptive_cascade=False`) para que el trabajo por paso no dependa de cuánto
+    se haya asentado el terreno y los casos sean comparables entre corridas.
+    El motor "tiled" se mide una vez por cada valor de `workers` (para ver cómo
+    escala con los núcleos). Cada caso se mide con cada modo de `shadow_modes`
+    ("sweep" no depende de R_s, "march" sí). La generación del terreno se mide
+    `terrain_repetitions` veces y se guarda la mediana.
+    """
+    window = None
+    gl_info = None
+    if "gpu" in engines:
+        from implementations.sand_move.headless import crear_contexto_offscreen
+        window = crear_contexto_offscreen()
+        from OpenGL import GL
+        gl_info = {
+            "renderer": GL.glGetString(GL.GL_RENDERER).decode(errors="replace"),
+            "version": GL.glGetString(GL.GL_VERSION).decode(errors="replace"),
+        }
+
+    casos = []
+    terrain = {}
+    try:
+        for n in sizes:
+            datos, t_terreno = medir_terreno(n, terrain_repetitions)
+            ms = resumen_ms(t_terreno)
+            terrain[str(n)] = {"ms": ms["median"], **ms, "cells_per_second": n * n / (ms["median"] / 1000.0)}
+            log(f"N={n}: terreno en {ms['median']:.1f} ms (mediana de {ms['n']})")
+
+            for R_s, iters, engine in itertools.product(radii, cascade_iterations, engines):
+                modos = cascade_modes if engine == "gpu" else ("gather",)
+                procesos = (workers or [os.cpu_count() or 1]) if engine == "tiled" else (None,)
+                for modo, w, sombra in itertools.product(modos, procesos, shadow_modes):
+                    if engine == "gpu":
+                        caso = bench_gpu(datos, n, R_s, iters, steps, warmup, adaptive_cascade, modo, sombra)
+                    else:
+                        caso = bench_numpy(datos, n, R_s, iters, steps, warmup, adaptive_cascade, w, sombra)
+                    casos.append(caso)
+                    log(f"  {engine:5s} {modo:6s} {sombra:5s} R_s={R_s:<3d} cascade_iterations={iters:<3d} "
+                        + (f"workers={w:<3d} " if w else "")
+                        + f"paso {caso['step_ms']['median']:9.2f} ms  {caso['cells_per_second'] / 1e6:9.2f} Mceldas/s")
+    finally:
+        if window is not None:
+            window.close()
+
+    return {
+        "format_version": FORMAT_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": entorno(gl_info),
+        "settings": {"steps": steps, "warmup": warmup, "adaptive_cascade": adaptive_cascade},
+        "terrain": terrain,
+        "cases": casos,
+    }
+
+
+def _juntar(metricas):
+    """
+    Una métrica a partir de la misma en varias corridas: mediana de las
+    medianas, y como dispersión la mayor entre la de cada corrida y la
+    semiamplitud relativa entre corridas.
+    """
+    medianas = np.array([m["median"] for m in metricas], dtype=np.float64)
+    mediana = float(np.median(medianas))
+    entre = float((medianas.max() - medianas.min()) / (2.0 * mediana)) if mediana > 0 else 0.0
+    return {"n": len(metricas), "median": mediana,
+            "spread": max([entre] + [m.get("spread", 0.0) for m in metricas]),
+            "cells_per_second": float(np.median([m["cells_per_second"] for m in metricas]))}
+
+
+def combinar(resultados):
+    """Baseline a partir de varias corridas (solo los casos presentes en todas)."""
+    if len(resultados) == 1:
+        return resultados[0]
+    terrain = {}
+    for n in resultados[0].get("terrain", {}):
+        if all(n in r.get("terrain", {}) for r in resultados):
+            t = _juntar([{"median": r["terrain"][n]["ms"], **r["terrain"][n]} for r in resultados])
+            terrain[n] = {"ms": t["median"], **t}
+
+    por_clave = [{clave(c): c for c in r["cases"]} for r in resultados]
+    casos = []
+    for k, primero in por_clave[0].items():
+        if not all(k in casos_r for casos_r in por_clave):
+            continue
+        iguales = [casos_r[k] for casos_r in por_clave]
+        paso = _juntar([{**c["step_ms"], "cells_per_second": c["cells_per_second"]} for c in iguales])
+        etapas = {stage: _juntar([c["stages_ms"][stage] for c in iguales]) for stage in primero["stages_ms"]
+                  if all(stage in c["stages_ms"] for c in iguales)}
+        casos.append({**primero, "step_ms": paso, "cells_per_second": paso["cells_per_second"], "stages_ms": etapas})
+    return {**resultados[0], "terrain": terrain, "cases": casos, "combined_runs": len(resultados)}
+
+
+def _comparacion(caso, metrica, actual, ref, threshold, min_ms):
+    """
+    Compara una métrica (dicts con median, spread y cells_per_second). None si
+    alguna de las dos medianas está por debajo de `min_ms`.
+    """
+    if actual["median"] < min_ms or ref["median"] < min_ms:
+        return None
+    ratio = (actual["cells_per_second"] / ref["cells_per_second"]
+             if ref["cells_per_second"] > 0 else float("inf"))
+    # La caída tolerada crece con el ruido medido en cualquiera de las dos corridas
+    tolerancia = max(threshold, NOISE_FACTOR * max(actual.get("spread", 0.0), ref.get("spread", 0.0)))
+    return {
+        "case": caso,
+        "metric": metrica,
+        "cells_per_second": actual["cells_per_second"],
+        "baseline_cells_per_second": ref["cells_per_second"],
+        "ratio": ratio,
+        "tolerance": tolerancia,
+        "regression": ratio < 1.0 - tolerancia,
+    }
+
+
+def comparar(resultado, baseline, threshold=0.10, min_ms=MIN_COMPARE_MS):
+    """
+    Compara celdas/seg por caso (paso completo y cada etapa) contra el baseline.
+
+    `threshold` es la caída mínima que cuenta como regresión; si la dispersión
+    (de la corrida o del baseline, ver `combinar`) es mayor, la tolerancia pasa
+    a ser NOISE_FACTOR veces esa dispersión. Para que una caída de `threshold`
+    se detecte, el umbral tiene que ser bastante mayor que la dispersión entre
+    corridas. Las métricas con mediana menor a `min_ms` no se comparan.
+
+    Returns:
+        list: Un dict por métrica comparada, con `ratio` = actual / baseline,
+            `tolerance` (la caída tolerada) y `regression` = True si cayó más.
+    """
+    base = {clave(c): c for c in baseline.get("cases", [])}
+    comparaciones = []
+    for n, t in resultado["terrain"].items():
+        ref = baseline.get("terrain", {}).get(n)
+        if ref is None:
+            continue
+        # Los baselines viejos solo tienen "ms" (una medición)
+        c = _comparacion({"N": int(n)}, "terrain", {"median": t["ms"], **t}, {"median": ref["ms"], **ref},
+                         threshold, min_ms)
+        if c is not None:
+            comparaciones.append(c)
+    for caso in resultado["cases"]:
+        ref = base.get(clave(caso))
+        if ref is None:
+            continue
+        datos_caso = dict(zip(("engine", "cascade_mode", "N", "R_s", "cascade_iterations", "workers", "shadow_mode"),
+                              clave(caso)))
+        metricas = [("step", {**caso["step_ms"], "cells_per_second": caso["cells_per_second"]},
+                     {**ref["step_ms"], "cells_per_second": ref["cells_per_second"]})]
+        for stage, ms in caso["stages_ms"].items():
+            if stage in ref.get("stages_ms", {}):
+                metricas.append((stage, ms, ref["stages_ms"][stage]))
+        for nombre, actual, anterior in metricas:
+            c = _comparacion(datos_caso, nombre, actual, anterior, threshold, min_ms)
+            if c is not None:
+                comparaciones.append(c)
+    return comparaciones
+
+
+def cargar_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def guardar_json(path, data):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
@@ -0,0 +1,81 @@
+import numpy as np
+from utils.checkpoint import save_checkpoint, Checkpoint
+
+# Qué se guarda en un checkpoint de `sand_move`. Los nombres son los mismos
+# para los dos motores, así que un checkpoint de la GPU se puede cargar en el
+# motor NumPy y al revés.
+
+# nombre -> (atributo en NumpySandEngine, atributo en GPUSandSimulation, dtype, componentes por celda)
+ESTADO = {
+    "sand": ("sand_slabs", "sand_ssbo", np.uint32, 1),
+    "bedrock": ("bedrock_slabs", "bedrock_ssbo", np.uint32, 1),
+    "obstacles": ("obstacles", "obstacles_ssbo", np.uint32, 1),
+    "wind_heightfield": ("wind_height_field", "wind_heightfield_ssbo", np.float32, 2),
+    "wind_field": ("wind_field", "wind_field_ssbo", np.float32, 2),
+    "wind_shadowing": ("wind_shadowing", "wind_shadowing_ssbo", np.float32, 1),
+    "sticky_mask": ("sticky_mask", "sticky_mask_ssbo", np.float32, 1),
+    "erosion_mask": ("erosion_mask", "erosion_mask_ssbo", np.float32, 1),
+    "smoothed_heights": ("smoothed_heights", "smoothed_heights_ssbo", np.float32, 2),
+}
+
+# Campos vectoriales en float: casi no comprimen, se guardan tal cual
+SIN_COMPRIMIR = ("wind_heightfield", "wind_field", "smoothed_heights")
+
+# Parámetros ajustables que se guardan y restauran (los que el motor tenga)
+PARAMETROS = (
+    "R_s", "kb", "repose_angle", "transfer_rate", "cascade_iterations", "cell_size_m", "h_max",
+    "slope_deg_thresh", "sand_transport_block_count", "cascade_tolerance", "cascade_check_interval",
+    "fused_wind", "adaptive_cascade", "cascade_mode", "cascade_sub_iterations", "smoothing_interval",
+    "shadow_mode",
+)
+
+
+def parametros(engine):
+    params = {p: getattr(engine, p) for p in PARAMETROS if hasattr(engine, p)}
+    params["N"] = engine.N
+    params["steps"] = engine.steps
+    # Valores de NumPy (p. ej. np.float32) a tipos de Python para el JSON
+    return {p: v.item() if isinstance(v, np.generic) else v for p, v in params.items()}
+
+
+def forma(nombre, N):
+    componentes = ESTADO[nombre][3]
+    return (N * N,) if componentes == 1 else (N * N, componentes)
+
+
+def guardar(path, engine, arrays, compress=True):
+    """Escribe `arrays` (nombre -> array plano) y los parámetros de `engine`."""
+    save_checkpoint(path, arrays, parametros(engine), compress=compress, raw=SIN_COMPRIMIR)
+
+
+def abrir(path, N):
+    """
+    Abre un checkpoint y revisa que sea de una grilla N x N.
+
+    Returns:
+        Checkpoint: Hay que cerrarlo (o usarlo con `with`).
+    """
+    ckpt = Checkpoint(path)
+    if ckpt.params.get("N") != N:
+        ckpt.close()
+        raise ValueError(f"{path} es de una grilla de {ckpt.params.get('N')} y la simulación es de {N}")
+    faltan = [nombre for nombre in ("sand", "bedrock", "obstacles") if nombre not in ckpt]
+    if faltan:
+        ckpt.close()
+        raise ValueError(f"{path} no tiene {', '.join(faltan)}")
+    for nombre, (_, _, dtype, _) in ESTADO.items():
+        if nombre not in ckpt:
+            continue
+        info = ckpt.arrays[nombre]
+        if np.dtype(info["dtype"]) != np.dtype(dtype) or tuple(info["shape"]) != forma(nombre, N):
+            ckpt.close()
+            raise ValueError(f"{path}: {nombre} es {info['dtype']} {tuple(info['shape'])}, "
+                             f"se esperaba {np.dtype(dtype).str} {forma(nombre, N)}")
+    return ckpt
+
+
+def aplicar_parametros(engine, params):
+    for p in PARAMETROS:
+        if p in params and hasattr(engine, p):
+            setattr(engine, p, params[p])
+    engine.steps = params.get("steps", 0)
@@ -0,0 +1,737 @@
+"""
+Motor de referencia en NumPy para el paso de simulación de dunas.
+
+Replica las etapas de la cadena de compute shaders de `sand_move`
+(smooth_heights -> wind_heightfield -> wind_update [-> wind_shadow_sweep] ->
+sticky_mask -> sand_transport -> sand_cascade) operando sobre arrays completos,
+sin bucles por celda en Python. Los únicos bucles son sobre los pasos de las
+marchas contra el viento (R_s), sobre los vecinos y a lo largo de las líneas de
+los barridos de sombra (todas las líneas avanzan juntas).
+
+Convención de índices: los buffers se guardan planos igual que los SSBOs y se ven
+como arrays 2D con `buf.reshape(N, N)`, de modo que `arr[a, b] == buf[a * N + b]`.
+Igual que en los shaders, las etapas de viento indexan con `x * N + y` (a = x)
+mientras que sticky, transporte y cascada indexan con `y * N + x` (a = y).
+"""
+import numpy as np
+from implementations.sand_move import checkpoint
+
+SQRT2 = 1.41421356
+
+# Vecinos en el mismo orden que los recorre sand_cascade_compute.glsl (dy externo,
+# dx interno) para que el desempate de pendientes iguales coincida con el shader.
+VECINOS = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx != 0 or dy != 0]
+
+
+# --- FUNCIONES AUXILIARES ---
+def altura_total(bedrock, sand):
+    return bedrock.astype(np.float32) + sand.astype(np.float32)
+
+
+def _rand(xs, ys):
+    """Mismo hash que `rand(vec2)` de sand_transport_compute.glsl."""
+    xs = np.asarray(xs, dtype=np.float32)
+    ys = np.asarray(ys, dtype=np.float32)
+    v = np.sin(xs * np.float32(12.9898) + ys * np.float32(78.233)) * np.float32(43758.5453)
+    return v - np.floor(v)
+
+
+def _rint(v):
+    # round() de GLSL con NaN (viento nulo) tratado como 0
+    return np.nan_to_num(np.rint(v)).astype(np.int64)
+
+
+def _sel(m, a, b):
+    """`m ? a : b` sin ramas. np.where es varias veces más lento con máscaras
+    irregulares; esto es exacto para enteros (y alturas enteras en float32)."""
+    return b + m * (a - b)
+
+
+def _coords(shape, origin):
+    a = np.arange(shape[0], dtype=np.int64)[:, None] + origin[0]
+    b = np.arange(shape[1], dtype=np.int64)[None, :] + origin[1]
+    return np.broadcast_to(a, shape), np.broadcast_to(b, shape)
+
+
+def _normalizar(vx, vy):
+    largo = np.hypot(vx, vy)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        nx = np.where(largo > 0.0, vx / largo, 0.0)
+        ny = np.where(largo > 0.0, vy / largo, 0.0)
+    return nx, ny, largo
+
+
+# --- ETAPA 0: height_smooth_compute.glsl ---
+# Lado (en metros) de las ventanas de H_50 y H_200, los heightfields suavizados
+# cuyos gradientes desvían el viento a gran escala
+ESCALAS_VIENTO_M = (50.0, 200.0)
+
+
+def radio_suavizado(escala_m, cell_size_m):
+    """Radio en celdas de la ventana cuadrada de lado `escala_m`."""
+    return max(1, int(round(escala_m / (2.0 * cell_size_m))))
+
+
+def radios_suavizado(cell_size_m):
+    return tuple(radio_suavizado(escala, cell_size_m) for escala in ESCALAS_VIENTO_M)
+
+
+def suavizar(H, radio):
+    """
+    Media de H en la ventana de (2 * radio + 1)^2 celdas alrededor de cada una,
+    recortada en los bordes del grid. Usa una tabla de sumas acumuladas, así que
+    el costo no depende del radio. Con alturas enteras las sumas son exactas.
+    """
+    n0, n1 = H.shape
+    S = np.zeros((n0 + 1, n1 + 1), dtype=np.int64)
+    S[1:, 1:] = np.asarray(H, dtype=np.int64).cumsum(0).cumsum(1)
+    a0 = np.clip(np.arange(n0) - radio, 0, n0)
+    a1 = np.clip(np.arange(n0) + radio + 1, 0, n0)
+    b0 = np.clip(np.arange(n1) - radio, 0, n1)
+    b1 = np.clip(np.arange(n1) + radio + 1, 0, n1)
+    suma = S[a1][:, b1] - S[a0][:, b1] - S[a1][:, b0] + S[a0][:, b0]
+    cuenta = (a1 - a0)[:, None] * (b1 - b0)[None, :]
+    return (suma / cuenta).astype(np.float32)
+
+
+def smoothed_heights(bedrock, sand, cell_size_m=1.0):
+    """
+    Returns:
+        np.ndarray: Array (n0, n1, 2) float32 con (H_50, H_200).
+    """
+    H = bedrock.astype(np.int64) + sand
+    out = np.empty(H.shape + (2,), dtype=np.float32)
+    for c, radio in enumerate(radios_suavizado(cell_size_m)):
+        out[..., c] = suavizar(H, radio)
+    return out
+
+
+# --- ETAPA 1: wind_heightfield_compute.glsl ---
+def wind_heightfield(bedrock, sand, origin=(0, 0)):
+    """
+    Campo base A(p) = log(max(H, 1)) * (cos a, sin a), con a = atan(py, px + 0.01).
+
+    Args:
+        bedrock, sand (np.ndarray): Arrays 2D indexados [x, y].
+        origin (tuple): Coordenada global de la celda [0, 0] (para trabajar por tiles).
+
+    Returns:
+        np.ndarray: Array (n0, n1, 2) float32.
+    """
+    H = altura_total(bedrock, sand)
+    px, py = _coords(H.shape, origin)
+    alpha = np.arctan2(py.astype(np.float32), px.astype(np.float32) + np.float32(0.01))
+    mag = np.log(np.maximum(H, np.float32(1.0)))
+    A = np.empty(H.shape + (2,), dtype=np.float32)
+    A[..., 0] = mag * np.cos(alpha)
+    A[..., 1] = mag * np.sin(alpha)
+    return A
+
+
+# --- ETAPA 2: wind_update_compute.glsl ---
+def gradiente(H):
+    """Diferencias centrales con bordes clampeados, como gradH() del shader."""
+    Hp = np.pad(H, 1, mode="edge")
+    gx = (Hp[2:, 1:-1] - Hp[:-2, 1:-1]) * np.float32(0.5)
+    gy = (Hp[1:-1, 2:] - Hp[1:-1, :-2]) * np.float32(0.5)
+    return gx, gy
+
+
+def wind_update(bedrock, sand, A, R_s, k_W=0.005, k_H_50=5.0, k_H_200=30.0,
+                theta_min=np.radians(10.0), theta_max=np.radians(15.0), smoothed=None, shadow=True):
+    """
+    Campo de viento W(p) y factor de sombra de viento.
+
+    Args:
+        smoothed (np.ndarray): (H_50, H_200) de `smoothed_heights`, (n0, n1, 2).
+            Si falta se calcula de estas alturas con celdas de 1 m.
+        shadow (bool): False para no hacer la marcha de la sombra (con
+            shadow_mode "sweep" la calcula `sombra_barrido`).
+
+    Returns:
+        tuple: (W (n0, n1, 2) float32, shadow (n0, n1) float32 o None)
+    """
+    H = altura_total(bedrock, sand)
+    n0, n1 = H.shape
+    if smoothed is None:
+        smoothed = smoothed_heights(bedrock, sand)
+
+    # W(p) = 0.2 * (F_50 o V) + 0.8 * (F_200 o V), cada F con el gradiente de su escala
+    g50x, g50y = gradiente(smoothed[..., 0])
+    g200x, g200y = gradiente(smoothed[..., 1])
+    alpha_50 = np.hypot(g50x, g50y)
+    alpha_200 = np.hypot(g200x, g200y)
+    venturi = (1.0 + k_W * H)
+    W = np.empty_like(A)
+    for c, perp_50, perp_200 in ((0, -g50y, -g200y), (1, g50x, g200x)):
+        V = A[..., c] * venturi
+        F_50 = (1.0 - alpha_50) * V + alpha_50 * k_H_50 * perp_50
+        F_200 = (1.0 - alpha_200) * V + alpha_200 * k_H_200 * perp_200
+        W[..., c] = 0.2 * F_50 + 0.8 * F_200
+    if not shadow:
+        return W, None
+
+    # Sombra: celda contra el viento con mayor diferencia de altura en R_s pasos
+    ux, uy, _ = _normalizar(-W[..., 0], -W[..., 1])
+    px, py = _coords(H.shape, (0, 0))
+    Hflat = H.ravel()
+    max_diff = np.full(H.shape, -1e9, dtype=np.float32)
+    qx, qy = px.copy(), py.copy()
+    for step in range(1, R_s + 1):
+        sx = np.clip(px + _rint(ux * step), 0, n0 - 1)
+        sy = np.clip(py + _rint(uy * step), 0, n1 - 1)
+        diff = Hflat[sx * n1 + sy] - H
+        mejor = diff > max_diff
+        np.maximum(max_diff, diff, out=max_diff)
+        qx = _sel(mejor, sx, qx)
+        qy = _sel(mejor, sy, qy)
+
+    dist = np.hypot(qx - px, qy - py).astype(np.float32)
+    angle = np.arctan(max_diff / np.maximum(dist, np.float32(1e-6)))
+    S = np.clip((angle - theta_min) / (theta_max - theta_min), 0.0, 1.0)
+    return W, S.astype(np.float32)
+
+
+# --- ETAPA 2b: wind_shadow_sweep_compute.glsl ---
+# Cómo se calcula la sombra de viento: "march" (marcha de R_s pasos contra el
+# viento en cada celda, la de wind_update) o "sweep" (barridos de horizonte sin
+# límite de alcance, sombra_barrido)
+SHADOW_MODES = ["march", "sweep"]
+
+# Direcciones de barrido en el marco del viento (a, b), cada pi/4 desde +a
+DIRECCIONES_BARRIDO = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]
+
+
+def pesos_direccion(W):
+    """
+    Peso de cada dirección de barrido en cada celda: la dirección contra el
+    viento se interpola linealmente entre las dos de DIRECCIONES_BARRIDO que la
+    rodean. Sin viento todos los pesos son 0 (no hay sombra).
+
+    Returns:
+        tuple: (k0 (n0, n1) int64, f (n0, n1) float32, con_viento (n0, n1) bool);
+            la dirección k0 pesa 1 - f y la k0 + 1 (módulo 8) pesa f.
+    """
+    largo = np.hypot(W[..., 0], W[..., 1])
+    t = (np.arctan2(-W[..., 1], -W[..., 0]) / np.float32(np.pi / 4)).astype(np.float32) % np.float32(8.0)
+    base = np.floor(t)
+    return base.astype(np.int64) % 8, (t - base).astype(np.float32), largo >= 1e-6
+
+
+def _lineas(shape, d):
+    """
+    Líneas de barrido de la dirección `d`: cada una empieza en la celda más
+    contra el viento (la que no tiene vecina en +d) y avanza de a -d.
+
+    Returns:
+        tuple: (a, b, valido), arrays (líneas, pasos); las posiciones fuera del
+            grid (al final de las diagonales cortas) quedan con valido False.
+    """
+    n0, n1 = shape
+    a, b = np.nonzero(np.ones(shape, dtype=bool))
+    inicio = (a + d[0] < 0) | (a + d[0] >= n0) | (b + d[1] < 0) | (b + d[1] >= n1)
+    t = np.arange(max(n0, n1))
+    la = a[inicio][:, None] - t[None, :] * d[0]
+    lb = b[inicio][:, None] - t[None, :] * d[1]
+    valido = (la >= 0) & (la < n0) & (lb >= 0) & (lb < n1)
+    return np.where(valido, la, 0), np.where(valido, lb, 0), valido
+
+
+def horizontes(H, direcciones, theta_min=np.radians(10.0), theta_max=np.radians(15.0)):
+    """
+    Factor de sombra en cada dirección contra el viento de `direcciones` (de
+    DIRECCIONES_BARRIDO) a partir del ángulo al horizonte: el mayor ángulo de
+    elevación hacia cualquier celda de la línea contra el viento, sin límite
+    de distancia.
+
+    Recorre cada línea desde su extremo contra el viento manteniendo la
+    envolvente convexa superior de las celdas ya vistas (una pila). El
+    horizonte de una celda es la tangente desde ella a la envolvente: se
+    desapilan los puntos que quedan debajo de la tangente, que tampoco pueden
+    ser horizonte de las celdas siguientes, así que cada celda entra y sale de
+    la pila una vez y el barrido es lineal. Las comparaciones se hacen con
+    productos cruzados de alturas enteras, exactas. Las líneas de todas las
+    direcciones son independientes y avanzan juntas.
+
+    Returns:
+        np.ndarray: (len(direcciones), n0, n1) float32.
+    """
+    lineas = [_lineas(H.shape, d) for d in direcciones]
+    a = np.concatenate([l[0] for l in lineas])
+    b = np.concatenate([l[1] for l in lineas])
+    valido = np.concatenate([l[2] for l in lineas])
+    cual = np.concatenate([np.full(len(l[0]), k) for k, l in enumerate(lineas)])
+    # De la más larga a la más corta: las líneas que siguen en el paso t son las primeras
+    largos = valido.sum(axis=1)
+    orden = np.argsort(-largos, kind="stable")
+    a, b, valido, cual, largos = a[orden], b[orden], valido[orden], cual[orden], largos[orden]
+    n_lineas, pasos = a.shape
+    # Por paso (t, línea), para leer cada paso contiguo
+    h = np.where(valido, H.astype(np.int64)[a, b], 0).T.copy()
+    # Pila de cada línea: posición y altura de los puntos de la envolvente
+    pila_t = np.zeros((n_lineas, pasos), dtype=np.int64)
+    pila_h = np.zeros((n_lineas, pasos), dtype=np.int64)
+    tope = np.zeros(n_lineas, dtype=np.int64)
+    horizonte_dh = np.zeros((pasos, n_lineas), dtype=np.int64)
+    horizonte_dt = np.zeros((pasos, n_lineas), dtype=np.int64)  # 0: sin celdas contra el viento
+    for t in range(pasos):
+        n = int(np.count_nonzero(largos > t))
+        if n == 0:
+            break
+        filas = np.arange(n)
+        ht = h[t, :n]
+        # Desapilar mientras el penúltimo se vea más alto que el último desde t,
+        # solo sobre las líneas que siguen desapilando
+        cand = np.nonzero(tope[:n] >= 2)[0]
+        while cand.size:
+            i1 = tope[cand] - 1
+            h_c = ht[cand]
+            sacar = ((pila_h[cand, i1 - 1] - h_c) * (t - pila_t[cand, i1])
+                     >= (pila_h[cand, i1] - h_c) * (t - pila_t[cand, i1 - 1]))
+            cand = cand[sacar]
+            tope[cand] -= 1
+            cand = cand[tope[cand] >= 2]
+        top = tope[:n]
+        con_horizonte = top >= 1
+        th = np.maximum(top - 1, 0)
+        horizonte_dh[t, :n] = np.where(con_horizonte, pila_h[filas, th] - ht, 0)
+        horizonte_dt[t, :n] = np.where(con_horizonte, t - pila_t[filas, th], 0)
+        pila_t[filas, top] = t
+        pila_h[filas, top] = ht
+        top += 1
+    horizonte_dh = horizonte_dh.T
+    horizonte_dt = horizonte_dt.T
+
+    largo = np.array([np.hypot(*d) for d in direcciones], dtype=np.float32)[cual][:, None]
+    dist = np.maximum(horizonte_dt, 1).astype(np.float32) * largo
+    angle = np.arctan(horizonte_dh.astype(np.float32) / dist)
+    s = np.clip((angle - theta_min) / (theta_max - theta_min), 0.0, 1.0).astype(np.float32)
+    S = np.zeros((len(direcciones),) + H.shape, dtype=np.float32)
+    k = np.broadcast_to(cual[:, None], a.shape)
+    S[k[valido], a[valido], b[valido]] = np.where(horizonte_dt > 0, s, np.float32(0.0))[valido]
+    return S
+
+
+def sombra_barrido(bedrock, sand, W, theta_min=np.radians(10.0), theta_max=np.radians(15.0)):
+    """
+    Sombra de viento del modo "sweep": el factor de `horizontes` en las dos
+    direcciones de barrido que rodean a la dirección contra el viento de cada
+    celda, interpolado. Solo se barren las direcciones que alguna celda usa
+    (las dominantes del campo de viento). El costo es O(N^2) por dirección y no
+    depende de R_s.
+
+    Returns:
+        np.ndarray: shadow (n0, n1) float32.
+    """
+    H = altura_total(bedrock, sand)
+    k0, f, con_viento = pesos_direccion(W)
+    pesos = []
+    for k in range(len(DIRECCIONES_BARRIDO)):
+        peso = np.where(k0 == k, np.float32(1.0) - f, np.where((k0 + 1) % 8 == k, f, np.float32(0.0)))
+        pesos.append(np.where(con_viento, peso, np.float32(0.0)).astype(np.float32))
+    usadas = [k for k, peso in enumerate(pesos) if (peso > 0.0).any()]
+    S = np.zeros(H.shape, dtype=np.float32)
+    if not usadas:
+        return S
+    factores = horizontes(H, [DIRECCIONES_BARRIDO[k] for k in usadas], theta_min, theta_max)
+    # Mismo orden de suma que el shader: dirección 0 a 7
+    for k, factor in zip(usadas, factores):
+        S += np.where(pesos[k] > 0.0, pesos[k] * factor, np.float32(0.0))
+    return S
+
+
+# --- ETAPA 3: sticky_mask_generation.glsl ---
+def sticky_mask(bedrock, sand, W, R_s, cell_size_m=1.0, h_max=24.0, kb=0.1, slope_deg_thresh=55.0):
+    """
+    Máscaras sticky y de erosión a partir de la primera celda cliff contra el viento.
+
+    Returns:
+        tuple: (sticky (n0, n1) float32, erosion (n0, n1) float32)
+    """
+    H = altura_total(bedrock, sand)
+    ny_, nx_ = H.shape
+    Hflat = H.ravel()
+    py, px = _coords(H.shape, (0, 0))
+
+    ux, uy, largo = _normalizar(-W[..., 0], -W[..., 1])
+    con_viento = largo >= 1e-6
+
+    def H_at(x, y):
+        return Hflat[y * nx_ + x]
+
+    # degrees(atan(dh / horiz)) > slope_deg_thresh  <=>  dh > tan(thresh) * horiz
+    tan_thresh = np.float32(np.tan(np.radians(slope_deg_thresh)))
+
+    def es_cliff(h0, h1, x0, y0, x1, y1):
+        horiz = np.maximum(np.sqrt(((x1 - x0) ** 2 + (y1 - y0) ** 2).astype(np.float32)) * cell_size_m, 1e-6)
+        return (h0 - h1) > tan_thresh * horiz
+
+    # Paso 1: ¿la celda actual ya es cliff respecto a su vecino contra el viento?
+    qx = np.clip(px + _rint(ux), 0, nx_ - 1)
+    qy = np.clip(py + _rint(uy), 0, ny_ - 1)
+    found = con_viento & es_cliff(H, H_at(qx, qy), px, py, qx, qy)
+    cliff_x, cliff_y = px.copy(), py.copy()
+
+    # Marcha contra el viento buscando la primera celda que cumpla
+    activa = con_viento & ~found
+    cx, cy, Hc = px.copy(), py.copy(), H.copy()
+    for step in range(1, R_s + 1):
+        if not activa.any():
+            break
+        nx = np.clip(px + _rint(ux * step), 0, nx_ - 1)
+        ny = np.clip(py + _rint(uy * step), 0, ny_ - 1)
+        Hn = H_at(nx, ny)
+        hit = activa & es_cliff(Hc, Hn, cx, cy, nx, ny)
+        cliff_x = _sel(hit, nx, cliff_x)
+        cliff_y = _sel(hit, ny, cliff_y)
+        found |= hit
+        activa &= ~hit
+        cx = _sel(activa, nx, cx)
+        cy = _sel(activa, ny, cy)
+        Hc = _sel(activa, Hn, Hc)
+
+    # Paso 2: altura del cliff h_o respecto a su vecino contra el viento
+    nx = np.clip(cliff_x + _rint(ux), 0, nx_ - 1)
+    ny = np.clip(cliff_y + _rint(uy), 0, ny_ - 1)
+    h_o = np.clip(H_at(cliff_x, cliff_y) - H_at(nx, ny), 0.0, h_max)
+    d_min = 0.4 * h_o
+    d_max = 2.0 * h_o
+    efecto = found & (d_max > 1e-6)
+
+    # Paso 3: máscaras según la distancia desde la cliff cell
+    d = np.hypot(px - cliff_x, py - cliff_y) * cell_size_m
+    erosion = np.zeros(H.shape, dtype=np.float32)
+    sticky = np.full(H.shape, kb, dtype=np.float32)
+    ero = efecto & (d <= d_min)
+    stk = efecto & ~ero & (d <= d_max)
+    t = (d - d_min) / np.maximum(d_max - d_min, 1e-6)
+    erosion[ero] = 1.0
+    sticky[stk] = (kb + (1.0 - t) * (1.0 - kb))[stk]
+    sticky[efecto] = np.clip(sticky[efecto], 0.0, 1.0)
+    return sticky, erosion
+
+
+# --- ETAPA 4: sand_transport_compute.glsl ---
+def sand_transport_destinos(obstacles, W, shadow, sticky, R_s, cell_size_m=1.0, origin=(0, 0)):
+    """
+    Celda (índice plano) donde termina la arena levantada desde cada celda, y la
+    máscara de celdas que no levantan arena (obstáculo, sticky o sombra).
+
+    El destino solo depende de las máscaras, que son constantes durante la etapa,
+    así que puede calcularse de una vez para todo el grid.
+    """
+    ny_, nx_ = obstacles.shape
+    py, px = _coords(obstacles.shape, (0, 0))
+    gy, gx = _coords(obstacles.shape, origin)
+    r = _rand(gx, gy)
+    quieta = (obstacles > 0) | (r < sticky) | (r < shadow)
+
+    R = r.ravel()
+    obst = obstacles.ravel() > 0
+    sticky_f = sticky.ravel()
+    shadow_f = shadow.ravel()
+
+    sx_, sy_, _ = _normalizar(W[..., 0], W[..., 1])
+    sx = _rint(sx_ * cell_size_m)
+    sy = _rint(sy_ * cell_size_m)
+
+    dest = (py * nx_ + px).copy()
+    done = quieta.copy()
+    qx, qy = px.copy(), py.copy()
+    for _ in range(R_s):
+        if done.all():
+            break
+        qx = np.clip(qx + sx, 0, nx_ - 1)
+        qy = np.clip(qy + sy, 0, ny_ - 1)
+        q = qy * nx_ + qx
+
+        # Obstáculo: se deposita en la celda anterior de la marcha
+        hit_ob = ~done & obst[q]
+        bx = np.clip(qx - sx, 0, nx_ - 1)
+        by = np.clip(qy - sy, 0, ny_ - 1)
+        dest = _sel(hit_ob, by * nx_ + bx, dest)
+        done |= hit_ob
+
+        rq = R[q]
+        dep = ~done & ((rq < sticky_f[q]) | (rq < shadow_f[q]))
+        dest = _sel(dep, q, dest)
+        done |= dep
+    return dest.ravel(), quieta
+
+
+def sand_levantada(sand, erosion, quieta, sand_transport_block_count):
+    """Slabs que levanta cada celda (0 en las celdas quietas)."""
+    t = np.full(sand.shape, sand_transport_block_count, dtype=np.int64)
+    t = _sel(erosion > 0.0, (t * (1.0 + erosion)).astype(np.int64), t)
+    return np.minimum(sand.astype(np.int64), t) * ~quieta
+
+
+def sand_transport(sand, obstacles, W, shadow, sticky, erosion, R_s, cell_size_m=1.0,
+                   sand_transport_block_count=2, origin=(0, 0)):
+    """
+    Transporte eólico: cada celda levanta hasta `sand_transport_block_count` slabs
+    (más con erosión) y los deposita donde corta la marcha a favor del viento.
+
+    Returns:
+        np.ndarray: Nuevo array de arena (uint32), misma forma que `sand`.
+    """
+    dest, quieta = sand_transport_destinos(obstacles, W, shadow, sticky, R_s, cell_size_m, origin)
+    levantada = sand_levantada(sand, erosion, quieta, sand_transport_block_count)
+    return _mover(sand, levantada.ravel(), dest)
+
+
+
+def _mover(sand, cantidad, dest):
+    """Resta `cantidad` de cada celda y la suma en `dest` (índices planos)."""
+    entrada = np.zeros(sand.size, dtype=np.int64)
+    np.add.at(entrada, dest, cantidad)
+    nueva = sand.astype(np.int64).ravel() - cantidad + entrada
+    return nueva.astype(np.uint32).reshape(sand.shape)
+
+
+# --- ETAPA 5: sand_cascade_compute.glsl ---
+def sand_cascade_flujo(bedrock, sand, obstacles, tan_repose_angle, transfer_rate=0.25, cell_size_m=1.0):
+    """
+    Calcula, para cada celda, cuántos slabs caen y hacia qué vecino.
+
+    Todas las celdas leen las mismas alturas (versión síncrona del scatter del
+    shader, que en la GPU lee alturas mientras otras invocaciones escriben).
+    Coincide con el modo "gather" de la GPU (sand_cascade_flux_compute.glsl).
+
+    Returns:
+        tuple: (cantidad (n0, n1) int64, target (n0, n1) int8), con `target` el
+        índice en VECINOS del vecino que recibe la arena (-1 si no cae nada).
+    """
+    H = altura_total(bedrock, sand)
+    ny_, nx_ = H.shape
+    bloqueada = np.where(obstacles > 0, np.float32(np.inf), H)
+    Hpad = np.pad(bloqueada, 1, mode="constant", constant_values=np.inf)
+
+    # Partimos del ángulo de reposo: solo cuentan pendientes que lo superen
+    # (equivale a diff > 0 && slope > tan && slope > max_slope_diff del shader).
+    best_slope = np.full(H.shape, max(tan_repose_angle, 0.0), dtype=np.float32)
+    target = np.full(H.shape, -1, dtype=np.int8)
+    slope = np.empty(H.shape, dtype=np.float32)
+    mejor = np.empty(H.shape, dtype=bool)
+    for k, (dx, dy) in enumerate(VECINOS):
+        dist = np.float32((SQRT2 if dx != 0 and dy != 0 else 1.0) * cell_size_m)
+        np.subtract(H, Hpad[1 + dy:1 + dy + ny_, 1 + dx:1 + dx + nx_], out=slope)
+        slope /= dist
+        np.greater(slope, best_slope, out=mejor)
+        np.maximum(best_slope, slope, out=best_slope)
+        target = _sel(mejor.view(np.int8), np.int8(k), target)
+
+    # Diferencia de altura exacta con el vecino elegido
+    offsets = np.array([dy * (nx_ + 2) + dx for dx, dy in VECINOS], dtype=np.int64)
+    dists = np.array([(SQRT2 if dx != 0 and dy != 0 else 1.0) * cell_size_m for dx, dy in VECINOS],
+                     dtype=np.float32)
+    tiene = target >= 0
+    k = np.maximum(target, 0)
+    centro = (np.arange(ny_)[:, None] + 1) * (nx_ + 2) + np.arange(nx_)[None, :] + 1
+    Hn = np.pad(H, 1, mode="edge").ravel()[centro + offsets[k]]
+    excess = (H - Hn) - np.float32(tan_repose_angle) * dists[k]
+
+    mueve = tiene & (obstacles == 0) & (sand > 0) & (excess > 0.0)
+    cantidad = np.maximum(np.float32(1.0), excess * np.float32(0.5 * transfer_rate)).astype(np.int64)
+    cantidad = np.minimum(cantidad, sand) * mueve
+    return cantidad, _sel(mueve.view(np.int8), target, np.int8(-1))
+
+
+def sand_cascade_recoger(sand, cantidad, target):
+    """
+    Aplica el flujo: cada celda pierde su salida y recoge lo que le envían sus
+    8 vecinos. Es un gather sobre vistas desplazadas, sin escrituras dispersas.
+    """
+    ny_, nx_ = sand.shape
+    salida = np.pad(cantidad, 1)
+    tpad = np.pad(target, 1, constant_values=-1)
+    nueva = sand.astype(np.int64) - cantidad
+    for k, (dx, dy) in enumerate(VECINOS):
+        # El vecino en p - (dx, dy) envía a p si eligió la dirección k
+        sl = (slice(1 - dy, 1 - dy + ny_), slice(1 - dx, 1 - dx + nx_))
+        nueva += (tpad[sl] == k) * salida[sl]
+    return nueva.astype(np.uint32)
+
+
+def sand_cascade(bedrock, sand, obstacles, tan_repose_angle, transfer_rate=0.25, cell_size_m=1.0):
+    """
+    Una iteración de avalancha.
+
+    Returns:
+        tuple: (nueva arena uint32, slabs movidos)
+    """
+    cantidad, target = sand_cascade_flujo(bedrock, sand, obstacles, tan_repose_angle,
+                                          transfer_rate, cell_size_m)
+    return sand_cascade_recoger(sand, cantidad, target), int(cantidad.sum())
+
+
+class NumpySandEngine:
+    """
+    Estado completo de la simulación en arrays NumPy, con los mismos buffers y
+    parámetros que la versión GPU de `sand_move`.
+
+    Los buffers se exponen planos (N*N,), como los SSBOs, para poder subirlos o
+    compararlos directamente con los datos leídos de la GPU.
+    """
+
+    def __init__(self, bedrock, sand, obstacles, N=None,
+                 R_s=10, kb=0.1, repose_angle=33.0, transfer_rate=0.25, cascade_iterations=10,
+                 cell_size_m=1.0, h_max=24.0, slope_deg_thresh=55.0, sand_transport_block_count=2,
+                 cascade_tolerance=0, smoothing_interval=1, shadow_mode="march"):
+        self.N = N if N is not None else int(round(np.sqrt(np.asarray(sand).size)))
+        n_cells = self.N * self.N
+
+        self.bedrock_slabs = self._buffer("bedrock_slabs", n_cells, np.uint32, bedrock)
+        self.sand_slabs = self._buffer("sand_slabs", n_cells, np.uint32, sand, copy=True)
+        self.obstacles = self._buffer("obstacles", n_cells, np.uint32, obstacles)
+
+        # Buffers intermedios (mismo tamaño que los SSBOs vacíos)
+        self.wind_height_field = self._buffer("wind_height_field", (n_cells, 2), np.float32)
+        self.wind_field = self._buffer("wind_field", (n_cells, 2), np.float32)
+        self.wind_shadowing = self._buffer("wind_shadowing", n_cells, np.float32)
+        self.sticky_mask = self._buffer("sticky_mask", n_cells, np.float32)
+        self.erosion_mask = self._buffer("erosion_mask", n_cells, np.float32)
+        # (H_50, H_200): alturas suavizadas que desvían el viento
+        self.smoothed_heights = self._buffer("smoothed_heights", (n_cells, 2), np.float32)
+
+        self.R_s = R_s
+        self.kb = kb
+        self.repose_angle = repose_angle
+        self.transfer_rate = transfer_rate
+        self.cascade_iterations = cascade_iterations
+        self.cell_size_m = cell_size_m
+        self.h_max = h_max
+        self.slope_deg_thresh = slope_deg_thresh
+        self.sand_transport_block_count = sand_transport_block_count
+        self.cascade_tolerance = cascade_tolerance
+        # H_50 y H_200 cambian despacio: se recalculan cada tantos pasos
+        self.smoothing_interval = smoothing_interval
+        # Radios con los que se calcularon (None: hay que calcularlos)
+        self.smoothed_radii = None
+        # Sombra por marcha de R_s pasos o por barridos de horizonte (SHADOW_MODES)
+        self.shadow_mode = shadow_mode
+
+        # Coordenada global de la celda [0, 0] cuando la grilla es una ventana de
+        # un mundo más grande (ver paged.py); afecta el campo base y el hash del transporte
+        self.origin = (0, 0)
+
+        self.last_cascade_iterations = 0
+        self.steps = 0
+
+    def _buffer(self, nombre, shape, dtype, data=None, copy=False):
+        """
+        Memoria de un buffer del estado. `data` se usa tal cual salvo con
+        `copy=True` (ver tiled_engine.TiledSandEngine, que la pone en memoria
+        compartida).
+        """
+        if data is None:
+            return np.zeros(shape, dtype=dtype)
+        arr = np.ascontiguousarray(data, dtype=dtype).reshape(shape)
+        return arr.copy() if copy else arr
+
+    def _grid(self, buf):
+        return buf.reshape((self.N, self.N) + buf.shape[1:])
+
+    # --- Etapas (mismas fronteras que los dispatch de la GPU) ---
+    def _toca_suavizar(self):
+        """Si en este paso hay que recalcular H_50 y H_200."""
+        return (self.smoothed_radii != radios_suavizado(self.cell_size_m)
+                or self.steps % max(1, self.smoothing_interval) == 0)
+
+    def run_smooth_heights(self):
+        """Recalcula H_50 y H_200 si toca en este paso. Devuelve si los recalculó."""
+        if not self._toca_suavizar():
+            return False
+        S = smoothed_heights(self._grid(self.bedrock_slabs), self._grid(self.sand_slabs), self.cell_size_m)
+        self.smoothed_heights[:] = S.reshape(-1, 2)
+        self.smoothed_radii = radios_suavizado(self.cell_size_m)
+        return True
+
+    def run_wind_heightfield(self):
+        A = wind_heightfield(self._grid(self.bedrock_slabs), self._grid(self.sand_slabs), self.origin)
+        self.wind_height_field[:] = A.reshape(-1, 2)
+
+    def run_wind_update(self):
+        W, S = wind_update(self._grid(self.bedrock_slabs), self._grid(self.sand_slabs),
+                           self._grid(self.wind_height_field), self.R_s,
+                           smoothed=self._grid(self.smoothed_heights), shadow=self.shadow_mode == "march")
+        self.wind_field[:] = W.reshape(-1, 2)
+        if S is not None:
+            self.wind_shadowing[:] = S.ravel()
+
+    def run_wind_shadow_sweep(self):
+        """Con shadow_mode "sweep", reemplaza la sombra por la de los barridos de horizonte."""
+        if self.shadow_mode not in SHADOW_MODES:
+            raise ValueError(f"shadow_mode desconocido: {self.shadow_mode!r} (opciones: {SHADOW_MODES})")
+        if self.shadow_mode != "sweep":
+            return False
+        S = sombra_barrido(self._grid(self.bedrock_slabs), self._grid(self.sand_slabs), self._grid(self.wind_field))
+        self.wind_shadowing[:] = S.ravel()
+        return True
+
+    def run_sticky_mask(self):
+        sticky, erosion = sticky_mask(self._grid(self.bedrock_slabs), self._grid(self.sand_slabs),
+                                      self._grid(self.wind_field), self.R_s, self.cell_size_m,
+                                      self.h_max, self.kb, self.slope_deg_thresh)
+        self.sticky_mask[:] = sticky.ravel()
+        self.erosion_mask[:] = erosion.ravel()
+
+    def run_sand_transport(self):
+        nueva = sand_transport(self._grid(self.sand_slabs), self._grid(self.obstacles),
+                               self._grid(self.wind_field), self._grid(self.wind_shadowing),
+                               self._grid(self.sticky_mask), self._grid(self.erosion_mask),
+                               self.R_s, self.cell_size_m, self.sand_transport_block_count, self.origin)
+        self.sand_slabs[:] = nueva.ravel()
+
+    def run_sand_cascade(self):
+        """
+        Itera la cascada hasta `cascade_iterations` veces, cortando en cuanto una
+        iteración mueve `cascade_tolerance` slabs o menos (con 0 el resultado es
+        idéntico a hacer todas: una iteración que no mueve nada es un punto fijo).
+        """
+        tan_repose = float(np.tan(np.radians(self.repose_angle)))
+        movidos = 0
+        iteraciones = 0
+        for _ in range(self.cascade_iterations):
+            nueva, m = sand_cascade(self._grid(self.bedrock_slabs), self._grid(self.sand_slabs),
+                                    self._grid(self.obstacles), tan_repose, self.transfer_rate,
+                                    self.cell_size_m)
+            self.sand_slabs[:] = nueva.ravel()
+            movidos += m
+            iteraciones += 1
+            if m <= self.cascade_tolerance:
+                break
+        self.last_cascade_iterations = iteraciones
+        return movidos
+
+    def step(self):
+        """Avanza un paso completo de la simulación."""
+        self.run_smooth_heights()
+        self.run_wind_heightfield()
+        self.run_wind_update()
+        self.run_wind_shadow_sweep()
+        self.run_sticky_mask()
+        self.run_sand_transport()
+        self.run_sand_cascade()
+        self.steps += 1
+
+    def run(self, n_steps):
+        for _ in range(n_steps):
+            self.step()
+
+    def save_checkpoint(self, path, compress=True):
+        """Guarda el estado completo y los parámetros (ver implementations/sand_move/checkpoint.py)."""
+        arrays = {nombre: getattr(self, attr) for nombre, (attr, _, _, _) in checkpoint.ESTADO.items()}
+        checkpoint.guardar(path, self, arrays, compress)
+
+    def load_checkpoint(self, path):
+        """Restaura un checkpoint (de este motor o del de GPU) sobre los arrays actuales."""
+        with checkpoint.abrir(path, self.N) as ckpt:
+            for nombre, (attr, _, _, _) in checkpoint.ESTADO.items():
+                if nombre in ckpt:
+                    ckpt.read_into(nombre, getattr(self, attr))
+                else:
+                    getattr(self, attr)[:] = 0
+            checkpoint.aplicar_parametros(self, ckpt.params)
+            # Sin las alturas suavizadas (checkpoints viejos) se recalculan en el próximo paso
+            self.smoothed_radii = radios_suavizado(self.cell_size_m) if "smoothed_heights" in ckpt else None
@@ -0,0 +1,748 @@
+from OpenGL import GL
+import numpy as np
+from contextlib import contextmanager
+from utils.tracing import tracer
+from utils.load_pipeline import compute_program_pipeline
+from utils.gl_utils import SSBO
+from implementations.sand_move import checkpoint
+from implementations.sand_move import packed_state as ps
+from implementations.sand_move.cpu_engine import radios_suavizado, SHADOW_MODES
+from implementations.sand_move.sparse_engine import radio_actividad
+
+# Variantes del kernel de cascada
+CASCADE_MODES = ["atomic", "tiled", "gather"]
+
+# Deben coincidir con los #define de sand_cascade_tiled_compute.glsl
+CASCADE_TILE = 16
+CASCADE_MAX_SUB_ITERATIONS = 4
+
+
+class GPUSandSimulation:
+    """
+    Cadena de compute shaders de `sand_move` y los SSBOs que usa.
+
+    Misma interfaz que `NumpySandEngine`: los parámetros son atributos que se
+    pueden cambiar entre pasos y cada etapa tiene su `run_*`. Con
+    `fused_wind=True` las etapas de viento y máscaras se ejecutan en un solo
+    dispatch (wind_fused_compute.glsl) en vez de tres.
+
+    La cascada es adaptativa: el shader cuenta los slabs movidos en un buffer de
+    contadores y el host corta las iteraciones cuando una mueve `cascade_tolerance`
+    slabs o menos. `cascade_iterations` queda como tope de seguridad. Leer los
+    contadores espera a la GPU, así que cada iteración escribe en su propio par
+    de contadores y el host los lee juntos cada `cascade_check_interval`
+    iteraciones: puede hacer hasta `cascade_check_interval - 1` iteraciones de
+    más (con tolerancia 0 no mueven nada).
+
+    `cascade_mode` elige el kernel de cascada: "atomic" (sand_cascade_compute.glsl,
+    un dispatch por iteración) o "tiled" (sand_cascade_tiled_compute.glsl, hasta
+    `cascade_sub_iterations` relajaciones por dispatch en memoria compartida) o
+    "gather" (pase de flujo + pase de gather sobre dos buffers de arena, sin
+    atómicos sobre la arena y reproducible bit a bit).
+
+    Las alturas suavizadas H_50 y H_200 (height_smooth_compute.glsl, dos pases
+    de sumas corridas) se recalculan cada `smoothing_interval` pasos y quedan en
+    `smoothed_heights_ssbo` (vec2 float32 en los dos layouts).
+
+    Con `shadow_mode="sweep"` la sombra de viento sale de barridos de horizonte
+    sin límite de alcance (wind_shadow_sweep_compute.glsl) en vez de la marcha
+    de R_s pasos, y solo se barren las direcciones que usa el viento. No tiene
+    un alcance acotado, así que no se puede combinar con `sparse_tiles`.
+
+    Si `timer` es un `GPUTimer`, cada etapa de `step` se mide por separado en la
+    GPU; en la CPU cada etapa queda como span de `utils.tracing.tracer`.
+
+    Con `packed_state=True` el estado usa el layout compacto de
+    shaders/cell_state.glsl (~16 bytes por celda en vez de 40): arena y bedrock
+    de 16 bits en una palabra, obstáculos como bits, máscaras de 8 bits y viento
+    en half2. Solo existe para el viento fusionado y las tres cascadas; las
+    etapas de viento separadas siguen en el layout completo, así que en este
+    modo siempre se usa el pase fusionado. El render necesita arena y bedrock en
+    uint32: con `unpacked_copies=True` se mantienen `sand_ssbo`, `bedrock_ssbo`
+    y `obstacles_ssbo` como copias que `sync_unpacked()` actualiza; sin ellas
+    (modo batch) esos atributos son None y se ahorra esa memoria. Una celda que
+    junta más de 65535 slabs de arena se satura en vez de pasarse al bedrock;
+    `read_state()` y `check_sand_overflow()` fallan si eso pasó.
+
+    Con `sparse_tiles=True` cada paso procesa solo los tiles (de un work group)
+    donde se movió arena en el paso anterior y sus vecinos (ver
+    sparse_engine.py y shaders/sparse_tiles.glsl): sparse_plan_compute.glsl
+    arma la lista de tiles y el comando de glDispatchComputeIndirect (el grid
+    completo si entran todos los tiles), y el transporte y la cascada marcan
+    los tiles que se mueven. Como en el layout
+    compacto, usa siempre el viento fusionado; la cascada "tiled" se ejecuta
+    como "gather". Con "gather" el resultado es idéntico al del grid completo.
+    """
+
+    def __init__(self, shader_path, N, sand, bedrock, obstacles, group_size_x=32, group_size_y=32,
+                 R_s=10, kb=0.1, repose_angle=33.0, transfer_rate=0.25, cascade_iterations=10,
+                 cell_size_m=1.0, h_max=24.0, slope_deg_thresh=55.0, sand_transport_block_count=2,
+                 fused_wind=True, adaptive_cascade=True, cascade_tolerance=0, cascade_check_interval=4,
+                 cascade_mode="atomic", cascade_sub_iterations=CASCADE_MAX_SUB_ITERATIONS,
+                 packed_state=False, unpacked_copies=True, sparse_tiles=False, smoothing_interval=1,
+                 shadow_mode="march"):
+        self.N = N
+        self.packed_state = packed_state
+        self.unpacked_copies = unpacked_copies
+        self.sparse_tiles = sparse_tiles
+        defines = {}
+        if packed_state:
+            defines["PACKED_STATE"] = 1
+        if sparse_tiles:
+            if group_size_x != group_size_y:
+                raise ValueError("sparse_tiles necesita work groups cuadrados (el tile es el work group)")
+            defines["SPARSE_TILES"] = 1
+        defines = defines or None
+        self.grid_blocks = ((N + group_size_x - 1) // group_size_x, (N + group_size_y - 1) // group_size_y)
+        self.tile_blocks = ((N + CASCADE_TILE - 1) // CASCADE_TILE, (N + CASCADE_TILE - 1) // CASCADE_TILE)
+
+        self.wind_heightfield_compute = compute_program_pipeline(shader_path / "wind_heightfield_compute.glsl")
+        self.wind_update_compute = compute_program_pipeline(shader_path / "wind_update_compute.glsl")
+        self.sticky_mask_compute = compute_program_pipeline(shader_path / "sticky_mask_generation.glsl")
+        self.wind_fused_compute = compute_program_pipeline(shader_path / "wind_fused_compute.glsl", defines)
+        self.sand_transport_compute = compute_program_pipeline(shader_path / "sand_transport_compute.glsl", defines)
+        self.sand_cascade_compute = compute_program_pipeline(shader_path / "sand_cascade_compute.glsl", defines)
+        self.sand_cascade_tiled_compute = compute_program_pipeline(shader_path / "sand_cascade_tiled_compute.glsl", defines)
+        self.sand_cascade_flux_compute = compute_program_pipeline(shader_path / "sand_cascade_flux_compute.glsl", defines)
+        self.sand_cascade_gather_compute = compute_program_pipeline(shader_path / "sand_cascade_gather_compute.glsl", defines)
+        self.height_smooth_compute = compute_program_pipeline(shader_path / "height_smooth_compute.glsl", defines)
+        self.wind_shadow_sweep_compute = compute_program_pipeline(shader_path / "wind_shadow_sweep_compute.glsl", defines)
+
+        # --- SSBOs ---
+        self.sand_ssbo = self.bedrock_ssbo = self.obstacles_ssbo = None
+        self.wind_shadowing_ssbo = self.sticky_mask_ssbo = self.erosion_mask_ssbo = None
+        self.cells_ssbo = self.obstacle_bits_ssbo = self.masks_ssbo = None
+        if packed_state:
+            self.cell_state_unpack_compute = compute_program_pipeline(shader_path / "cell_state_unpack_compute.glsl")
+            compacto = ps.pack_state({"sand": sand, "bedrock": bedrock, "obstacles": obstacles})
+            self.cells_ssbo = SSBO(compacto["cells"], compacto["cells"].nbytes, GL.GL_DYNAMIC_DRAW)
+            self.obstacle_bits_ssbo = SSBO(compacto["obstacle_bits"], compacto["obstacle_bits"].nbytes, GL.GL_STATIC_DRAW)
+            self.wind_heightfield_ssbo = SSBO(None, N * N * 4, GL.GL_DYNAMIC_DRAW)
+            self.wind_field_ssbo = SSBO(None, N * N * 4, GL.GL_DYNAMIC_DRAW)
+            self.masks_ssbo = SSBO(None, N * N * 4, GL.GL_DYNAMIC_DRAW)
+            if unpacked_copies:
+                self.sand_ssbo = SSBO(sand, sand.nbytes, GL.GL_DYNAMIC_DRAW)
+                self.bedrock_ssbo = SSBO(bedrock, bedrock.nbytes, GL.GL_DYNAMIC_DRAW)
+                self.obstacles_ssbo = SSBO(obstacles, obstacles.nbytes, GL.GL_STATIC_DRAW)
+        else:
+            self.sand_ssbo = SSBO(sand, sand.nbytes, GL.GL_DYNAMIC_DRAW)
+            self.bedrock_ssbo = SSBO(bedrock, bedrock.nbytes, GL.GL_DYNAMIC_DRAW)
+            self.obstacles_ssbo = SSBO(obstacles, obstacles.nbytes, GL.GL_STATIC_DRAW)
+
+            # Intermedios
+            empty_bytes = N * N * 2 * 4  # vec2 * float size
+            self.wind_heightfield_ssbo = SSBO(None, empty_bytes, GL.GL_DYNAMIC_DRAW)
+            self.wind_field_ssbo = SSBO(None, empty_bytes, GL.GL_DYNAMIC_DRAW)
+            self.wind_shadowing_ssbo = SSBO(None, N * N * 4, GL.GL_DYNAMIC_DRAW)
+            self.sticky_mask_ssbo = SSBO(None, N * N * 4, GL.GL_DYNAMIC_DRAW)
+            self.erosion_mask_ssbo = SSBO(None, N * N * 4, GL.GL_DYNAMIC_DRAW)
+
+        # (H_50, H_200) y las sumas por fila del primer pase (dvec2)
+        self.smoothed_heights_ssbo = SSBO(None, N * N * 2 * 4, GL.GL_DYNAMIC_COPY)
+        self.smooth_row_sums_ssbo = SSBO(None, N * N * 2 * 8, GL.GL_DYNAMIC_COPY)
+        # Barridos de sombra: suma por celda, pilas de las líneas y un comando indirecto por dirección
+        self.shadow_sweep_ssbo = SSBO(None, N * N * 4, GL.GL_DYNAMIC_COPY)
+        self.horizon_stack_ssbo = SSBO(None, N * N * 4, GL.GL_DYNAMIC_COPY)
+        self.sweep_commands_ssbo = SSBO(self._comandos_barrido(), 8 * 3 * 4, GL.GL_DYNAMIC_DRAW)
+
+        # Buffer del binding 1: la arena, o las celdas empaquetadas
+        self.state_ssbo = self.cells_ssbo if packed_state else self.sand_ssbo
+        self.unpacked_dirty = False
+
+        # Segundo buffer de arena para las cascadas que no escriben en su entrada
+        self.sand_tmp_ssbo = SSBO(None, N * N * 4, GL.GL_DYNAMIC_COPY)
+        # Flujo de la cascada "gather": cantidad << 3 | dirección
+        self.cascade_flux_ssbo = SSBO(None, N * N * 4, GL.GL_DYNAMIC_COPY)
+
+        # (slabs movidos, bits del exceso máximo) por iteración de cascada, uno
+        # cada `counters_stride` bytes para enlazarlos con glBindBufferRange. El
+        # primer slot es el contador de sumas de arena saturadas del layout
+        # compacto (ver shaders/cell_state.glsl y check_sand_overflow)
+        alineacion = int(GL.glGetIntegerv(GL.GL_SHADER_STORAGE_BUFFER_OFFSET_ALIGNMENT))
+        self.counters_stride = -(-8 // alineacion) * alineacion
+        self.cascade_counters_ssbo = SSBO(None, self.counters_stride * (1 + max(1, cascade_check_interval)),
+                                          GL.GL_DYNAMIC_READ)
+        self.cascade_counters_ssbo.clear()
+
+        # Despacho disperso: actividad por tile, lista de tiles a procesar y su comando indirecto
+        self.tile_size = group_size_x
+        self.tiles_per_side = self.grid_blocks[0]
+        n_tiles = self.tiles_per_side * self.tiles_per_side
+        self.tile_activity_ssbo = self.active_tiles_ssbo = self.tile_dispatch_ssbo = self.tile_dispatched_ssbo = None
+        if sparse_tiles:
+            self.sparse_plan_compute = compute_program_pipeline(shader_path / "sparse_plan_compute.glsl")
+            self.tile_activity_ssbo = SSBO(np.ones(n_tiles, dtype=np.uint32), n_tiles * 4, GL.GL_DYNAMIC_COPY)
+            self.active_tiles_ssbo = SSBO(None, n_tiles * 4, GL.GL_DYNAMIC_COPY)
+            self.tile_dispatched_ssbo = SSBO(None, n_tiles * 4, GL.GL_DYNAMIC_COPY)
+            self.tile_dispatch_ssbo = SSBO(self._plan_vacio(), 16, GL.GL_DYNAMIC_DRAW)
+        self._params_plan = None
+
+        self.R_s = R_s
+        self.kb = kb
+        self.repose_angle = repose_angle
+        self.transfer_rate = transfer_rate
+        self.cascade_iterations = cascade_iterations
+        self.cell_size_m = cell_size_m
+        self.h_max = h_max
+        self.slope_deg_thresh = slope_deg_thresh
+        self.sand_transport_block_count = sand_transport_block_count
+        self.fused_wind = fused_wind
+        self.adaptive_cascade = adaptive_cascade
+        self.cascade_tolerance = cascade_tolerance
+        self.cascade_check_interval = cascade_check_interval
+        self.cascade_mode = cascade_mode
+        self.cascade_sub_iterations = cascade_sub_iterations
+        self.smoothing_interval = smoothing_interval
+        # Radios con los que se calcularon H_50 y H_200 (None: hay que calcularlos)
+        self.smoothed_radii = None
+        self.shadow_mode = shadow_mode
+
+        # Estadísticas del último paso
+        self.last_cascade_iterations = 0
+        self.last_cascade_moved = 0
+        self.last_cascade_max_excess = 0.0
+
+        self.timer = None
+        # Coordenada global (fila, columna) de la celda 0 cuando la grilla es
+        # una ventana de un mundo más grande (ver paged.py)
+        self.origin = (0, 0)
+        self.steps = 0
+
+    @property
+    def uses_fused_wind(self):
+        # Las etapas de viento separadas solo existen en el layout completo y sin tiles
+        return self.fused_wind or self.packed_state or self.sparse_tiles
+
+    @staticmethod
+    def _comando_vacio():
+        # (num_groups_x, num_groups_y, num_groups_z) de glDispatchComputeIndirect
+        return np.array([0, 1, 1], dtype=np.uint32)
+
+    @classmethod
+    def _plan_vacio(cls):
+        # Comando del despacho disperso más la marca de plan denso (ver sparse_plan_compute.glsl)
+        return np.append(cls._comando_vacio(), np.uint32(0))
+
+    @classmethod
+    def _comandos_barrido(cls):
+        # Uno por dirección de barrido; el pase 0 del shader habilita los que se usan
+        return np.tile(cls._comando_vacio(), 8)
+
+    def mark_all_active(self):
+        """Procesa todo el grid en el próximo paso (terreno o estado reemplazados)."""
+        if self.sparse_tiles:
+            self.tile_activity_ssbo.write(np.ones(self.tiles_per_side * self.tiles_per_side, dtype=np.uint32))
+
+    def _plan_params(self):
+        return (self.R_s, self.kb, self.repose_angle, self.transfer_rate, self.cascade_iterations,
+                self.cell_size_m, self.h_max, self.slope_deg_thresh, self.sand_transport_block_count,
+                self.cascade_mode, tuple(self.origin))
+
+    def plan_tiles(self):
+        """
+        Arma la lista de tiles del paso a partir de la actividad del anterior y
+        deja la actividad en cero para que el transporte y la cascada la marquen.
+        Si entran todos los tiles, el plan queda denso y las etapas se despachan
+        sobre el grid completo.
+        """
+        if self._plan_params() != self._params_plan:
+            self.mark_all_active()
+            self._params_plan = self._plan_params()
+        self.tile_dispatch_ssbo.write(self._plan_vacio())
+
+        n_tiles = self.tiles_per_side * self.tiles_per_side
+        self.sparse_plan_compute.use()
+        self.sparse_plan_compute["tiles_per_side"] = self.tiles_per_side
+        self.sparse_plan_compute["radius"] = radio_actividad(self.R_s, self.cell_size_m, self.cascade_iterations,
+                                                             self.tile_size)
+        self.tile_activity_ssbo.bind_SSBO_to_position(17)
+        self.active_tiles_ssbo.bind_SSBO_to_position(18)
+        self.tile_dispatch_ssbo.bind_SSBO_to_position(19)
+        self.tile_dispatched_ssbo.bind_SSBO_to_position(20)
+        self.sparse_plan_compute["pass"] = 0
+        self.sparse_plan_compute.dispatch((n_tiles + 63) // 64, 1, 1)
+        GL.glMemoryBarrier(GL.GL_SHADER_STORAGE_BARRIER_BIT)
+        self.sparse_plan_compute["pass"] = 1
+        self.sparse_plan_compute.dispatch(1, 1, 1)
+        GL.glMemoryBarrier(GL.GL_SHADER_STORAGE_BARRIER_BIT | GL.GL_COMMAND_BARRIER_BIT)
+
+        self.tile_activity_ssbo.clear()
+
+    def active_fraction(self):
+        """Fracción de tiles procesados en el último paso (lee 4 bytes de la GPU)."""
+        if not self.sparse_tiles:
+            return 1.0
+        comando = self.tile_dispatch_ssbo.read_data((4,), np.uint32)
+        if comando[3]:
+            return 1.0
+        return int(comando[0]) / (self.tiles_per_side * self.tiles_per_side)
+
+    def upload(self, sand, bedrock, obstacles):
+        """Reemplaza el terreno (reutilizando los SSBOs) y limpia el viento viejo."""
+        if self.sand_ssbo is not None:
+            self.sand_ssbo.setup_SSBO(sand, sand.nbytes, GL.GL_DYNAMIC_DRAW)
+            self.bedrock_ssbo.setup_SSBO(bedrock, bedrock.nbytes, GL.GL_DYNAMIC_DRAW)
+            self.obstacles_ssbo.setup_SSBO(obstacles, obstacles.nbytes, GL.GL_STATIC_DRAW)
+
+        if self.packed_state:
+            compacto = ps.pack_state({"sand": sand, "bedrock": bedrock, "obstacles": obstacles})
+            self.cells_ssbo.setup_SSBO(compacto["cells"], compacto["cells"].nbytes, GL.GL_DYNAMIC_DRAW)
+            self.obstacle_bits_ssbo.setup_SSBO(compacto["obstacle_bits"], compacto["obstacle_bits"].nbytes, GL.GL_STATIC_DRAW)
+            zeros_half2 = np.zeros(self.N * self.N, dtype=np.uint32)
+            self.wind_heightfield_ssbo.setup_SSBO(zeros_half2, zeros_half2.nbytes, GL.GL_DYNAMIC_DRAW)
+            self.wind_field_ssbo.setup_SSBO(zeros_half2, zeros_half2.nbytes, GL.GL_DYNAMIC_DRAW)
+        else:
+            zeros_vec2 = np.zeros(self.N * self.N * 2, dtype=np.float32)
+            self.wind_heightfield_ssbo.setup_SSBO(zeros_vec2, zeros_vec2.nbytes, GL.GL_DYNAMIC_DRAW)
+            self.wind_field_ssbo.setup_SSBO(zeros_vec2, zeros_vec2.nbytes, GL.GL_DYNAMIC_DRAW)
+        self.unpacked_dirty = False
+        self.smoothed_radii = None
+        self.cascade_counters_ssbo.clear(0, 4)
+        self.mark_all_active()
+        self.steps = 0
+
+    def _bind_state(self):
+        """Enlaza los buffers de estado en los bindings de shaders/cell_state.glsl."""
+        if self.packed_state:
+            self.cells_ssbo.bind_SSBO_to_position(1)
+            self.wind_heightfield_ssbo.bind_SSBO_to_position(2)
+            self.wind_field_ssbo.bind_SSBO_to_position(3)
+            self.masks_ssbo.bind_SSBO_to_position(5)
+            self.obstacle_bits_ssbo.bind_SSBO_to_position(7)
+            self.smoothed_heights_ssbo.bind_SSBO_to_position(21)
+            self.cascade_counters_ssbo.bind_SSBO_range_to_position(26, 0, 4)
+        else:
+            self.bedrock_ssbo.bind_SSBO_to_position(0)
+            self.sand_ssbo.bind_SSBO_to_position(1)
+            self.wind_heightfield_ssbo.bind_SSBO_to_position(2)
+            self.wind_field_ssbo.bind_SSBO_to_position(3)
+            self.wind_shadowing_ssbo.bind_SSBO_to_position(4)
+            self.sticky_mask_ssbo.bind_SSBO_to_position(5)
+            self.erosion_mask_ssbo.bind_SSBO_to_position(6)
+            self.obstacles_ssbo.bind_SSBO_to_position(7)
+            self.smoothed_heights_ssbo.bind_SSBO_to_position(21)
+
+    def sync_unpacked(self):
+        """Con el layout compacto, actualiza las copias uint32 de arena y bedrock para el render."""
+        if not self.packed_state or not self.unpacked_dirty or self.sand_ssbo is None:
+            return
+        self.cell_state_unpack_compute.use()
+        self.cell_state_unpack_compute["N"] = self.N
+        self.cells_ssbo.bind_SSBO_to_position(1)
+        self.sand_ssbo.bind_SSBO_to_position(15)
+        self.bedrock_ssbo.bind_SSBO_to_position(16)
+        self._dispatch(self.cell_state_unpack_compute, self.grid_blocks)
+        # El render lee las copias como atributos de vértice
+        GL.glMemoryBarrier(GL.GL_VERTEX_ATTRIB_ARRAY_BARRIER_BIT)
+        self.unpacked_dirty = False
+
+    def _dispatch(self, program, blocks=None):
+        """Dispatch sobre todo el grid, o sobre los tiles de `plan_tiles` con `sparse_tiles`."""
+        if blocks is None and self.sparse_tiles:
+            program["tiles_per_side"] = self.tiles_per_side
+            self.tile_activity_ssbo.bind_SSBO_to_position(17)
+            self.active_tiles_ssbo.bind_SSBO_to_position(18)
+            self.tile_dispatch_ssbo.bind_SSBO_to_position(19)
+            self.tile_dispatched_ssbo.bind_SSBO_to_position(20)
+            GL.glBindBuffer(GL.GL_DISPATCH_INDIRECT_BUFFER, self.tile_dispatch_ssbo.get_SSBO_id())
+            GL.glDispatchComputeIndirect(0)
+            GL.glBindBuffer(GL.GL_DISPATCH_INDIRECT_BUFFER, 0)
+        else:
+            blocks = blocks or self.grid_blocks
+            program.dispatch(blocks[0], blocks[1], 1)
+        GL.glMemoryBarrier(GL.GL_SHADER_STORAGE_BARRIER_BIT)
+
+    # --- Etapas ---
+    def _toca_suavizar(self):
+        """Si en este paso hay que recalcular H_50 y H_200."""
+        return (self.smoothed_radii != radios_suavizado(self.cell_size_m)
+                or self.steps % max(1, self.smoothing_interval) == 0)
+
+    def run_smooth_heights(self):
+        """Recalcula H_50 y H_200 si toca en este paso. Devuelve si los recalculó."""
+        if not self._toca_suavizar():
+            return False
+        radios = radios_suavizado(self.cell_size_m)
+        program = self.height_smooth_compute
+        program.use()
+        program["N"] = self.N
+        program["radius"] = radios
+        if self.sparse_tiles:
+            # Los tiles cuyas alturas suavizadas cambian se procesan en este paso
+            program["tiles_per_side"] = self.tiles_per_side
+            program["tile_size"] = self.tile_size
+            self.tile_activity_ssbo.bind_SSBO_to_position(17)
+        self._bind_state()
+        self.smooth_row_sums_ssbo.bind_SSBO_to_position(22)
+        # Una invocación por fila (pase 0) y por columna (pase 1)
+        lineas = ((self.N + 63) // 64, 1)
+        for pase in (0, 1):
+            program["pass"] = pase
+            self._dispatch(program, lineas)
+        self.smoothed_radii = radios
+        return True
+
+    def run_wind_shadow_sweep(self):
+        """Con shadow_mode "sweep", reemplaza la sombra por la de los barridos de horizonte."""
+        if self.shadow_mode not in SHADOW_MODES:
+            raise ValueError(f"shadow_mode desconocido: {self.shadow_mode!r} (opciones: {SHADOW_MODES})")
+        if self.shadow_mode != "sweep":
+            return False
+        if self.sparse_tiles:
+            raise ValueError("La sombra por barridos no tiene alcance acotado: no se puede usar con sparse_tiles")
+        self.sweep_commands_ssbo.write(self._comandos_barrido())
+
+        program = self.wind_shadow_sweep_compute
+        program.use()
+        program["N"] = self.N
+        self._bind_state()
+        self.shadow_sweep_ssbo.bind_SSBO_to_position(23)
+        self.horizon_stack_ssbo.bind_SSBO_to_position(24)
+        self.sweep_commands_ssbo.bind_SSBO_to_position(25)
+        celdas = ((self.N + 63) // 64, self.N)
+
+        program["pass"] = 0
+        self._dispatch(program, celdas)
+        GL.glMemoryBarrier(GL.GL_COMMAND_BARRIER_BIT)
+
+        # Las direcciones que ninguna celda usa quedan con 0 work groups
+        program["pass"] = 1
+        GL.glBindBuffer(GL.GL_DISPATCH_INDIRECT_BUFFER, self.sweep_commands_ssbo.get_SSBO_id())
+        for k in range(8):
+            program["direction"] = k
+            GL.glDispatchComputeIndirect(k * 3 * 4)
+            GL.glMemoryBarrier(GL.GL_SHADER_STORAGE_BARRIER_BIT)
+        GL.glBindBuffer(GL.GL_DISPATCH_INDIRECT_BUFFER, 0)
+
+        program["pass"] = 2
+        self._dispatch(program, celdas)
+        return True
+
+    def run_wind_heightfield(self):
+        self.wind_heightfield_compute.use()
+        self.wind_heightfield_compute["N"] = self.N
+        self.wind_heightfield_compute["origin"] = self.origin
+        self.bedrock_ssbo.bind_SSBO_to_position(0)
+        self.sand_ssbo.bind_SSBO_to_position(1)
+        self.wind_heightfield_ssbo.bind_SSBO_to_position(2)
+        self._dispatch(self.wind_heightfield_compute)
+
+    def run_wind_update(self):
+        self.wind_update_compute.use()
+        self.wind_update_compute["N"] = self.N
+        self.wind_update_compute["R_s"] = self.R_s
+        # Con barridos la sombra la calcula run_wind_shadow_sweep
+        self.wind_update_compute["compute_shadow"] = self.shadow_mode != "sweep"
+        self.bedrock_ssbo.bind_SSBO_to_position(0)
+        self.sand_ssbo.bind_SSBO_to_position(1)
+        self.wind_heightfield_ssbo.bind_SSBO_to_position(2)
+        self.wind_field_ssbo.bind_SSBO_to_position(3)
+        self.wind_shadowing_ssbo.bind_SSBO_to_position(4)
+        self.smoothed_heights_ssbo.bind_SSBO_to_position(21)
+        self._dispatch(self.wind_update_compute)
+
+    def _set_mask_uniforms(self, program):
+        program["cell_size_m"] = self.cell_size_m
+        program["h_max"] = self.h_max
+        program["kb"] = self.kb
+        program["slope_deg_thresh"] = self.slope_deg_thresh
+
+    def run_sticky_mask(self):
+        self.sticky_mask_compute.use()
+        self.sticky_mask_compute["N"] = self.N
+        self.sticky_mask_compute["R_s"] = self.R_s
+        self._set_mask_uniforms(self.sticky_mask_compute)
+        self.bedrock_ssbo.bind_SSBO_to_position(0)
+        self.sand_ssbo.bind_SSBO_to_position(1)
+        self.wind_field_ssbo.bind_SSBO_to_position(3)
+        self.sticky_mask_ssbo.bind_SSBO_to_position(5)
+        self.erosion_mask_ssbo.bind_SSBO_to_position(6)
+        self._dispatch(self.sticky_mask_compute)
+
+    def run_wind_fused(self):
+        """A(p), W(p), sombra y máscaras sticky/erosión en un solo dispatch."""
+        if self.sparse_tiles:
+            # Primera etapa del paso: decide qué tiles se procesan
+            self.plan_tiles()
+        self.wind_fused_compute.use()
+        self.wind_fused_compute["N"] = self.N
+        self.wind_fused_compute["R_s"] = self.R_s
+        self.wind_fused_compute["origin"] = self.origin
+        self.wind_fused_compute["compute_shadow"] = self.shadow_mode != "sweep"
+        self._set_mask_uniforms(self.wind_fused_compute)
+        self._bind_state()
+        self._dispatch(self.wind_fused_compute)
+
+    def run_sand_transport(self):
+        self.sand_transport_compute.use()
+        self.sand_transport_compute["sand_transport_block_count"] = self.sand_transport_block_count
+        self.sand_transport_compute["N"] = self.N
+        self.sand_transport_compute["R_s"] = self.R_s
+        self.sand_transport_compute["cell_size_m"] = self.cell_size_m
+        # El transporte indexa (x, y) = (columna, fila)
+        self.sand_transport_compute["origin"] = (self.origin[1], self.origin[0])
+        self._bind_state()
+        self._dispatch(self.sand_transport_compute)
+
+    def run_sand_cascade(self):
+        """Relaja la arena hasta `cascade_iterations` veces. Devuelve las iteraciones usadas."""
+        if self.cascade_mode not in CASCADE_MODES:
+            raise ValueError(f"cascade_mode desconocido: {self.cascade_mode!r} (opciones: {CASCADE_MODES})")
+        # La cascada "tiled" no sigue la lista de tiles: con sparse_tiles se usa "gather"
+        tiled = self.cascade_mode == "tiled" and not self.sparse_tiles
+        gather = self.cascade_mode == "gather" or (self.cascade_mode == "tiled" and self.sparse_tiles)
+        if tiled:
+            program = self.sand_cascade_tiled_compute
+        elif gather:
+            program = self.sand_cascade_flux_compute
+        else:
+            program = self.sand_cascade_compute
+
+        tan_repose_angle = float(np.tan(np.radians(self.repose_angle)))
+        program.use()
+        program["N"] = self.N
+        program["cell_size_m"] = self.cell_size_m
+        program["tan_repose_angle"] = tan_repose_angle
+        program["transfer_rate"] = self.transfer_rate
+        # Sin cascada adaptativa los contadores no se leen
+        program["count_moved"] = self.adaptive_cascade
+        if gather:
+            self.sand_cascade_gather_compute.use()
+            self.sand_cascade_gather_compute["N"] = self.N
+        self._bind_state()
+        self.cascade_flux_ssbo.bind_SSBO_to_position(14)
+
+        # Contadores de las iteraciones entre dos lecturas
+        por_lectura = max(1, self.cascade_check_interval)
+        stride = self.counters_stride
+        if self.adaptive_cascade and self.cascade_counters_ssbo.n_bytes < stride * (1 + por_lectura):
+            # Se agranda conservando el contador de arena saturada
+            saturadas = self.cascade_counters_ssbo.read_data((1,), np.uint32)
+            self.cascade_counters_ssbo.setup_SSBO(None, stride * (1 + por_lectura), GL.GL_DYNAMIC_READ)
+            self.cascade_counters_ssbo.clear()
+            self.cascade_counters_ssbo.write(saturadas)
+
+        # Tiled y gather leen de un buffer y escriben en el otro (ping-pong)
+        por_dispatch = max(1, min(self.cascade_sub_iterations, CASCADE_MAX_SUB_ITERATIONS)) if tiled else 1
+        origen, destino = self.state_ssbo, self.sand_tmp_ssbo
+        if gather and self.sparse_tiles:
+            # Solo se escriben los tiles procesados: el resto del buffer auxiliar
+            # tiene que tener ya la arena actual
+            self._copiar(origen, destino)
+
+        self.last_cascade_moved = 0
+        self.last_cascade_max_excess = 0.0
+        iteraciones = 0
+        pendientes = 0
+        while iteraciones < self.cascade_iterations:
+            sub = min(por_dispatch, self.cascade_iterations - iteraciones)
+            if self.adaptive_cascade and pendientes == 0:
+                self.cascade_counters_ssbo.clear(stride, stride * por_lectura)
+            self.cascade_counters_ssbo.bind_SSBO_range_to_position(12, (1 + pendientes) * stride, 8)
+            if tiled:
+                program.use()
+                program["sub_iterations"] = sub
+                origen.bind_SSBO_to_position(1)
+                destino.bind_SSBO_to_position(13)
+                self._dispatch(program, self.tile_blocks)
+                origen, destino = destino, origen
+            elif gather:
+                origen.bind_SSBO_to_position(1)
+                destino.bind_SSBO_to_position(13)
+                program.use()
+                self._dispatch(program)
+                self.sand_cascade_gather_compute.use()
+                self._dispatch(self.sand_cascade_gather_compute)
+                origen, destino = destino, origen
+            else:
+                self._dispatch(program)
+            iteraciones += sub
+            if not self.adaptive_cascade:
+                continue
+            pendientes += 1
+            if pendientes < por_lectura and iteraciones < self.cascade_iterations:
+                continue
+
+            # Leer los contadores sincroniza con la GPU: una vez cada `por_lectura` iteraciones
+            GL.glMemoryBarrier(GL.GL_BUFFER_UPDATE_BARRIER_BIT)
+            contadores = self.cascade_counters_ssbo.read_data((pendientes, stride // 4), np.uint32,
+                                                              offset=stride)[:, :2]
+            pendientes = 0
+            quieta = False
+            for movidos, exceso_bits in contadores:
+                self.last_cascade_moved += int(movidos)
+                self.last_cascade_max_excess = max(self.last_cascade_max_excess,
+                                                   float(np.uint32(exceso_bits).view(np.float32)))
+                quieta = quieta or movidos <= self.cascade_tolerance
+            if quieta:
+                break
+
+        # Si el último resultado quedó en el buffer auxiliar, se copia de vuelta
+        if origen is not self.state_ssbo:
+            self._copiar(origen, self.state_ssbo)
+            self.state_ssbo.bind_SSBO_to_position(1)
+
+        self.last_cascade_iterations = iteraciones
+        return iteraciones
+
+    def _copiar(self, origen, destino):
+        """Copia un buffer de arena (N*N uint32) en otro, en la GPU."""
+        GL.glMemoryBarrier(GL.GL_BUFFER_UPDATE_BARRIER_BIT)
+        GL.glBindBuffer(GL.GL_COPY_READ_BUFFER, origen.get_SSBO_id())
+        GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, destino.get_SSBO_id())
+        GL.glCopyBufferSubData(GL.GL_COPY_READ_BUFFER, GL.GL_COPY_WRITE_BUFFER, 0, 0, self.N * self.N * 4)
+        GL.glBindBuffer(GL.GL_COPY_READ_BUFFER, 0)
+        GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, 0)
+
+    @contextmanager
+    def _scope(self, stage):
+        with tracer.span(stage, "sim"):
+            if self.timer is None:
+                yield
+            else:
+                with self.timer.scope(stage):
+                    yield
+
+    @tracer.traced("sim.step", "sim")
+    def step(self):
+        """Avanza un paso completo de la simulación."""
+        with self._scope("smooth_heights"):
+            self.run_smooth_heights()
+        if self.uses_fused_wind:
+            with self._scope("wind_fused"):
+                self.run_wind_fused()
+        else:
+            with self._scope("wind_heightfield"):
+                self.run_wind_heightfield()
+            with self._scope("wind_update"):
+                self.run_wind_update()
+            with self._scope("sticky_mask"):
+                self.run_sticky_mask()
+        if self.shadow_mode == "sweep":
+            with self._scope("wind_shadow_sweep"):
+                self.run_wind_shadow_sweep()
+        else:
+            # Solo valida shadow_mode: sin barridos no hay etapa que medir
+            self.run_wind_shadow_sweep()
+        with self._scope("sand_transport"):
+            self.run_sand_transport()
+        with self._scope("sand_cascade"):
+            self.run_sand_cascade()
+        self.unpacked_dirty = self.packed_state
+        self.steps += 1
+
+    def run(self, n_steps):
+        for _ in range(n_steps):
+            self.step()
+
+    # --- Lectura / escritura del estado completo ---
+    def read_state(self):
+        """
+        Estado completo en la CPU con los nombres de checkpoint.ESTADO, en el
+        layout completo aunque la simulación use el compacto.
+        """
+        n_cells = self.N * self.N
+        if not self.packed_state:
+            return {nombre: getattr(self, attr).read_data(checkpoint.forma(nombre, self.N), dtype)
+                    for nombre, (_, attr, dtype, _) in checkpoint.ESTADO.items()}
+        self.check_sand_overflow()
+        compacto = {
+            "cells": self.cells_ssbo.read_data((n_cells,), np.uint32),
+            "obstacle_bits": self.obstacle_bits_ssbo.read_data((ps.obstacle_words(n_cells),), np.uint32),
+            "wind_heightfield": self.wind_heightfield_ssbo.read_data((n_cells,), np.uint32),
+            "wind_field": self.wind_field_ssbo.read_data((n_cells,), np.uint32),
+            "masks": self.masks_ssbo.read_data((n_cells,), np.uint32),
+        }
+        estado = ps.unpack_state(compacto, n_cells)
+        estado["smoothed_heights"] = self.smoothed_heights_ssbo.read_data((n_cells, 2), np.float32)
+        return estado
+
+    def check_sand_overflow(self):
+        """
+        Con el layout compacto, falla si alguna suma de arena pasó de los 65535
+        slabs que entran en una celda: se saturó ahí y el estado ya no conserva
+        la masa. Lee 4 bytes de la GPU.
+        """
+        if not self.packed_state:
+            return
+        saturadas = int(self.cascade_counters_ssbo.read_data((1,), np.uint32)[0])
+        if saturadas:
+            raise ValueError(f"La arena pasó de {ps.SAND_MAX} slabs en {saturadas} sumas durante la simulación; "
+                             "el layout compacto la saturó y ya no conserva la masa (usar el layout completo)")
+
+    def read_sand(self):
+        """Arena actual como uint32 plano (N*N,)."""
+        data = self.state_ssbo.read_data((self.N * self.N,), np.uint32)
+        return ps.sand_of(data) if self.packed_state else data
+
+    def sand_readback_source(self):
+        """
+        (SSBO, transformación) para leer la arena sin detener la GPU: el SSBO a
+        copiar y la función que saca la arena de lo copiado (None si ya es arena).
+        """
+        if self.packed_state:
+            return self.cells_ssbo, ps.sand_of
+        return self.sand_ssbo, None
+
+    def write_state(self, state):
+        """Sube un estado completo (nombres de checkpoint.ESTADO) en el layout que se use."""
+        if not self.packed_state:
+            for nombre, (_, attr, dtype, _) in checkpoint.ESTADO.items():
+                if nombre in state:
+                    data = np.ascontiguousarray(state[nombre], dtype=dtype)
+                    getattr(self, attr).setup_SSBO(data, data.nbytes, GL.GL_DYNAMIC_DRAW)
+            self._alturas_suavizadas_escritas(state)
+            self.mark_all_active()
+            return
+        for nombre, data in ps.pack_state(state).items():
+            ssbo = self.obstacle_bits_ssbo if nombre == "obstacle_bits" else \
+                {"cells": self.cells_ssbo, "wind_heightfield": self.wind_heightfield_ssbo,
+                 "wind_field": self.wind_field_ssbo, "masks": self.masks_ssbo}[nombre]
+            ssbo.setup_SSBO(data, data.nbytes, GL.GL_DYNAMIC_DRAW)
+        if self.sand_ssbo is not None:
+            for ssbo, nombre in ((self.sand_ssbo, "sand"), (self.bedrock_ssbo, "bedrock"), (self.obstacles_ssbo, "obstacles")):
+                data = np.ascontiguousarray(state[nombre], dtype=np.uint32)
+                ssbo.setup_SSBO(data, data.nbytes, GL.GL_DYNAMIC_DRAW)
+        # pack_state no las incluye: van en float32 en los dos layouts
+        if "smoothed_heights" in state:
+            data = np.ascontiguousarray(state["smoothed_heights"], dtype=np.float32)
+            self.smoothed_heights_ssbo.setup_SSBO(data, data.nbytes, GL.GL_DYNAMIC_COPY)
+        self._alturas_suavizadas_escritas(state)
+        self.unpacked_dirty = False
+        self.cascade_counters_ssbo.clear(0, 4)
+        self.mark_all_active()
+
+    def _alturas_suavizadas_escritas(self, state):
+        # Sin H_50 y H_200 en el estado (checkpoints viejos) se recalculan en el próximo paso
+        self.smoothed_radii = radios_suavizado(self.cell_size_m) if "smoothed_heights" in state else None
+
+    def save_checkpoint(self, path, compress=True):
+        """Lee el estado de los SSBOs y lo guarda con los parámetros actuales."""
+        checkpoint.guardar(path, self, self.read_state(), compress)
+
+    def load_checkpoint(self, path):
+        """
+        Restaura un checkpoint directo en los SSBOs: cada array se descomprime
+        (o se copia, si está sin comprimir) sobre el buffer mapeado.
+        """
+        with checkpoint.abrir(path, self.N) as ckpt:
+            if self.packed_state:
+                # Hay que empaquetar en la CPU antes de subir
+                self.write_state({nombre: ckpt.array(nombre) for nombre in checkpoint.ESTADO if nombre in ckpt})
+                checkpoint.aplicar_parametros(self, ckpt.params)
+                self._alturas_suavizadas_escritas(ckpt)
+                return
+            for nombre, (_, attr, _, _) in checkpoint.ESTADO.items():
+                if nombre not in ckpt:
+                    continue
+                with getattr(self, attr).map_write(ckpt.nbytes(nombre)) as destino:
+                    ckpt.read_into(nombre, destino)
+            checkpoint.aplicar_parametros(self, ckpt.params)
+            self._alturas_suavizadas_escritas(ckpt)
+        self.mark_all_active()
+
+    def release(self):
+        """Libera los SSBOs (para crear varias simulaciones en el mismo contexto)."""
+        for buf in vars(self).values():
+            if isinstance(buf, SSBO):
+                buf.delete()
@@ -0,0 +1,335 @@
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from implementations.sand_move import terreno
+from utils.checkpoint import Checkpoint
+from utils.recorder import FrameRecorder
+
+# Modo batch de `sand_move`: la misma cadena de simulación sin ventana, UI ni
+# render. Con el motor "gpu" se crea un contexto OpenGL 4.5 offscreen por EGL
+# (pyglet en modo headless); en máquinas sin GPU sirve Mesa llvmpipe con
+# LIBGL_ALWAYS_SOFTWARE=1. El motor "numpy" no necesita OpenGL.
+
+group_size_x = 32
+group_size_y = 32
+
+
+def crear_contexto_offscreen():
+    """Contexto OpenGL 4.5 sin ventana visible (EGL)."""
+    import pyglet
+    # Tiene que fijarse antes de importar pyglet.window / pyglet.gl
+    pyglet.options["headless"] = True
+    import pyglet.window
+
+    config = pyglet.gl.Config(major_version=4, minor_version=5, double_buffer=False)
+    try:
+        return pyglet.window.Window(width=16, height=16, visible=False, config=config)
+    except Exception as e:
+        raise RuntimeError(
+            "No se pudo crear un contexto OpenGL 4.5 offscreen por EGL. En máquinas sin GPU "
+            "probar con LIBGL_ALWAYS_SOFTWARE=1 (Mesa llvmpipe) o usar --engine numpy."
+        ) from e
+
+
+def resumen_ms(valores):
+    v = np.asarray(valores, dtype=np.float64) * 1000.0
+    if v.size == 0:
+        return {"n": 0}
+    return {"n": int(v.size), "min": float(v.min()), "avg": float(v.mean()),
+            "p95": float(np.percentile(v, 95)), "max": float(v.max()), "total": float(v.sum())}
+
+
+def _simular_gpu(steps, sand, bedrock, obstacles, cascade_mode, resume, checkpoint_path, grabacion,
+                 packed_state=False, sparse=False, shadow_mode="march"):
+    window = crear_contexto_offscreen()
+    from OpenGL import GL
+    from utils.gpu_timer import GPUTimer
+    from implementations.sand_move.gpu_sim import GPUSandSimulation
+    from implementations.sand_move.recorder import SandRecorder
+
+    shader_path = Path(os.path.dirname(__file__)) / "shaders"
+    sim = GPUSandSimulation(shader_path, terreno.N, sand, bedrock, obstacles, group_size_x, group_size_y,
+                            cascade_mode=cascade_mode, packed_state=packed_state, unpacked_copies=False,
+                            sparse_tiles=sparse, shadow_mode=shadow_mode)
+    if resume:
+        sim.load_checkpoint(resume)
+        sim.cascade_mode = cascade_mode
+        sim.shadow_mode = shadow_mode
+    masa_inicial = int(sim.read_sand().sum(dtype=np.uint64))
+    timer = GPUTimer(window=max(steps, 1))
+    sim.timer = timer
+
+    grabador = None
+    if grabacion:
+        estado = sim.read_state()
+        estaticos = {nombre: estado[nombre].reshape(terreno.N, terreno.N) for nombre in ("bedrock", "obstacles")}
+        origen, transformar = sim.sand_readback_source()
+        grabador = SandRecorder(grabacion["path"], origen, terreno.N, grabacion["every"],
+                                queue_size=grabacion["queue_size"], on_full="block", static=estaticos,
+                                attrs={"first_step": sim.steps, "engine": "gpu"}, transform=transformar)
+
+    tiempos = []
+    iteraciones = []
+    activos = []
+    for _ in range(steps):
+        t0 = time.perf_counter()
+        sim.step()
+        GL.glFinish()
+        tiempos.append(time.perf_counter() - t0)
+        iteraciones.append(sim.last_cascade_iterations)
+        if sparse:
+            activos.append(sim.active_fraction())
+        timer.collect()
+        if grabador is not None:
+            grabador.after_step(sim.steps)
+    if grabador is not None:
+        grabador.close()
+
+    sim.check_sand_overflow()
+    final = sim.read_sand()
+    sim.save_checkpoint(checkpoint_path)
+    etapas = {stage: {"n": n, "min": vmin, "avg": avg, "p95": p95}
+              for stage, (n, vmin, avg, p95) in timer.stats().items()}
+    gl_info = {
+        "renderer": GL.glGetString(GL.GL_RENDERER).decode(errors="replace"),
+        "version": GL.glGetString(GL.GL_VERSION).decode(errors="replace"),
+    }
+    window.close()
+    extra = {"gpu_stages_ms": etapas, "gl": gl_info}
+    if sparse:
+        extra["active_fraction"] = activos
+    return final, masa_inicial, tiempos, iteraciones, extra
+
+
+def _simular_numpy(steps, sand, bedrock, obstacles, resume, checkpoint_path, grabacion, workers=None,
+                   sparse=False, shadow_mode="march"):
+    """
+    Motor NumPy; con `workers` se usa la versión por tiles en varios procesos y
+    con `sparse` la que solo procesa los tiles activos.
+    """
+    if workers:
+        from implementations.sand_move.tiled_engine import TiledSandEngine
+        engine = TiledSandEngine(bedrock, sand, obstacles, terreno.N, workers=workers)
+        try:
+            return _simular_cpu(engine, steps, resume, checkpoint_path, grabacion, "tiled", shadow_mode)
+        finally:
+            engine.close()
+    if sparse:
+        from implementations.sand_move.sparse_engine import SparseSandEngine
+        engine = SparseSandEngine(bedrock, sand, obstacles, terreno.N)
+        return _simular_cpu(engine, steps, resume, checkpoint_path, grabacion, "numpy-sparse", shadow_mode)
+    from implementations.sand_move.cpu_engine import NumpySandEngine
+    engine = NumpySandEngine(bedrock, sand, obstacles, terreno.N)
+    return _simular_cpu(engine, steps, resume, checkpoint_path, grabacion, "numpy", shadow_mode)
+
+
+def _simular_cpu(engine, steps, resume, checkpoint_path, grabacion, nombre, shadow_mode="march"):
+    if resume:
+        engine.load_checkpoint(resume)
+    engine.shadow_mode = shadow_mode
+    masa_inicial = int(engine.sand_slabs.sum(dtype=np.uint64))
+
+    grabador = None
+    if grabacion:
+        grid = (terreno.N, terreno.N)
+        grabador = FrameRecorder(grabacion["path"], grid, np.uint32, queue_size=grabacion["queue_size"],
+                                 on_full="block",
+                                 static={"bedrock": engine.bedrock_slabs.reshape(grid),
+                                         "obstacles": engine.obstacles.reshape(grid)},
+                                 attrs={"first_step": engine.steps, "engine": nombre,
+                                        "every": grabacion["every"]})
+    etapas = {"smooth_heights": [], "wind_heightfield": [], "wind_update": [], "wind_shadow_sweep": [],
+              "sticky_mask": [], "sand_transport": [], "sand_cascade": []}
+    if shadow_mode != "sweep":
+        # Sin barridos la etapa no hace nada: no se mide ni se informa
+        del etapas["wind_shadow_sweep"]
+    tiempos = []
+    iteraciones = []
+    activos = []
+    for _ in range(steps):
+        t_paso = time.perf_counter()
+        for stage in etapas:
+            t0 = time.perf_counter()
+            getattr(engine, "run_" + stage)()
+            etapas[stage].append(time.perf_counter() - t0)
+        engine.steps += 1
+        tiempos.append(time.perf_counter() - t_paso)
+        iteraciones.append(engine.last_cascade_iterations)
+        if hasattr(engine, "active_fraction"):
+            activos.append(engine.active_fraction)
+        if grabador is not None and engine.steps % grabacion["every"] == 0:
+            grabador.push(engine.steps, engine.sand_slabs)
+    if grabador is not None:
+        grabador.close()
+
+    engine.save_checkpoint(checkpoint_path)
+    extra = {"cpu_stages_ms": {stage: resumen_ms(v) for stage, v in etapas.items()}}
+    if activos:
+        extra["active_fraction"] = activos
+    return engine.sand_slabs.copy(), masa_inicial, tiempos, iteraciones, extra
+
+
+def run_headless(steps, output_dir, engine="gpu", cascade_mode="atomic", resume=None, record_every=0,
+                 record_queue=8, packed_state=False, workers=None, sparse=False, shadow_mode="march"):
+    """
+    Simula `steps` pasos sin ventana y escribe en `output_dir`:
+    - state.npz: arena, bedrock y obstáculos finales (planos, como los SSBOs).
+    - state.sandckpt: checkpoint completo, para seguir con `resume`.
+    - timings.json: tiempos por paso y por etapa, pasos/seg y parámetros.
+
+    Con `resume` se parte del checkpoint dado en vez de un terreno nuevo. Con
+    `record_every` > 0 la arena se graba cada tantos pasos en
+    `output_dir/recording` (ver utils/recorder.py); en batch no se descartan
+    frames: si el escritor se atrasa, la simulación espera. `packed_state`
+    usa el layout compacto de la GPU (ver gpu_sim.GPUSandSimulation). El motor
+    "tiled" reparte la grilla en `workers` procesos (ver tiled_engine.py). Con
+    `sparse` solo se procesan los tiles donde se mueve arena (ver
+    sparse_engine.py); timings.json guarda entonces la fracción procesada por paso.
+    `shadow_mode` elige la sombra de viento: "march" o "sweep" (barridos de
+    horizonte, ver cpu_engine.sombra_barrido).
+    """
+    if sparse and engine == "tiled":
+        raise ValueError("El modo disperso existe para los motores gpu y numpy, no para tiled")
+    if sparse and shadow_mode == "sweep":
+        raise ValueError("La sombra por barridos no tiene alcance acotado: no se puede combinar con el modo disperso")
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    if resume:
+        # Los buffers se reemplazan con los del checkpoint; solo hacen falta del tamaño correcto
+        sand, bedrock, obstacles = (np.zeros(terreno.N * terreno.N, dtype=np.uint32) for _ in range(3))
+    else:
+        _, sand, bedrock, obstacles = terreno.generar_datos_iniciales()
+    checkpoint_path = output_dir / "state.sandckpt"
+    grabacion = None
+    if record_every > 0:
+        grabacion = {"path": output_dir / "recording", "every": record_every, "queue_size": record_queue}
+
+    print(f"Simulando {steps} pasos (motor {engine}, N={terreno.N})...")
+    t0 = time.perf_counter()
+    if engine == "gpu":
+        final, masa_inicial, tiempos, iteraciones, extra = _simular_gpu(
+            steps, sand, bedrock, obstacles, cascade_mode, resume, checkpoint_path, grabacion, packed_state, sparse,
+            shadow_mode)
+    elif engine == "numpy":
+        final, masa_inicial, tiempos, iteraciones, extra = _simular_numpy(
+            steps, sand, bedrock, obstacles, resume, checkpoint_path, grabacion, sparse=sparse,
+            shadow_mode=shadow_mode)
+    elif engine == "tiled":
+        final, masa_inicial, tiempos, iteraciones, extra = _simular_numpy(
+            steps, sand, bedrock, obstacles, resume, checkpoint_path, grabacion, workers or os.cpu_count() or 1,
+            shadow_mode=shadow_mode)
+        extra["workers"] = workers or os.cpu_count() or 1
+    else:
+        raise ValueError(f"Motor desconocido: {engine!r}")
+    total = time.perf_counter() - t0
+
+    with Checkpoint(checkpoint_path) as ckpt:
+        np.savez_compressed(output_dir / "state.npz", sand=final, bedrock=ckpt.array("bedrock"),
+                            obstacles=ckpt.array("obstacles"), N=terreno.N, steps=ckpt.params["steps"])
+
+    timings = {
+        "engine": engine,
+        "cascade_mode": cascade_mode if engine == "gpu" else "gather",
+        "packed_state": packed_state and engine == "gpu",
+        "sparse": sparse,
+        "shadow_mode": shadow_mode,
+        "N": terreno.N,
+        "steps": steps,
+        "resumed_from": str(resume) if resume else None,
+        "total_s": total,
+        "steps_per_second": steps / total if total > 0 else 0.0,
+        "step_ms": resumen_ms(tiempos),
+        "cascade_iterations": iteraciones,
+        "sand_mass": {"initial": masa_inicial, "final": int(final.sum(dtype=np.uint64))},
+        **extra,
+    }
+    with open(output_dir / "timings.json", "w") as f:
+        json.dump(timings, f, indent=2)
+
+    print(f"{steps} pasos en {total:.2f} s ({timings['steps_per_second']:.2f} pasos/seg). "
+          f"Resultados en {output_dir}")
+    return timings
+
+
+def run_paged(world_dir, steps, output_dir, engine="gpu", world_size=None, tile_size=1024, cascade_mode="gather",
+              packed_state=False, focus=None, shadow_mode="march"):
+    """
+    Simula `steps` pasos de un mundo paginado en disco (ver paged.py). Si
+    `world_dir` no tiene un mundo se crea uno de `world_size` x `world_size`
+    generado por tiles. Escribe timings.json en `output_dir`; el estado queda
+    en el propio mundo, que se puede seguir en otra corrida.
+    """
+    from implementations.sand_move.paged import PagedWorld, PagedSimulation, CpuTileStepper
+
+    if shadow_mode == "sweep":
+        raise ValueError("La sombra por barridos no tiene alcance acotado: no se puede usar en el modo paginado")
+    if engine not in ("gpu", "numpy"):
+        raise ValueError(f"El modo paginado funciona con los motores gpu y numpy, no {engine!r}")
+    world_dir = Path(world_dir)
+    if (world_dir / "meta.json").exists():
+        world = PagedWorld(world_dir)
+        if world_size is not None and world_size != world.N:
+            raise ValueError(f"{world_dir} es un mundo de {world.N} y se pidió {world_size}")
+    else:
+        n = world_size or terreno.N
+        print(f"Generando un mundo de {n} x {n} en {world_dir}...")
+        world = PagedWorld.create(world_dir, n, lambda origin, shape: terreno.generar_tile(n, origin, shape),
+                                  tile_size)
+
+    window = None
+    if engine == "gpu":
+        window = crear_contexto_offscreen()
+        from implementations.sand_move.paged import GpuTileStepper
+        shader_path = Path(os.path.dirname(__file__)) / "shaders"
+        make_stepper = lambda size, **params: GpuTileStepper(shader_path, size, group_size_x, group_size_y,
+                                                             packed_state, **params)
+        params = {"cascade_mode": cascade_mode}
+    else:
+        make_stepper = CpuTileStepper
+        params = {}
+
+    sim = PagedSimulation(world, make_stepper, tile_size, **params)
+    print(f"Simulando {steps} pasos de un mundo de {world.N} (motor {engine}, {len(sim.tiles)} tiles, "
+          f"ventana {sim.window_size})...")
+    tiempos = []
+    estadisticas = []
+    try:
+        for _ in range(steps):
+            t0 = time.perf_counter()
+            sim.step(focus)
+            tiempos.append(time.perf_counter() - t0)
+            estadisticas.append(sim.last_step_stats)
+    finally:
+        sim.close()
+        if window is not None:
+            window.close()
+
+    total = sum(tiempos)
+    timings = {
+        "engine": engine,
+        "paged": True,
+        "world": str(world_dir),
+        "N": world.N,
+        "steps": steps,
+        "world_steps": world.steps,
+        "tile_size": tile_size,
+        "margin": sim.margin,
+        "window_size": sim.window_size,
+        "tiles": len(sim.tiles),
+        "total_s": total,
+        "steps_per_second": steps / total if total > 0 else 0.0,
+        "step_ms": resumen_ms(tiempos),
+        "io_wait_ms": resumen_ms([e["io_wait_s"] for e in estadisticas]),
+    }
+    world.close()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / "timings.json", "w") as f:
+        json.dump(timings, f, indent=2)
+    print(f"{steps} pasos en {total:.2f} s. Mundo en {world_dir} (paso {timings['world_steps']})")
+    return timings
@@ -1,52 +1,153 @@
-from noise import pnoise2
 import numpy as np
 import random
 
-def generar_alturas(N, scale=0.1, octaves=3, persistence=0.5, lacunarity=2.0, base=0, top_height=5, tolerance=-0.5):
-    alturas = np.zeros((N, N), dtype=np.float32)
-    for i in range(N):
-        for j in range(N):
-            # perlin devuelve valores [-1, 1], los reescalamos
-            h = pnoise2(i * scale,
-                        j * scale,
-                        octaves=octaves,
-                        persistence=persistence,
-                        lacunarity=lacunarity,
-                        base=base)
-            # normalizamos a [0,1] y escalamos a [0, top_height]
-            alturas[i, j] = (h + 1) * 0.5 * top_height if h > tolerance else 0
-    return alturas
-
-
-def generar_obstaculos(N, scale=0.03, octaves=2, persistence=0.5, lacunarity=2.0, seed=None, threshold=0.2):
+# Tabla de permutación de Perlin (la misma que usa `noise.pnoise2`), duplicada
+# para poder indexar PERM[A + j] sin módulo.
+_PERM_BASE = np.array([
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225, 140, 36, 103, 30, 69, 142,
+    8, 99, 37, 240, 21, 10, 23, 190, 6, 148, 247, 120, 234, 75, 0, 26, 197, 62, 94, 252, 219, 203, 117,
+    35, 11, 32, 57, 177, 33, 88, 237, 149, 56, 87, 174, 20, 125, 136, 171, 168, 68, 175, 74, 165, 71,
+    134, 139, 48, 27, 166, 77, 146, 158, 231, 83, 111, 229, 122, 60, 211, 133, 230, 220, 105, 92, 41,
+    55, 46, 245, 40, 244, 102, 143, 54, 65, 25, 63, 161, 1, 216, 80, 73, 209, 76, 132, 187, 208, 89,
+    18, 169, 200, 196, 135, 130, 116, 188, 159, 86, 164, 100, 109, 198, 173, 186, 3, 64, 52, 217, 226,
+    250, 124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212, 207, 206, 59, 227, 47, 16, 58, 17, 182,
+    189, 28, 42, 223, 183, 170, 213, 119, 248, 152, 2, 44, 154, 163, 70, 221, 153, 101, 155, 167, 43,
+    172, 9, 129, 22, 39, 253, 19, 98, 108, 110, 79, 113, 224, 232, 178, 185, 112, 104, 218, 246, 97,
+    228, 251, 34, 242, 193, 238, 210, 144, 12, 191, 179, 162, 241, 81, 51, 145, 235, 249, 14, 239, 107,
+    49, 192, 214, 31, 181, 199, 106, 157, 184, 84, 204, 176, 115, 121, 50, 45, 127, 4, 150, 254, 138,
+    236, 205, 93, 222, 114, 67, 29, 24, 72, 243, 141, 128, 195, 78, 66, 215, 61, 156, 180,
+], dtype=np.int64)
+PERM = np.concatenate([_PERM_BASE, _PERM_BASE])
+
+# Gradientes (x, y) de GRAD3 indexados por hash & 15
+GRAD2 = np.array([
+    [1, 1], [-1, 1], [1, -1], [-1, -1],
+    [1, 0], [-1, 0], [1, 0], [-1, 0],
+    [0, 1], [0, -1], [0, 1], [0, -1],
+    [1, 0], [-1, 0], [0, -1], [0, 1],
+], dtype=np.float32)
+
+
+def _perm(idx):
+    # Con base > 1 la implementación en C lee fuera de la tabla; aquí se envuelve
+    return PERM[idx & 511]
+
+
+def _grad2(h, x, y):
+    g = GRAD2[h & 15]
+    return x * g[..., 0] + y * g[..., 1]
+
+
+def _lerp(t, a, b):
+    return a + t * (b - a)
+
+
+def _fade(t):
+    return t * t * t * (t * (t * np.float32(6) - np.float32(15)) + np.float32(10))
+
+
+def perlin2(x, y, repeatx=1024.0, repeaty=1024.0, base=0):
+    """
+    Ruido de Perlin 2D evaluado sobre arrays completos (una octava).
+
+    Reproduce paso a paso `noise2` de la librería `noise` en float32, de modo que
+    para base 0 y 1 los valores coinciden con `pnoise2` celda a celda.
+    """
+    x = np.asarray(x, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+    repeatx = np.float32(repeatx)
+    repeaty = np.float32(repeaty)
+
+    i = np.floor(np.fmod(x, repeatx)).astype(np.int64)
+    j = np.floor(np.fmod(y, repeaty)).astype(np.int64)
+    ii = np.fmod((i + 1).astype(np.float32), repeatx).astype(np.int64)
+    jj = np.fmod((j + 1).astype(np.float32), repeaty).astype(np.int64)
+    i = (i & 255) + base
+    j = (j & 255) + base
+    ii = (ii & 255) + base
+    jj = (jj & 255) + base
+
+    x = x - np.floor(x)
+    y = y - np.floor(y)
+    fx = _fade(x)
+    fy = _fade(y)
+
+    A = _perm(i)
+    AA = _perm(A + j)
+    AB = _perm(A + jj)
+    B = _perm(ii)
+    BA = _perm(B + j)
+    BB = _perm(B + jj)
+
+    one = np.float32(1)
+    return _lerp(fy, _lerp(fx, _grad2(_perm(AA), x, y), _grad2(_perm(BA), x - one, y)),
+                     _lerp(fx, _grad2(_perm(AB), x, y - one), _grad2(_perm(BB), x - one, y - one)))
+
+
+def pnoise2_grid(x, y, octaves=1, persistence=0.5, lacunarity=2.0, repeatx=1024, repeaty=1024, base=0):
+    """
+    Ruido de Perlin fractal (fBm) sobre arrays, equivalente vectorizado de `pnoise2`.
+
+    Args:
+        x, y (np.ndarray): Coordenadas donde evaluar (se hace broadcast entre ambas).
+
+    Returns:
+        np.ndarray: Valores float32 en [-1, 1] con la forma del broadcast de x e y.
+    """
+    x = np.asarray(x, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+    if octaves <= 1:
+        return perlin2(x, y, repeatx, repeaty, base)
+
+    freq = np.float32(1.0)
+    amp = np.float32(1.0)
+    max_amp = np.float32(0.0)
+    total = np.zeros(np.broadcast_shapes(x.shape, y.shape), dtype=np.float32)
+    for _ in range(octaves):
+        total += perlin2(x * freq, y * freq, np.float32(repeatx) * freq, np.float32(repeaty) * freq, base) * amp
+        max_amp += amp
+        freq *= np.float32(lacunarity)
+        amp *= np.float32(persistence)
+    return total / max_amp
+
+
+def _grilla(N, scale, origin=(0, 0), shape=None):
+    # i * scale se calcula en double y luego se pasa a float, igual que al llamar a pnoise2.
+    # Con origin/shape se evalúa solo un tile (r0, c0) de forma shape de la grilla global.
+    filas, columnas = (N, N) if shape is None else shape
+    xs = (np.arange(origin[0], origin[0] + filas, dtype=np.float64) * scale).astype(np.float32)
+    ys = (np.arange(origin[1], origin[1] + columnas, dtype=np.float64) * scale).astype(np.float32)
+    return xs[:, None], ys[None, :]
+
+
+def generar_alturas(N, scale=0.1, octaves=3, persistence=0.5, lacunarity=2.0, base=0, top_height=5, tolerance=-0.5,
+                    origin=(0, 0), shape=None):
+    xs, ys = _grilla(N, scale, origin, shape)
+    # perlin devuelve valores [-1, 1], los reescalamos
+    h = pnoise2_grid(xs, ys, octaves=octaves, persistence=persistence, lacunarity=lacunarity, base=base)
+    h = h.astype(np.float64)
+    # normalizamos a [0,1] y escalamos a [0, top_height]
+    alturas = np.where(h > tolerance, (h + 1) * 0.5 * top_height, 0.0)
+    return alturas.astype(np.float32)
+
+
+def generar_obstaculos(N, scale=0.03, octaves=2, persistence=0.5, lacunarity=2.0, seed=None, threshold=0.2,
+                       origin=(0, 0), shape=None):
     """
     Genera un mapa de obstáculos agrupados (blobs) usando Perlin Noise.
+    Con `origin`/`shape` genera solo ese tile de la grilla N x N.
     Returns: Array plano 1D de uint32 con 0s y 1s.
     """
     if seed is None:
         seed = random.randint(0, 100)
-        
+
+    # Usamos 'seed' como base para que los obstáculos no coincidan
+    # exactamente con las dunas de arena (si no quieres).
+    xs, ys = _grilla(N, scale, origin, shape)
+    h = pnoise2_grid(xs, ys, octaves=octaves, persistence=persistence, lacunarity=lacunarity, base=seed)
+
+    # APLICAMOS EL UMBRAL (THRESHOLD)
+    # Si el valor del ruido es mayor que el umbral, ponemos un 1 (obstáculo)
+    # Si scale es bajo (ej. 0.02), los grupos serán grandes.
     # Usamos un array plano directamente porque el SSBO lo prefiere así
-    obstaculos = np.zeros(N * N, dtype=np.uint32)
-    
-    for i in range(N):
-        for j in range(N):
-            # Generamos ruido [-1, 1]
-            # Usamos 'seed' como base para que los obstáculos no coincidan
-            # exactamente con las dunas de arena (si no quieres).
-            h = pnoise2(i * scale, 
-                        j * scale, 
-                        octaves=octaves, 
-                        persistence=persistence, 
-                        lacunarity=lacunarity, 
-                        base=seed)
-            
-            # APLICAMOS EL UMBRAL (THRESHOLD)
-            # Si el valor del ruido es mayor que el umbral, ponemos un 1 (obstáculo)
-            # Si scale es bajo (ej. 0.02), los grupos serán grandes.
-            if h > threshold:
-                obstaculos[i * N + j] = 1
-            else:
-                obstaculos[i * N + j] = 0
-                
-    return obstaculos
\ No newline at end of file
+    return (h.astype(np.float64) > threshold).astype(np.uint32).ravel()
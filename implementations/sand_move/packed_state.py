@@ -0,0 +1,130 @@
+"""
+Layout compacto del estado de `sand_move` (ver shaders/cell_state.glsl).
+
+Conversión en la CPU entre los buffers completos (uint32 / float32 / vec2, uno
+por campo) y los compactos:
+
+- celdas: arena en los 16 bits bajos y bedrock en los 16 altos de un uint32.
+- obstáculos: un bit por celda, bit i % 32 de la palabra i // 32.
+- máscaras: sticky | erosión << 8 | sombra << 16, cuantizadas a 8 bits.
+- viento (A y W): dos float16 en un uint32, como packHalf2x16 (x en los bits bajos).
+
+Todas las funciones trabajan con buffers planos, igual que los SSBOs.
+"""
+import numpy as np
+
+SAND_MAX = 0xFFFF
+BEDROCK_MAX = 0xFFFF
+
+# Bytes por celda movidos/guardados por campo en cada layout
+BYTES_PER_CELL = {
+    "full": {"sand": 4, "bedrock": 4, "obstacles": 4, "wind_heightfield": 8, "wind_field": 8,
+             "wind_shadowing": 4, "sticky_mask": 4, "erosion_mask": 4, "smoothed_heights": 8},
+    # H_50 y H_200 quedan en float32 (sus gradientes son diferencias chicas)
+    "packed": {"cells": 4, "obstacles": 1 / 8, "wind_heightfield": 4, "wind_field": 4, "masks": 4,
+               "smoothed_heights": 8},
+}
+
+
+def pack_cells(sand, bedrock):
+    sand = np.asarray(sand)
+    bedrock = np.asarray(bedrock)
+    if sand.size and int(sand.max()) > SAND_MAX:
+        raise ValueError(f"La arena llega a {int(sand.max())} slabs; el layout compacto admite hasta {SAND_MAX}")
+    if bedrock.size and int(bedrock.max()) > BEDROCK_MAX:
+        raise ValueError(f"El bedrock llega a {int(bedrock.max())} slabs; el layout compacto admite hasta {BEDROCK_MAX}")
+    return sand.astype(np.uint32) | (bedrock.astype(np.uint32) << 16)
+
+
+def sand_of(cells):
+    return np.asarray(cells, dtype=np.uint32) & np.uint32(0xFFFF)
+
+
+def bedrock_of(cells):
+    return np.asarray(cells, dtype=np.uint32) >> np.uint32(16)
+
+
+def unpack_cells(cells):
+    """Returns: (arena, bedrock) como uint32."""
+    return sand_of(cells), bedrock_of(cells)
+
+
+def obstacle_words(n_cells):
+    return (n_cells + 31) // 32
+
+
+def pack_obstacles(obstacles):
+    bits = np.packbits(np.asarray(obstacles).reshape(-1) > 0, bitorder="little")
+    palabras = np.zeros(obstacle_words(np.asarray(obstacles).size) * 4, dtype=np.uint8)
+    palabras[:bits.size] = bits
+    return palabras.view("<u4").astype(np.uint32)
+
+
+def unpack_obstacles(words, n_cells):
+    bits = np.unpackbits(np.asarray(words, dtype="<u4").view(np.uint8), count=n_cells, bitorder="little")
+    return bits.astype(np.uint32)
+
+
+def _quantize8(v):
+    return np.rint(np.clip(np.asarray(v, dtype=np.float32), 0.0, 1.0) * 255.0).astype(np.uint32)
+
+
+def quantize_masks(sticky, erosion, shadow):
+    return _quantize8(sticky) | (_quantize8(erosion) << 8) | (_quantize8(shadow) << 16)
+
+
+def dequantize_masks(masks):
+    """Returns: (sticky, erosión, sombra) como float32 en [0, 1]."""
+    masks = np.asarray(masks, dtype=np.uint32)
+    campo = lambda shift: ((masks >> np.uint32(shift)) & np.uint32(0xFF)).astype(np.float32) / 255.0
+    return campo(0), campo(8), campo(16)
+
+
+def pack_half2(v):
+    """(n, 2) float32 -> (n,) uint32 con el mismo formato que packHalf2x16."""
+    v = np.ascontiguousarray(np.asarray(v, dtype=np.float32).reshape(-1, 2), dtype="<f2")
+    return v.view("<u4").reshape(-1).astype(np.uint32)
+
+
+def unpack_half2(words):
+    """(n,) uint32 -> (n, 2) float32."""
+    return np.ascontiguousarray(words, dtype="<u4").view("<f2").reshape(-1, 2).astype(np.float32)
+
+
+def pack_state(state):
+    """
+    Estado completo (nombres de implementations/sand_move/checkpoint.py) ->
+    buffers compactos: cells, obstacle_bits, wind_heightfield, wind_field, masks.
+    Los campos de viento y máscaras que falten quedan en cero.
+    """
+    n_cells = np.asarray(state["sand"]).size
+    ceros = np.zeros(n_cells, dtype=np.float32)
+    ceros2 = np.zeros((n_cells, 2), dtype=np.float32)
+    return {
+        "cells": pack_cells(state["sand"], state["bedrock"]),
+        "obstacle_bits": pack_obstacles(state["obstacles"]),
+        "wind_heightfield": pack_half2(state.get("wind_heightfield", ceros2)),
+        "wind_field": pack_half2(state.get("wind_field", ceros2)),
+        "masks": quantize_masks(state.get("sticky_mask", ceros), state.get("erosion_mask", ceros),
+                                state.get("wind_shadowing", ceros)),
+    }
+
+
+def unpack_state(packed, n_cells):
+    """Inversa de `pack_state` (las máscaras y el viento vuelven con la precisión reducida)."""
+    sand, bedrock = unpack_cells(packed["cells"])
+    sticky, erosion, shadow = dequantize_masks(packed["masks"])
+    return {
+        "sand": sand,
+        "bedrock": bedrock,
+        "obstacles": unpack_obstacles(packed["obstacle_bits"], n_cells),
+        "wind_heightfield": unpack_half2(packed["wind_heightfield"]),
+        "wind_field": unpack_half2(packed["wind_field"]),
+        "wind_shadowing": shadow,
+        "sticky_mask": sticky,
+        "erosion_mask": erosion,
+    }
+
+
+def bytes_per_cell(layout):
+    return sum(BYTES_PER_CELL[layout].values())
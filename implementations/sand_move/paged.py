@@ -0,0 +1,331 @@
+"""
+Mundo paginado de `sand_move`: grillas más grandes que la memoria de la GPU.
+
+El mundo vive en disco como archivos mapeados en memoria (np.memmap), uno por
+buffer del estado: bedrock, obstáculos y dos de arena (ping-pong). No hace falta
+guardar nada más: el viento, la sombra, las máscaras y las alturas suavizadas
+(con `smoothing_interval` 1) se recalculan en cada paso a partir de las
+alturas, así que lo único que evoluciona es la arena.
+
+Un paso recorre el mundo por tiles de tamaño fijo. Para cada tile se carga una
+ventana cuadrada (el tile más un margen) desde la arena del paso actual, se
+simula un paso completo sobre la ventana con un motor normal de tamaño
+ventana (GPU o NumPy) y se escribe solo el tile en la arena del paso
+siguiente. El margen cubre todo lo que el paso lee alrededor de una celda:
+
+    margen = max(R_s + 1, r_200 + 1) + 2 * alcance + 2 * cascade_iterations
+
+(R_s + 1 para sombra y máscaras, r_200 + 1 para el gradiente de H_200, con
+r_200 el radio de su ventana, 2 * alcance para el transporte, con
+alcance = R_s * ceil(cell_size_m), y 2 por cada iteración de cascada; ver
+tiled_engine.py). Con ese margen cada tile sale igual que si se simulara el
+mundo completo en memoria. Excepción: la cascada adaptativa corta cuando nada
+se mueve en la ventana (exacto) pero no respeta `cascade_tolerance` > 0, que
+necesitaría la suma de todo el mundo.
+
+La lectura de las ventanas siguientes (prefetch) y la escritura de los tiles
+ya simulados van en hilos aparte mientras se simula el tile actual. El orden
+de los tiles es un barrido en serpentina o, si se da un foco (p. ej. la
+posición de la cámara), de más cerca a más lejos del foco.
+
+Archivos del mundo:
+
+    meta.json               N, pasos, qué buffer de arena es el actual
+    bedrock.u32, obstacles.u32, sand_0.u32, sand_1.u32   (N, N) uint32
+
+meta.json se reescribe (de forma atómica) al terminar cada paso, así que un
+paso cortado a la mitad deja el mundo en el paso anterior.
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from implementations.sand_move.cpu_engine import radios_suavizado
+from implementations.sand_move.tiled_engine import alcance_transporte, dividir
+
+FORMAT = "sand_move-world"
+VERSION = 1
+BUFFERS = ("bedrock", "obstacles", "sand_0", "sand_1")
+
+
+def margen(R_s, cell_size_m, cascade_iterations, cascade_reach=2, smoothing_radius=0):
+    """
+    Celdas alrededor de un tile que hacen falta para simular un paso exacto.
+    `cascade_reach` es cuánto se propaga una iteración de cascada (2; en el
+    modo "tiled" de la GPU, 2 por cada sub-iteración). `smoothing_radius` es el
+    radio de la ventana más grande de las alturas suavizadas, si se recalculan
+    dentro del paso (0 si vienen de antes).
+    """
+    return (max(R_s, smoothing_radius) + 1 + 2 * alcance_transporte(R_s, cell_size_m)
+            + cascade_reach * cascade_iterations)
+
+
+class PagedWorld:
+    """
+    Mundo N x N en memoria mapeada. `sand` es la arena del paso actual y
+    `sand_next` la que se está escribiendo; `commit_step()` las intercambia.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "meta.json") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT:
+            raise ValueError(f"{path} no es un mundo de sand_move")
+        self.N = self.meta["N"]
+        forma = (self.N, self.N)
+        self.bedrock = np.memmap(self.path / "bedrock.u32", dtype=np.uint32, mode="r", shape=forma)
+        self.obstacles = np.memmap(self.path / "obstacles.u32", dtype=np.uint32, mode="r", shape=forma)
+        self._sand = [np.memmap(self.path / f"sand_{i}.u32", dtype=np.uint32, mode="r+", shape=forma)
+                      for i in (0, 1)]
+
+    @classmethod
+    def create(cls, path, N, generar_tile, tile_size=1024):
+        """
+        Crea un mundo nuevo tile por tile, sin tener nunca la grilla completa en
+        memoria. `generar_tile(origin, shape)` devuelve un dict con arrays 2D
+        uint32 "sand", "bedrock" y "obstacles" (ver terreno.generar_tile).
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        forma = (N, N)
+        mapas = {nombre: np.memmap(path / f"{nombre}.u32", dtype=np.uint32, mode="w+", shape=forma)
+                 for nombre in BUFFERS}
+        for r0, r1 in dividir(N, -(-N // tile_size)):
+            for c0, c1 in dividir(N, -(-N // tile_size)):
+                datos = generar_tile((r0, c0), (r1 - r0, c1 - c0))
+                for nombre in ("bedrock", "obstacles"):
+                    mapas[nombre][r0:r1, c0:c1] = datos[nombre]
+                mapas["sand_0"][r0:r1, c0:c1] = datos["sand"]
+        for m in mapas.values():
+            m.flush()
+        del mapas
+        _escribir_meta(path, {"format": FORMAT, "version": VERSION, "N": N, "current": 0, "steps": 0})
+        return cls(path)
+
+    @classmethod
+    def from_arrays(cls, path, sand, bedrock, obstacles):
+        """Crea un mundo a partir de arrays en memoria (planos o 2D)."""
+        N = int(round(np.sqrt(np.asarray(sand).size)))
+        datos = {"sand": sand, "bedrock": bedrock, "obstacles": obstacles}
+        return cls.create(path, N, lambda origin, shape: {
+            k: np.asarray(v, dtype=np.uint32).reshape(N, N)[origin[0]:origin[0] + shape[0],
+                                                             origin[1]:origin[1] + shape[1]]
+            for k, v in datos.items()}, tile_size=N)
+
+    @property
+    def steps(self):
+        return self.meta["steps"]
+
+    @property
+    def sand(self):
+        return self._sand[self.meta["current"]]
+
+    @property
+    def sand_next(self):
+        return self._sand[1 - self.meta["current"]]
+
+    def read_window(self, r0, c0, size):
+        """Copia en memoria de la ventana cuadrada `size` con esquina (r0, c0)."""
+        v = (slice(r0, r0 + size), slice(c0, c0 + size))
+        return {"sand": np.array(self.sand[v]), "bedrock": np.array(self.bedrock[v]),
+                "obstacles": np.array(self.obstacles[v])}
+
+    def commit_step(self):
+        """La arena escrita pasa a ser la actual (después de bajarla a disco)."""
+        self.sand_next.flush()
+        meta = dict(self.meta, current=1 - self.meta["current"], steps=self.meta["steps"] + 1)
+        _escribir_meta(self.path, meta)
+        self.meta = meta
+
+    def close(self):
+        for m in self._sand:
+            m.flush()
+        self._sand = []
+        self.bedrock = self.obstacles = None
+
+
+def _escribir_meta(path, meta):
+    tmp = Path(path) / "meta.json.tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, Path(path) / "meta.json")
+
+
+def plan_tiles(N, tile_size, margin):
+    """
+    Tiles del mundo con su ventana.
+
+    Returns:
+        tuple: (tamaño de la ventana, lista de (tile (r0, r1, c0, c1), esquina
+        (wr0, wc0) de la ventana)). La ventana es cuadrada y se corre hacia
+        adentro en los bordes del mundo, donde el margen ya no hace falta.
+    """
+    size = min(N, tile_size + 2 * margin)
+    partes = -(-N // tile_size)
+    tiles = []
+    for r0, r1 in dividir(N, partes):
+        for c0, c1 in dividir(N, partes):
+            wr0 = min(max(r0 - margin, 0), N - size)
+            wc0 = min(max(c0 - margin, 0), N - size)
+            tiles.append(((r0, r1, c0, c1), (wr0, wc0)))
+    return size, tiles
+
+
+def ordenar(tiles, focus=None):
+    """
+    Orden de proceso (y de prefetch): sin foco, barrido en serpentina por filas
+    de tiles; con foco (fila, columna), de más cerca a más lejos del foco.
+    """
+    if focus is not None:
+        def distancia(t):
+            r0, r1, c0, c1 = t[0]
+            return ((r0 + r1) / 2 - focus[0]) ** 2 + ((c0 + c1) / 2 - focus[1]) ** 2
+        return sorted(tiles, key=distancia)
+    filas = {}
+    for t in tiles:
+        filas.setdefault(t[0][0], []).append(t)
+    orden = []
+    for i, r0 in enumerate(sorted(filas)):
+        fila = sorted(filas[r0], key=lambda t: t[0][2])
+        orden.extend(fila if i % 2 == 0 else fila[::-1])
+    return orden
+
+
+class CpuTileStepper:
+    """Simula un paso sobre una ventana con NumpySandEngine."""
+
+    def __init__(self, size, **params):
+        from implementations.sand_move.cpu_engine import NumpySandEngine
+        ceros = np.zeros(size * size, dtype=np.uint32)
+        # Tolerancia 0: la cascada corta solo cuando la ventana ya no cambia (exacto)
+        params["cascade_tolerance"] = 0
+        # Las alturas suavizadas no se guardan en el mundo: se recalculan siempre
+        params["smoothing_interval"] = 1
+        self.engine = NumpySandEngine(ceros, ceros, ceros.copy(), size, **params)
+        self.size = size
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+    def step(self, ventana, origin):
+        e = self.engine
+        e.sand_slabs[:] = ventana["sand"].ravel()
+        e.bedrock_slabs[:] = ventana["bedrock"].ravel()
+        e.obstacles[:] = ventana["obstacles"].ravel()
+        e.origin = origin
+        e.step()
+        return e.sand_slabs.reshape(self.size, self.size)
+
+    def close(self):
+        pass
+
+
+class GpuTileStepper:
+    """
+    Simula un paso sobre una ventana con GPUSandSimulation. Solo la ventana
+    ocupa memoria de la GPU: el mismo juego de SSBOs se reutiliza para todos
+    los tiles.
+    """
+
+    def __init__(self, shader_path, size, group_size_x=32, group_size_y=32, packed_state=False, **params):
+        from implementations.sand_move.gpu_sim import GPUSandSimulation
+        ceros = np.zeros(size * size, dtype=np.uint32)
+        params.setdefault("cascade_mode", "gather")
+        params["cascade_tolerance"] = 0
+        params["smoothing_interval"] = 1
+        self.sim = GPUSandSimulation(shader_path, size, ceros, ceros, ceros, group_size_x, group_size_y,
+                                     packed_state=packed_state, unpacked_copies=False, **params)
+        self.size = size
+
+    def __getattr__(self, name):
+        return getattr(self.sim, name)
+
+    def step(self, ventana, origin):
+        self.sim.upload(ventana["sand"].ravel(), ventana["bedrock"].ravel(), ventana["obstacles"].ravel())
+        self.sim.origin = origin
+        self.sim.step()
+        return self.sim.read_sand().reshape(self.size, self.size)
+
+    def close(self):
+        self.sim.release()
+
+
+class PagedSimulation:
+    """
+    Avanza un `PagedWorld` paso a paso con un stepper de tamaño ventana.
+
+    `make_stepper(size, **params)` crea el stepper (p. ej. CpuTileStepper o
+    `functools.partial(GpuTileStepper, shader_path)`) para ventanas de `size` x
+    `size`, con los parámetros del motor; se crea una vez. Los parámetros
+    quedan fijos porque de R_s, cell_size_m y cascade_iterations depende el
+    margen. `prefetch` es cuántas ventanas se leen por adelantado.
+    """
+
+    def __init__(self, world, make_stepper, tile_size=1024, prefetch=2, **params):
+        if params.get("shadow_mode") == "sweep":
+            raise ValueError("La sombra por barridos no tiene alcance acotado: no entra en el margen de las ventanas")
+        self.world = world
+        self.tile_size = tile_size
+        self.params = params
+        alcance_cascada = 2
+        if params.get("cascade_mode") == "tiled":
+            alcance_cascada *= params.get("cascade_sub_iterations", 4)
+        self.margin = margen(params.get("R_s", 10), params.get("cell_size_m", 1.0),
+                             params.get("cascade_iterations", 10), alcance_cascada,
+                             max(radios_suavizado(params.get("cell_size_m", 1.0))))
+        self.window_size, self.tiles = plan_tiles(world.N, tile_size, self.margin)
+        self.stepper = make_stepper(self.window_size, **params)
+        self.prefetch = max(1, prefetch)
+        self._lector = ThreadPoolExecutor(1, thread_name_prefix="paged-read")
+        self._escritor = ThreadPoolExecutor(1, thread_name_prefix="paged-write")
+        self.last_step_stats = {}
+
+    @property
+    def steps(self):
+        return self.world.steps
+
+    def _escribir(self, tile, ventana, sand):
+        r0, r1, c0, c1 = tile
+        wr0, wc0 = ventana
+        self.world.sand_next[r0:r1, c0:c1] = sand[r0 - wr0:r1 - wr0, c0 - wc0:c1 - wc0]
+
+    def step(self, focus=None):
+        """Un paso de todo el mundo. `focus` (fila, columna) prioriza los tiles cercanos."""
+        orden = ordenar(self.tiles, focus)
+        leer = lambda t: self.world.read_window(t[1][0], t[1][1], self.window_size)
+        pendientes = [self._lector.submit(leer, t) for t in orden[:self.prefetch]]
+        escritura = None
+        espera = simulacion = 0.0
+        for i, (tile, esquina) in enumerate(orden):
+            t0 = time.perf_counter()
+            ventana = pendientes.pop(0).result()
+            if i + self.prefetch < len(orden):
+                pendientes.append(self._lector.submit(leer, orden[i + self.prefetch]))
+            t1 = time.perf_counter()
+            sand = self.stepper.step(ventana, esquina)
+            # El stepper reutiliza su buffer: se copia antes de escribirlo en otro hilo
+            sand = np.array(sand)
+            t2 = time.perf_counter()
+            if escritura is not None:
+                escritura.result()
+            escritura = self._escritor.submit(self._escribir, tile, esquina, sand)
+            espera += (t1 - t0) + (time.perf_counter() - t2)
+            simulacion += t2 - t1
+        if escritura is not None:
+            escritura.result()
+        self.world.commit_step()
+        self.last_step_stats = {"tiles": len(orden), "io_wait_s": espera, "simulate_s": simulacion}
+
+    def run(self, n_steps, focus=None):
+        for _ in range(n_steps):
+            self.step(focus)
+
+    def close(self):
+        self._lector.shutdown()
+        self._escritor.shutdown()
+        self.stepper.close()
@@ -0,0 +1,66 @@
+from OpenGL import GL
+import numpy as np
+from utils.gl_utils import AsyncReadback
+from utils.recorder import FrameRecorder
+
+
+class SandRecorder:
+    """
+    Graba la arena de la GPU cada `every` pasos sin detener la simulación.
+
+    La copia GPU -> CPU va por un `AsyncReadback` (con fence, sin esperar) y
+    cuando termina el frame se entrega a un `FrameRecorder`, que lo comprime y
+    escribe en un hilo de fondo. Si el anillo de lecturas todavía está ocupado
+    o la cola del escritor está llena, el frame se descarta y se cuenta en
+    `dropped` (con `on_full="block"` se espera al escritor en vez de descartar).
+
+    Si el SSBO no es la arena tal cual (layout compacto), `transform` la saca
+    de cada lectura antes de encolarla (p. ej. `packed_state.sand_of`).
+    """
+
+    def __init__(self, path, ssbo, N, every=1, ring_size=4, queue_size=8, on_full="drop",
+                 frames_per_chunk=16, static=None, attrs=None, transform=None):
+        self.ssbo = ssbo
+        self.transform = transform
+        self.shape = (N, N)
+        self.every = max(1, every)
+        self.readback = AsyncReadback(N * N * 4, ring_size)
+        self.recorder = FrameRecorder(path, self.shape, np.uint32, frames_per_chunk, queue_size, on_full,
+                                      static=static, attrs=dict(attrs or {}, every=self.every))
+        self.pasos = {}   # número de request -> paso de la simulación
+        self.ring_dropped = 0
+
+    @property
+    def dropped(self):
+        return self.ring_dropped + self.recorder.dropped
+
+    @property
+    def recorded(self):
+        return self.recorder.recorded
+
+    def collect(self):
+        """Pasa al escritor las lecturas que ya terminaron."""
+        for vista, request in self.readback.poll(self.shape, np.uint32):
+            if self.transform is not None:
+                vista = self.transform(vista)
+            self.recorder.push(self.pasos.pop(request), vista)
+
+    def after_step(self, step):
+        """Llamar después de cada paso; `step` es el número de pasos ya hechos."""
+        self.collect()
+        if step % self.every:
+            return
+        if not self.readback.can_request():
+            self.ring_dropped += 1
+            return
+        # can_request puede haber completado una lectura que todavía no se entregó
+        self.collect()
+        self.pasos[self.readback.n_requests] = step
+        self.readback.request(self.ssbo)
+
+    def close(self):
+        """Espera las lecturas pendientes, cierra el escritor y libera el anillo."""
+        GL.glFinish()
+        self.collect()
+        self.readback.release()
+        self.recorder.close()
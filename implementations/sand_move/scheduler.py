@@ -0,0 +1,97 @@
+import math
+import time
+from collections import deque
+
+
+class FixedStepScheduler:
+    """
+    Planificador de pasos de simulación a tasa fija, independiente del render.
+
+    Acumula el tiempo real transcurrido y en cada `tick` ejecuta los pasos que
+    tocan según `steps_per_second` (varios si va atrasado), con un tope de
+    `max_steps_per_tick` para no congelar la ventana. Si el atraso supera ese
+    tope, los pasos sobrantes se descartan (`dropped_steps`) en vez de
+    acumularse para siempre.
+
+    Con `steps_per_second = None` corre sin límite: en cada tick ejecuta pasos
+    hasta gastar `tick_budget_s` segundos (o hasta el tope por tick).
+    """
+
+    def __init__(self, steps_per_second=1.0, max_steps_per_tick=8, tick_budget_s=0.012,
+                 rate_window_s=2.0, clock=time.perf_counter):
+        self.steps_per_second = steps_per_second
+        self.max_steps_per_tick = max_steps_per_tick
+        self.tick_budget_s = tick_budget_s
+        self.rate_window_s = rate_window_s
+        self.clock = clock
+
+        self.paused = False
+        self.total_steps = 0
+        self.dropped_steps = 0
+        self._accumulator = 0.0
+        self._last = None
+        self._history = deque()   # (tiempo, pasos) de los ticks recientes
+
+    def reset(self):
+        self._accumulator = 0.0
+        self._last = None
+        self._history.clear()
+        self.total_steps = 0
+        self.dropped_steps = 0
+
+    def tick(self, step_fn):
+        """
+        Ejecuta los pasos pendientes llamando a `step_fn()` una vez por paso.
+
+        Returns:
+            int: Pasos ejecutados en este tick.
+        """
+        now = self.clock()
+        elapsed = 0.0 if self._last is None else now - self._last
+        self._last = now
+
+        if self.paused:
+            self._accumulator = 0.0
+            self._record(now, 0)
+            return 0
+
+        if not self.steps_per_second:
+            steps = 0
+            while steps < self.max_steps_per_tick:
+                step_fn()
+                steps += 1
+                if self.clock() - now >= self.tick_budget_s:
+                    break
+            self._record(now, steps)
+            return steps
+
+        dt = 1.0 / self.steps_per_second
+        self._accumulator += elapsed
+        due = int(math.floor(self._accumulator / dt))
+        steps = min(due, self.max_steps_per_tick)
+        if due > steps:
+            # Demasiado atrasado: se descarta el exceso
+            self.dropped_steps += due - steps
+            self._accumulator -= (due - steps) * dt
+        for _ in range(steps):
+            step_fn()
+        self._accumulator -= steps * dt
+        self._record(now, steps)
+        return steps
+
+    def _record(self, now, steps):
+        self.total_steps += steps
+        self._history.append((now, steps))
+        while self._history and now - self._history[0][0] > self.rate_window_s:
+            self._history.popleft()
+
+    @property
+    def achieved_steps_per_second(self):
+        """Pasos por segundo logrados en la ventana reciente."""
+        if len(self._history) < 2:
+            return 0.0
+        span = self._history[-1][0] - self._history[0][0]
+        if span <= 0.0:
+            return 0.0
+        # El primer tick de la ventana marca el inicio: sus pasos no cuentan
+        return sum(s for _, s in list(self._history)[1:]) / span
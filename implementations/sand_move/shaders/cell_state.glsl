@@ -0,0 +1,118 @@
+// Acceso al estado de las celdas, en el layout completo o en el compacto
+// (#define PACKED_STATE). Los shaders de la simulación leen y escriben el estado
+// solo con estas funciones, así que el mismo código sirve para los dos.
+//
+// Layout completo (un buffer por campo, 40 bytes por celda):
+//   0 bedrock uint | 1 arena uint | 2 A vec2 | 3 W vec2 | 4 sombra float
+//   5 sticky float | 6 erosión float | 7 obstáculos uint
+//
+// Layout compacto (~16 bytes por celda):
+//   1 celdas uint: arena (16 bits bajos) | bedrock << 16
+//   2 A y 3 W: packHalf2x16
+//   5 máscaras uint: sticky | erosión << 8 | sombra << 16, cuantizadas a 8 bits
+//   7 obstáculos: un bit por celda (bit i % 32 de la palabra i / 32)
+// La arena va en los bits bajos, así que atomicAdd sobre la palabra completa
+// resta arena sin tocar el bedrock. Para sumar, addSand() y storeSandOut()
+// saturan en 65535 (lo que pase de ahí caería en el bedrock) y cuentan las
+// sumas saturadas en sand_overflow (binding 26, en el buffer de contadores de
+// la cascada); el host lo revisa con GPUSandSimulation.check_sand_overflow().
+//
+// En los dos layouts la salida del ping-pong de la cascada va en el binding 13
+// y tiene el mismo formato que la entrada (binding 1), y las alturas suavizadas
+// (H_50, H_200) van como vec2 en el binding 21.
+
+#ifdef PACKED_STATE
+
+layout(std430, binding = 1) buffer Cells { uint cells[]; };
+layout(std430, binding = 2) buffer WindHeightField { uint wind_height_field[]; };
+layout(std430, binding = 3) buffer WindField { uint wind_field[]; };
+layout(std430, binding = 5) buffer Masks { uint masks[]; };
+layout(std430, binding = 7) buffer ObstacleBits { uint obstacle_bits[]; };
+layout(std430, binding = 13) buffer CellsOut { uint cells_out[]; };
+
+layout(std430, binding = 26) buffer SandOverflow { uint sand_overflow; };
+
+// Palabra que contiene la arena (para restar con atomicAdd)
+#define SAND_WORD(i) cells[i]
+
+const uint SAND_MAX = 0xFFFFu;
+
+uint sandAt(int i) { return cells[i] & 0xFFFFu; }
+uint bedrockAt(int i) { return cells[i] >> 16; }
+bool obstacleAt(int i) { return ((obstacle_bits[i >> 5] >> uint(i & 31)) & 1u) != 0u; }
+
+// Suma `amount` a la arena de la celda i, saturando en SAND_MAX
+void addSand(int i, uint amount) {
+    uint prev = cells[i];
+    while (true) {
+        uint total = (prev & SAND_MAX) + amount;
+        uint actual = atomicCompSwap(cells[i], prev, (prev & ~SAND_MAX) | min(total, SAND_MAX));
+        if (actual == prev) {
+            if (total > SAND_MAX) atomicAdd(sand_overflow, 1u);
+            return;
+        }
+        prev = actual;
+    }
+}
+
+void storeSandOut(int i, uint sand) {
+    if (sand > SAND_MAX) atomicAdd(sand_overflow, 1u);
+    cells_out[i] = (cells[i] & ~SAND_MAX) | min(sand, SAND_MAX);
+}
+
+vec2 windAt(int i) { return unpackHalf2x16(wind_field[i]); }
+void storeWindHeightField(int i, vec2 A) { wind_height_field[i] = packHalf2x16(A); }
+void storeWind(int i, vec2 W) { wind_field[i] = packHalf2x16(W); }
+
+uint quantize8(float v) { return uint(round(clamp(v, 0.0, 1.0) * 255.0)); }
+float stickyAt(int i) { return float(masks[i] & 0xFFu) / 255.0; }
+float erosionAt(int i) { return float((masks[i] >> 8) & 0xFFu) / 255.0; }
+float shadowAt(int i) { return float((masks[i] >> 16) & 0xFFu) / 255.0; }
+void storeMasks(int i, float sticky, float erosion, float shadow) {
+    masks[i] = quantize8(sticky) | (quantize8(erosion) << 8) | (quantize8(shadow) << 16);
+}
+void storeShadow(int i, float shadow) { masks[i] = (masks[i] & ~(0xFFu << 16)) | (quantize8(shadow) << 16); }
+
+#else
+
+layout(std430, binding = 0) buffer BedrockSlabs { uint bedrock_slabs[]; };
+layout(std430, binding = 1) buffer SandSlabs { uint sand_slabs[]; };
+layout(std430, binding = 2) buffer WindHeightField { vec2 wind_height_field[]; };
+layout(std430, binding = 3) buffer WindField { vec2 wind_field[]; };
+layout(std430, binding = 4) buffer WindShadowing { float wind_shadowing[]; };
+layout(std430, binding = 5) buffer StickyMask { float sticky_mask[]; };    // [0,1], kb incluido
+layout(std430, binding = 6) buffer ErosionMask { float erosion_mask[]; };  // [0,1]
+layout(std430, binding = 7) buffer Obstacles { uint obstacles[]; };
+layout(std430, binding = 13) buffer SandOut { uint sand_out[]; };
+
+#define SAND_WORD(i) sand_slabs[i]
+
+uint sandAt(int i) { return sand_slabs[i]; }
+uint bedrockAt(int i) { return bedrock_slabs[i]; }
+bool obstacleAt(int i) { return obstacles[i] > 0u; }
+
+void addSand(int i, uint amount) { atomicAdd(sand_slabs[i], amount); }
+void storeSandOut(int i, uint sand) { sand_out[i] = sand; }
+
+vec2 windAt(int i) { return wind_field[i]; }
+void storeWindHeightField(int i, vec2 A) { wind_height_field[i] = A; }
+void storeWind(int i, vec2 W) { wind_field[i] = W; }
+
+float stickyAt(int i) { return sticky_mask[i]; }
+float erosionAt(int i) { return erosion_mask[i]; }
+float shadowAt(int i) { return wind_shadowing[i]; }
+void storeMasks(int i, float sticky, float erosion, float shadow) {
+    sticky_mask[i] = sticky;
+    erosion_mask[i] = erosion;
+    wind_shadowing[i] = shadow;
+}
+void storeShadow(int i, float shadow) { wind_shadowing[i] = shadow; }
+
+#endif
+
+// Altura total (bedrock + arena) por índice plano
+float heightAt(int i) { return float(bedrockAt(i)) + float(sandAt(i)); }
+
+// (H_50, H_200) de height_smooth_compute.glsl
+layout(std430, binding = 21) buffer SmoothedHeights { vec2 smoothed_heights[]; };
+vec2 smoothedAt(int i) { return smoothed_heights[i]; }
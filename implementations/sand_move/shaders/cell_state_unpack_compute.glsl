@@ -0,0 +1,23 @@
+#version 430
+
+layout(local_size_x = 32, local_size_y = 32) in;
+
+// Con el layout compacto (cell_state.glsl) el render sigue leyendo arena y
+// bedrock como uint32: este pase los extrae de las celdas empaquetadas, solo
+// cuando hay que dibujar algo nuevo.
+
+layout(std430, binding = 1) buffer Cells { uint cells[]; };     // arena | bedrock << 16
+layout(std430, binding = 15) buffer SandOut { uint sand_slabs[]; };
+layout(std430, binding = 16) buffer BedrockOut { uint bedrock_slabs[]; };
+
+uniform int N;
+
+void main() {
+    ivec2 p = ivec2(gl_GlobalInvocationID.xy);
+    if (p.x >= N || p.y >= N) return;
+
+    int i = p.y * N + p.x;
+    uint c = cells[i];
+    sand_slabs[i] = c & 0xFFFFu;
+    bedrock_slabs[i] = c >> 16;
+}
@@ -0,0 +1,58 @@
+#version 430
+
+layout(local_size_x = 32, local_size_y = 32) in;
+
+// Pirámide de alturas máximas para el render LOD. El nivel l (l >= 1) tiene
+// (N >> l)^2 celdas y cada una guarda la celda más alta de su bloque 2x2 del
+// nivel anterior como (cima, bedrock). Los obstáculos se marcan con bedrock
+// negativo: -(bedrock + 1). El nivel 0 no se guarda, se lee de los SSBOs.
+
+layout(std430, binding = 0) buffer BedrockSlabs { uint bedrock_slabs[]; };
+layout(std430, binding = 1) buffer SandSlabs { uint sand_slabs[]; };
+layout(std430, binding = 7) buffer Obstacles { uint obstacles[]; };
+layout(std430, binding = 10) buffer HeightPyramid { vec2 pyramid[]; };
+
+uniform int N;
+uniform int level;       // nivel destino (>= 1)
+uniform int topheight;
+
+// Desplazamiento del nivel l (>= 1) dentro del buffer
+int levelOffset(int l) {
+    int offset = 0;
+    for (int k = 1; k < l; ++k) {
+        int n = N >> k;
+        offset += n * n;
+    }
+    return offset;
+}
+
+// Nivel 0: columna tal como la dibuja terrain_vs.glsl
+vec2 baseCell(int i, int j) {
+    int k = i * N + j;
+    float b = float(bedrock_slabs[k]);
+    if (obstacles[k] > 0u) return vec2(max(float(topheight), b), -(b + 1.0));
+    return vec2(b + float(sand_slabs[k]), b);
+}
+
+vec2 srcCell(int i, int j) {
+    if (level == 1) return baseCell(i, j);
+    int n = N >> (level - 1);
+    return pyramid[levelOffset(level - 1) + i * n + j];
+}
+
+void main() {
+    int n = N >> level;
+    int j = int(gl_GlobalInvocationID.x);
+    int i = int(gl_GlobalInvocationID.y);
+    if (i >= n || j >= n) return;
+
+    vec2 best = srcCell(2 * i, 2 * j);
+    vec2 c = srcCell(2 * i, 2 * j + 1);
+    if (c.x > best.x) best = c;
+    c = srcCell(2 * i + 1, 2 * j);
+    if (c.x > best.x) best = c;
+    c = srcCell(2 * i + 1, 2 * j + 1);
+    if (c.x > best.x) best = c;
+
+    pyramid[levelOffset(level) + i * n + j] = best;
+}
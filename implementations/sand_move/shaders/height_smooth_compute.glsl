@@ -0,0 +1,83 @@
+#version 430
+
+layout(local_size_x = 64) in;
+
+// Alturas suavizadas H_50 y H_200: media de H en ventanas cuadradas de
+// (2 * radius + 1)^2 celdas, recortadas en los bordes (cpu_engine.suavizar).
+//
+// Dos pases separables de sumas corridas, una invocación por línea:
+//   pass 0: cada fila suma H en [b - r, b + r] y deja las sumas en row_sums.
+//   pass 1: cada columna suma row_sums en [a - r, a + r] y divide por la
+//           cantidad de celdas de la ventana.
+// La ventana avanza sumando la celda que entra y restando la que sale, así que
+// el costo por celda no depende del radio. Las sumas van en double: con alturas
+// enteras son exactas, igual que las de la CPU.
+
+#include "cell_state.glsl"
+
+// smoothed_heights (binding 21) está en cell_state.glsl
+layout(std430, binding = 22) buffer RowSums { dvec2 row_sums[]; };
+
+uniform int N;
+uniform int pass;
+uniform ivec2 radius;  // radios de H_50 y H_200 en celdas
+
+#ifdef SPARSE_TILES
+// Los tiles donde cambian las alturas suavizadas cuentan como activos (ver sparse_tiles.glsl)
+layout(std430, binding = 17) buffer TileActivity { uint tile_activity[]; };
+uniform int tiles_per_side;
+uniform int tile_size;
+#endif
+
+double H(int a, int b) {
+    int i = a * N + b;
+    return double(bedrockAt(i)) + double(sandAt(i));
+}
+
+void sumarFila(int a) {
+    dvec2 s = dvec2(0.0);
+    for (int b = 0; b < min(radius.x, N); ++b) s.x += H(a, b);
+    for (int b = 0; b < min(radius.y, N); ++b) s.y += H(a, b);
+    for (int b = 0; b < N; ++b) {
+        if (b + radius.x < N) s.x += H(a, b + radius.x);
+        if (b - radius.x - 1 >= 0) s.x -= H(a, b - radius.x - 1);
+        if (b + radius.y < N) s.y += H(a, b + radius.y);
+        if (b - radius.y - 1 >= 0) s.y -= H(a, b - radius.y - 1);
+        row_sums[a * N + b] = s;
+    }
+}
+
+// Celdas de la ventana recortada de radio r alrededor de i, en una dimensión
+int ancho(int i, int r) {
+    return min(i + r, N - 1) - max(i - r, 0) + 1;
+}
+
+void sumarColumna(int b) {
+    dvec2 s = dvec2(0.0);
+    for (int a = 0; a < min(radius.x, N); ++a) s.x += row_sums[a * N + b].x;
+    for (int a = 0; a < min(radius.y, N); ++a) s.y += row_sums[a * N + b].y;
+    for (int a = 0; a < N; ++a) {
+        if (a + radius.x < N) s.x += row_sums[(a + radius.x) * N + b].x;
+        if (a - radius.x - 1 >= 0) s.x -= row_sums[(a - radius.x - 1) * N + b].x;
+        if (a + radius.y < N) s.y += row_sums[(a + radius.y) * N + b].y;
+        if (a - radius.y - 1 >= 0) s.y -= row_sums[(a - radius.y - 1) * N + b].y;
+
+        double cuenta_50 = double(ancho(a, radius.x) * ancho(b, radius.x));
+        double cuenta_200 = double(ancho(a, radius.y) * ancho(b, radius.y));
+        vec2 valor = vec2(float(s.x / cuenta_50), float(s.y / cuenta_200));
+#ifdef SPARSE_TILES
+        if (valor != smoothed_heights[a * N + b])
+            tile_activity[(a / tile_size) * tiles_per_side + b / tile_size] = 1u;
+#endif
+        smoothed_heights[a * N + b] = valor;
+    }
+}
+
+void main() {
+    int linea = int(gl_GlobalInvocationID.x);
+    if (linea >= N) return;
+    if (pass == 0)
+        sumarFila(linea);
+    else
+        sumarColumna(linea);
+}
@@ -3,15 +3,27 @@
 layout(local_size_x = 32, local_size_y = 32) in;
 
 // --- BINDINGS ---
-layout(std430, binding = 0) buffer BedrockSlabs { uint bedrock_slabs[]; };
-layout(std430, binding = 1) buffer SandSlabs { uint sand_slabs[]; };
-layout(std430, binding = 7) buffer Obstacles { uint obstacles[]; }; 
+// Arena, bedrock y obstáculos (layout completo o compacto)
+#include "cell_state.glsl"
+
+// Contadores de convergencia: el host los limpia, lee después de cada
+// iteración y corta la cascada cuando no se mueve nada
+layout(std430, binding = 12) buffer CascadeCounters
+{
+    uint moved_slabs;      // slabs movidos en la iteración
+    uint max_excess_bits;  // floatBitsToUint del mayor exceso sobre el ángulo de reposo
+};
 
 // --- UNIFORMS ---
 uniform int N;
 uniform float cell_size_m;
 uniform float tan_repose_angle; 
 uniform float transfer_rate;    
+// Con la cascada no adaptativa nadie lee los contadores: se saltan los atómicos
+uniform bool count_moved = true;
+
+// Despacho completo o solo los tiles activos
+#include "sparse_tiles.glsl"
 
 // --- CONSTANTES ---
 const float SQRT2 = 1.41421356;
@@ -22,21 +34,20 @@ int idx(int x, int y) {
 }
 
 float getHeight(int x, int y) {
-    int i = idx(x, y);
-    return float(bedrock_slabs[i]) + float(sand_slabs[i]);
+    return heightAt(idx(x, y));
 }
 
 void main() {
-    ivec2 p = ivec2(gl_GlobalInvocationID.xy);
+    ivec2 p = cellXY();
     if (p.x >= N || p.y >= N) return;
 
     int idx_p = idx(p.x, p.y);
     
     // 1. SI SOY UN OBSTACULO, NO HAGO NADA
-    if (obstacles[idx_p] > 0) return;
+    if (obstacleAt(idx_p)) return;
 
     // Si no hay arena, no puede haber avalancha
-    uint my_sand = sand_slabs[idx_p];
+    uint my_sand = sandAt(idx_p);
     if (my_sand == 0) return;
 
     float H_p = getHeight(p.x, p.y);
@@ -57,7 +68,7 @@ void main() {
 
             // 2. SI EL VECINO ES UN OBSTACULO, NO PUEDO CAER AHI
             int idx_n = idx(n.x, n.y);
-            if (obstacles[idx_n] > 0) continue;
+            if (obstacleAt(idx_n)) continue;
 
             float H_n = getHeight(n.x, n.y);
             float diff = H_p - H_n;
@@ -90,8 +101,16 @@ void main() {
             move_amount = min(move_amount, my_sand);
 
             if (move_amount > 0) {
-                atomicAdd(sand_slabs[idx_p], uint(-int(move_amount)));
-                atomicAdd(sand_slabs[idx(target_neighbor.x, target_neighbor.y)], uint(move_amount));
+                atomicAdd(SAND_WORD(idx_p), uint(-int(move_amount)));
+                addSand(idx(target_neighbor.x, target_neighbor.y), uint(move_amount));
+                markMoved(idx_p);
+                markMoved(idx(target_neighbor.x, target_neighbor.y));
+
+                if (count_moved) {
+                    atomicAdd(moved_slabs, move_amount);
+                    // Para floats positivos el orden de los bits coincide con el numérico
+                    atomicMax(max_excess_bits, floatBitsToUint(excess_height));
+                }
             }
         }
     }
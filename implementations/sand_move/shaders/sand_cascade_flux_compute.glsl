@@ -0,0 +1,123 @@
+#version 430
+
+layout(local_size_x = 32, local_size_y = 32) in;
+
+// Cascada determinista, pase 1 de 2: cada celda decide cuántos slabs caen y
+// hacia qué vecino leyendo solo alturas (sin escribir la arena). El pase de
+// gather (sand_cascade_gather_compute.glsl) aplica el flujo a otro buffer, así
+// que el resultado no depende del orden de ejecución.
+
+// --- BINDINGS ---
+// Arena (entrada del ping-pong), bedrock y obstáculos (layout completo o compacto)
+#include "cell_state.glsl"
+layout(std430, binding = 12) buffer CascadeCounters
+{
+    uint moved_slabs;
+    uint max_excess_bits;
+};
+// flujo = cantidad << 3 | dirección (índice en VECINOS); 0 si no cae nada
+layout(std430, binding = 14) buffer CascadeFlux { uint flux[]; };
+
+// --- UNIFORMS ---
+uniform int N;
+uniform float cell_size_m;
+uniform float tan_repose_angle;
+uniform float transfer_rate;
+// Con la cascada no adaptativa nadie lee los contadores: se saltan los atómicos
+uniform bool count_moved = true;
+
+// Despacho completo o solo los tiles activos
+#include "sparse_tiles.glsl"
+
+// --- CONSTANTES ---
+const float SQRT2 = 1.41421356;
+
+// Mismo orden que sand_cascade_compute.glsl (dy externo, dx interno)
+const ivec2 VECINOS[8] = ivec2[](
+    ivec2(-1, -1), ivec2(0, -1), ivec2(1, -1),
+    ivec2(-1, 0),                ivec2(1, 0),
+    ivec2(-1, 1),  ivec2(0, 1),  ivec2(1, 1)
+);
+
+// Totales del work group: un solo atómico global por grupo
+shared uint wg_moved;
+shared uint wg_max_excess_bits;
+
+// --- FUNCIONES AUXILIARES ---
+int idx(int x, int y) {
+    return y * N + x;
+}
+
+uint cellFlux(ivec2 p, out float excess_out) {
+    excess_out = 0.0;
+    int idx_p = idx(p.x, p.y);
+    if (obstacleAt(idx_p)) return 0u;
+
+    uint my_sand = sandAt(idx_p);
+    if (my_sand == 0u) return 0u;
+
+    float H_p = heightAt(idx_p);
+    float max_slope_diff = 0.0;
+    int target = -1;
+    float target_dist = 1.0;
+    float target_height = 0.0;
+
+    for (int k = 0; k < 8; ++k) {
+        ivec2 n = p + VECINOS[k];
+        if (n.x < 0 || n.x >= N || n.y < 0 || n.y >= N) continue;
+        int idx_n = idx(n.x, n.y);
+        if (obstacleAt(idx_n)) continue;
+
+        float H_n = heightAt(idx_n);
+        float diff = H_p - H_n;
+        if (diff > 0.0) {
+            float dist_meters = ((VECINOS[k].x != 0 && VECINOS[k].y != 0) ? SQRT2 : 1.0) * cell_size_m;
+            float slope = diff / dist_meters;
+            if (slope > tan_repose_angle && slope > max_slope_diff) {
+                max_slope_diff = slope;
+                target = k;
+                target_dist = dist_meters;
+                target_height = H_n;
+            }
+        }
+    }
+
+    if (target == -1) return 0u;
+    float excess_height = (H_p - target_height) - tan_repose_angle * target_dist;
+    if (excess_height <= 0.0) return 0u;
+
+    uint move_amount = min(uint(max(1.0, (excess_height * 0.5) * transfer_rate)), my_sand);
+    excess_out = excess_height;
+    return (move_amount << 3) | uint(target);
+}
+
+void main() {
+    if (gl_LocalInvocationIndex == 0u) {
+        wg_moved = 0u;
+        wg_max_excess_bits = 0u;
+    }
+    barrier();
+
+    ivec2 p = cellXY();
+    bool inside = p.x < N && p.y < N;
+
+    float excess_height = 0.0;
+    uint f = inside ? cellFlux(p, excess_height) : 0u;
+    if (inside) flux[idx(p.x, p.y)] = f;
+
+    if (f != 0u) {
+        markMoved(idx(p.x, p.y));
+        ivec2 n = p + VECINOS[f & 7u];
+        markMoved(idx(n.x, n.y));
+        if (count_moved) {
+            atomicAdd(wg_moved, f >> 3);
+            atomicMax(wg_max_excess_bits, floatBitsToUint(excess_height));
+        }
+    }
+    barrier();
+
+    if (count_moved && gl_LocalInvocationIndex == 0u && wg_moved > 0u) {
+        atomicAdd(moved_slabs, wg_moved);
+        atomicMax(max_excess_bits, wg_max_excess_bits);
+    }
+}
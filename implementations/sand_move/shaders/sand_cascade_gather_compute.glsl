@@ -0,0 +1,49 @@
+#version 430
+
+layout(local_size_x = 32, local_size_y = 32) in;
+
+// Cascada determinista, pase 2 de 2: cada celda pierde su salida y recoge lo que
+// le envían sus 8 vecinos según el flujo de sand_cascade_flux_compute.glsl.
+// Lee la arena del binding 1 y escribe en el 13 (ping-pong), sin atómicos.
+
+// --- BINDINGS ---
+// Arena de entrada y de salida (layout completo o compacto)
+#include "cell_state.glsl"
+layout(std430, binding = 14) buffer CascadeFlux { uint flux[]; };
+
+// --- UNIFORMS ---
+uniform int N;
+
+// Despacho completo o solo los tiles activos
+#include "sparse_tiles.glsl"
+
+// --- CONSTANTES ---
+// El vecino en p + VECINOS[k] envía a p si eligió la dirección opuesta, 7 - k
+const ivec2 VECINOS[8] = ivec2[](
+    ivec2(-1, -1), ivec2(0, -1), ivec2(1, -1),
+    ivec2(-1, 0),                ivec2(1, 0),
+    ivec2(-1, 1),  ivec2(0, 1),  ivec2(1, 1)
+);
+
+int idx(int x, int y) {
+    return y * N + x;
+}
+
+void main() {
+    ivec2 p = cellXY();
+    if (p.x >= N || p.y >= N) return;
+
+    int idx_p = idx(p.x, p.y);
+    uint v = sandAt(idx_p) - (flux[idx_p] >> 3);
+
+    for (int k = 0; k < 8; ++k) {
+        ivec2 n = p + VECINOS[k];
+        if (n.x < 0 || n.x >= N || n.y < 0 || n.y >= N) continue;
+        // El flujo de los tiles que no se procesan quedó de otro paso (y ahí no cae nada)
+        if (!cellDispatched(n.x, n.y)) continue;
+        uint f = flux[idx(n.x, n.y)];
+        if (f != 0u && (f & 7u) == uint(7 - k)) v += f >> 3;
+    }
+
+    storeSandOut(idx_p, v);
+}
@@ -0,0 +1,172 @@
+#version 430
+
+// Cascada por tiles en memoria compartida: cada work group carga su tile más un
+// halo una sola vez, hace `sub_iterations` relajaciones en la memoria del chip y
+// escribe solo el interior del tile.
+//
+// Para que los halos de tiles vecinos calculen exactamente lo mismo, cada
+// sub-iteración es síncrona (flujo y luego gather, como sand_cascade en
+// cpu_engine.py) en vez del scatter con atómicos de sand_cascade_compute.glsl.
+// Una sub-iteración invalida 2 celdas del borde (el flujo mira a los vecinos y el
+// gather al flujo de los vecinos), así que el halo es de 2 * MAX_SUB_ITERATIONS.
+// Se lee la arena del binding 1 y se escribe en el 13: otros grupos siguen
+// leyendo sus halos de la entrada mientras este escribe.
+
+#define TILE 16
+#define MAX_SUB_ITERATIONS 4
+#define HALO (2 * MAX_SUB_ITERATIONS)
+#define S (TILE + 2 * HALO)
+#define THREADS (TILE * TILE)
+
+layout(local_size_x = TILE, local_size_y = TILE) in;
+
+// --- BINDINGS ---
+// Arena de entrada y de salida, bedrock y obstáculos (layout completo o compacto)
+#include "cell_state.glsl"
+layout(std430, binding = 12) buffer CascadeCounters
+{
+    uint moved_slabs;
+    uint max_excess_bits;
+};
+
+// --- UNIFORMS ---
+uniform int N;
+uniform float cell_size_m;
+uniform float tan_repose_angle;
+uniform float transfer_rate;
+uniform int sub_iterations;   // <= MAX_SUB_ITERATIONS
+// Con la cascada no adaptativa nadie lee los contadores: se saltan los atómicos
+uniform bool count_moved = true;
+
+// --- CONSTANTES ---
+const float SQRT2 = 1.41421356;
+
+// Mismo orden que sand_cascade_compute.glsl (dy externo, dx interno); el
+// opuesto de la dirección k es 7 - k
+const ivec2 VECINOS[8] = ivec2[](
+    ivec2(-1, -1), ivec2(0, -1), ivec2(1, -1),
+    ivec2(-1, 0),                ivec2(1, 0),
+    ivec2(-1, 1),  ivec2(0, 1),  ivec2(1, 1)
+);
+
+// --- MEMORIA COMPARTIDA ---
+shared uint s_bedrock[S * S];
+shared uint s_sand[S * S];
+shared bool s_blocked[S * S];   // obstáculo o fuera del mapa
+shared uint s_amount[S * S];
+shared int s_target[S * S];
+
+bool inTile(ivec2 t) {
+    return t.x >= 0 && t.x < S && t.y >= 0 && t.y < S;
+}
+
+float height(int s) {
+    return float(s_bedrock[s]) + float(s_sand[s]);
+}
+
+void main() {
+    int lid = int(gl_LocalInvocationIndex);
+    ivec2 origin = ivec2(gl_WorkGroupID.xy) * TILE - HALO;
+
+    // 1. Cargar tile + halo
+    for (int s = lid; s < S * S; s += THREADS) {
+        ivec2 g = origin + ivec2(s % S, s / S);
+        if (g.x < 0 || g.x >= N || g.y < 0 || g.y >= N) {
+            s_bedrock[s] = 0u;
+            s_sand[s] = 0u;
+            s_blocked[s] = true;
+        } else {
+            int i = g.y * N + g.x;
+            s_bedrock[s] = bedrockAt(i);
+            s_sand[s] = sandAt(i);
+            s_blocked[s] = obstacleAt(i);
+        }
+    }
+    barrier();
+
+    uint my_moved = 0u;
+    float my_max_excess = 0.0;
+    uint new_sand[(S * S + THREADS - 1) / THREADS];
+
+    for (int it = 0; it < min(sub_iterations, MAX_SUB_ITERATIONS); ++it) {
+        // 2. Flujo: cuántos slabs caen y hacia qué vecino, con las alturas actuales
+        for (int s = lid; s < S * S; s += THREADS) {
+            ivec2 t = ivec2(s % S, s / S);
+            s_amount[s] = 0u;
+            s_target[s] = -1;
+            if (s_blocked[s] || s_sand[s] == 0u) continue;
+
+            float H_p = height(s);
+            float max_slope_diff = 0.0;
+            int target = -1;
+            float target_dist = 1.0;
+            for (int k = 0; k < 8; ++k) {
+                ivec2 n = t + VECINOS[k];
+                if (!inTile(n)) continue;
+                int sn = n.y * S + n.x;
+                if (s_blocked[sn]) continue;
+
+                float diff = H_p - height(sn);
+                if (diff > 0.0) {
+                    float dist_meters = ((VECINOS[k].x != 0 && VECINOS[k].y != 0) ? SQRT2 : 1.0) * cell_size_m;
+                    float slope = diff / dist_meters;
+                    if (slope > tan_repose_angle && slope > max_slope_diff) {
+                        max_slope_diff = slope;
+                        target = k;
+                        target_dist = dist_meters;
+                    }
+                }
+            }
+
+            if (target != -1) {
+                ivec2 n = t + VECINOS[target];
+                float excess_height = (H_p - height(n.y * S + n.x)) - tan_repose_angle * target_dist;
+                if (excess_height > 0.0) {
+                    uint move_amount = min(uint(max(1.0, (excess_height * 0.5) * transfer_rate)), s_sand[s]);
+                    s_amount[s] = move_amount;
+                    s_target[s] = target;
+
+                    bool interior = t.x >= HALO && t.x < HALO + TILE && t.y >= HALO && t.y < HALO + TILE;
+                    if (interior) {
+                        my_moved += move_amount;
+                        my_max_excess = max(my_max_excess, excess_height);
+                    }
+                }
+            }
+        }
+        barrier();
+
+        // 3. Gather: cada celda pierde su salida y recoge lo que le envían
+        int c = 0;
+        for (int s = lid; s < S * S; s += THREADS, ++c) {
+            ivec2 t = ivec2(s % S, s / S);
+            uint v = s_sand[s] - s_amount[s];
+            for (int k = 0; k < 8; ++k) {
+                ivec2 n = t + VECINOS[k];
+                if (!inTile(n)) continue;
+                int sn = n.y * S + n.x;
+                if (s_target[sn] == 7 - k) v += s_amount[sn];
+            }
+            new_sand[c] = v;
+        }
+        barrier();
+
+        c = 0;
+        for (int s = lid; s < S * S; s += THREADS, ++c) {
+            s_sand[s] = new_sand[c];
+        }
+        barrier();
+    }
+
+    // 4. Escribir solo el interior (el halo ya no es válido)
+    ivec2 t = ivec2(gl_LocalInvocationID.xy) + HALO;
+    ivec2 g = origin + t;
+    if (g.x < N && g.y < N) {
+        storeSandOut(g.y * N + g.x, s_sand[t.y * S + t.x]);
+    }
+
+    if (count_moved && my_moved > 0u) {
+        atomicAdd(moved_slabs, my_moved);
+        atomicMax(max_excess_bits, floatBitsToUint(my_max_excess));
+    }
+}
@@ -2,29 +2,17 @@
 
 layout(local_size_x = 32, local_size_y = 32) in;
 
-// Terreno base
-layout(std430, binding = 0) buffer BedrockSlabs { uint bedrock_slabs[]; };
-
-layout(std430, binding = 1) buffer SandSlabs { uint sand_slabs[]; };
-
-// Campo de viento base (A) y campo de viento proyectado (W) si lo necesitas
-layout(std430, binding = 2) buffer WindHeightField { vec2 wind_height_field[]; }; // A(p) precargado o generado 
-
-layout(std430, binding = 3) buffer WindField { vec2 wind_field[]; }; // W(p), si lo calculas en otra pasada
-
-layout(std430, binding = 4) buffer WindShadowing { float wind_shadowing[]; };
-
-// Sticky y erosion masks (separadas)
-layout(std430, binding = 5) buffer StickyMask { float sticky_mask[]; }; // [0,1], kb incluido 
-
-layout(std430, binding = 6) buffer ErosionMask { float erosion_mask[]; }; // [0,1]
-
-layout(std430, binding = 7) buffer Obstacles { uint obstacles[]; };
+// Buffers de estado y sus accesos (layout completo o compacto)
+#include "cell_state.glsl"
 
 uniform int sand_transport_block_count;
 uniform int N;                // tamaño de la grilla (N x N)
 uniform int R_s; // límite de pasos al retroceder (p.ej. 10)
 uniform float cell_size_m;   // tamaño de celda en metros (p.ej. 1.0)
+uniform ivec2 origin;        // coordenada global (x, y) de la celda 0 si la grilla es una ventana
+
+// Despacho completo o solo los tiles activos
+#include "sparse_tiles.glsl"
 
 
 struct Cell
@@ -41,13 +29,13 @@ struct Cell
 Cell makeCell(int idx) 
 {
     Cell c;
-    c.bedrock = bedrock_slabs[idx];
-    c.sand = sand_slabs[idx];
-    c.obstacle = obstacles[idx];
-    c.sticky = sticky_mask[idx];
-    c.erosion = erosion_mask[idx];
-    c.wind = wind_field[idx];
-    c.wind_shadow = wind_shadowing[idx];
+    c.bedrock = bedrockAt(idx);
+    c.sand = sandAt(idx);
+    c.obstacle = obstacleAt(idx) ? 1u : 0u;
+    c.sticky = stickyAt(idx);
+    c.erosion = erosionAt(idx);
+    c.wind = windAt(idx);
+    c.wind_shadow = shadowAt(idx);
     return c;
 }
 
@@ -63,12 +51,19 @@ int idx(int x, int y) {
 
 // Altura total
 float H(int x, int y) {
-    return float(sand_slabs[idx(x,y)]) + float(bedrock_slabs[idx(x,y)]);
+    return heightAt(idx(x,y));
+}
+
+// Actividad: la arena salió de `from` y quedó en `to`
+void markTransport(int from, int to, uint amount) {
+    if (amount == 0u || from == to) return;
+    markMoved(from);
+    markMoved(to);
 }
 
 void main()
 {
-    ivec2 p = ivec2(gl_GlobalInvocationID.xy);
+    ivec2 p = cellXY();
     if (p.x >= N || p.y >= N) return;
 
     const int px = p.x;
@@ -76,7 +71,7 @@ void main()
     const int id_pos = idx(px, py);
     Cell C_p = makeCell(id_pos);
 
-    if (C_p.obstacle > uint(0) || rand(vec2(p)) < C_p.sticky || rand(vec2(p)) < C_p.wind_shadow)
+    if (C_p.obstacle > uint(0) || rand(vec2(p + origin)) < C_p.sticky || rand(vec2(p + origin)) < C_p.wind_shadow)
         return;
 
     uint transported_sand = uint(sand_transport_block_count);
@@ -88,7 +83,7 @@ void main()
     vec2 stepVec = normalize(C_p.wind)*cell_size_m;
     bool deposited = false;
     C_p.sand -= transported_sand;
-    atomicAdd(sand_slabs[id_pos], uint(-int(transported_sand)));
+    atomicAdd(SAND_WORD(id_pos), uint(-int(transported_sand)));
     ivec2 q = p;
     int count = 0;
 
@@ -101,19 +96,21 @@ void main()
             q = ivec2(clamp(q.x - int(round(stepVec.x)), 0, N-1), clamp(q.y - int(round(stepVec.y)), 0, N-1));
             C_q = makeCell(idx(q.x, q.y));
             C_q.sand += transported_sand;
-            atomicAdd(sand_slabs[idx(q.x, q.y)], uint(transported_sand));
+            addSand(idx(q.x, q.y), uint(transported_sand));
+            markTransport(id_pos, idx(q.x, q.y), transported_sand);
             return;
         }
-        if (rand(vec2(q)) < C_q.sticky || rand(vec2(q)) < C_q.wind_shadow)
+        if (rand(vec2(q + origin)) < C_q.sticky || rand(vec2(q + origin)) < C_q.wind_shadow)
         {
             deposited = true;
             C_q.sand += transported_sand;
-            atomicAdd(sand_slabs[idx(q.x, q.y)], uint(transported_sand));
+            addSand(idx(q.x, q.y), uint(transported_sand));
+            markTransport(id_pos, idx(q.x, q.y), transported_sand);
             return;
         }
         count++;
     }
 
     C_p.sand += transported_sand;
-    atomicAdd(sand_slabs[id_pos], uint(transported_sand));
+    addSand(id_pos, uint(transported_sand));
 }
\ No newline at end of file
@@ -0,0 +1,56 @@
+#version 430
+
+layout(local_size_x = 64) in;
+
+// Plan del despacho disperso (ver sparse_tiles.glsl): un hilo por tile. Un
+// tile se procesa si hubo movimiento a `radius` tiles o menos en el paso
+// anterior; los que se procesan se agregan a active_tiles y cuentan en el
+// comando de glDispatchComputeIndirect.
+//
+// El pase 1 (un solo hilo, después del 0) revisa si entraron todos los tiles:
+// en ese caso deja el comando con el grid completo y marca el plan como denso.
+
+layout(std430, binding = 17) readonly buffer TileActivity { uint tile_activity[]; };
+layout(std430, binding = 18) writeonly buffer ActiveTiles { uint active_tiles[]; };
+// Comando de glDispatchComputeIndirect y marca de plan denso: el host lo deja en (0, 1, 1, 0)
+layout(std430, binding = 19) buffer DispatchCommand
+{
+    uint num_groups_x;
+    uint num_groups_y;
+    uint num_groups_z;
+    uint dense;
+};
+layout(std430, binding = 20) writeonly buffer TileDispatched { uint tile_dispatched[]; };
+
+uniform int tiles_per_side;
+uniform int radius;
+uniform int pass;
+
+void main() {
+    if (pass == 1) {
+        if (gl_GlobalInvocationID.x == 0u && num_groups_x == uint(tiles_per_side * tiles_per_side)) {
+            num_groups_x = uint(tiles_per_side);
+            num_groups_y = uint(tiles_per_side);
+            dense = 1u;
+        }
+        return;
+    }
+
+    int t = int(gl_GlobalInvocationID.x);
+    if (t >= tiles_per_side * tiles_per_side) return;
+
+    int tx = t % tiles_per_side;
+    int ty = t / tiles_per_side;
+    bool activo = false;
+    for (int y = max(ty - radius, 0); y <= min(ty + radius, tiles_per_side - 1) && !activo; ++y) {
+        for (int x = max(tx - radius, 0); x <= min(tx + radius, tiles_per_side - 1); ++x) {
+            if (tile_activity[y * tiles_per_side + x] != 0u) {
+                activo = true;
+                break;
+            }
+        }
+    }
+
+    tile_dispatched[t] = activo ? 1u : 0u;
+    if (activo) active_tiles[atomicAdd(num_groups_x, 1u)] = uint(t);
+}
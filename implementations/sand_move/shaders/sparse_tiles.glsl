@@ -0,0 +1,73 @@
+// Despacho disperso por tiles (#define SPARSE_TILES, ver sparse_engine.py).
+//
+// Con SPARSE_TILES las etapas se lanzan con glDispatchComputeIndirect: un work
+// group por tile activo, con el id del tile (fila * tiles_per_side + columna)
+// en active_tiles según lo dejó sparse_plan_compute.glsl. El tile mide lo
+// mismo que el work group (32 x 32). El transporte y la cascada marcan en
+// tile_activity los tiles donde la arena sale o llega, que son los que se
+// procesan (con sus vecinos) en el paso siguiente.
+//
+// Si el plan cubre todos los tiles, sparse_plan_compute.glsl deja en `dense`
+// un 1 y el comando indirecto con el grid completo (tiles_per_side x
+// tiles_per_side): las celdas salen de gl_GlobalInvocationID como sin tiles,
+// sin pasar por active_tiles ni tile_dispatched, y solo se siguen marcando.
+//
+// Sin el define, cellXY() es gl_GlobalInvocationID y markMoved() no hace nada,
+// así que los shaders usan estas funciones en los dos modos.
+//
+// Incluir después de `uniform int N;`.
+
+#ifdef SPARSE_TILES
+
+layout(std430, binding = 17) buffer TileActivity { uint tile_activity[]; };
+layout(std430, binding = 18) readonly buffer ActiveTiles { uint active_tiles[]; };
+// 1 si el tile se procesa en este paso (las celdas de los demás no se mueven)
+layout(std430, binding = 20) readonly buffer TileDispatched { uint tile_dispatched[]; };
+// Comando de glDispatchComputeIndirect del paso y si el plan es denso
+layout(std430, binding = 19) readonly buffer DispatchCommand
+{
+    uint num_groups_x;
+    uint num_groups_y;
+    uint num_groups_z;
+    uint dense;
+};
+
+uniform int tiles_per_side;
+
+int tileOf(int x, int y) {
+    return (y / int(gl_WorkGroupSize.y)) * tiles_per_side + x / int(gl_WorkGroupSize.x);
+}
+
+// Celda (x = columna, y = fila) de esta invocación
+ivec2 cellXY() {
+    if (dense != 0u) return ivec2(gl_GlobalInvocationID.xy);
+    int t = int(active_tiles[gl_WorkGroupID.x]);
+    ivec2 tile = ivec2(t % tiles_per_side, t / tiles_per_side);
+    return tile * ivec2(gl_WorkGroupSize.xy) + ivec2(gl_LocalInvocationID.xy);
+}
+
+// Marca el tile de la celda de índice plano y*N + x. Todas las escrituras
+// ponen 1, así que la carrera entre invocaciones no importa.
+void markMoved(int i) {
+    tile_activity[tileOf(i % N, i / N)] = 1u;
+}
+
+bool cellDispatched(int x, int y) {
+    return dense != 0u || tile_dispatched[tileOf(x, y)] != 0u;
+}
+
+// Celda en el marco de las etapas de viento (índice x*N + y, x = fila)
+ivec2 cellRowCol() {
+    if (dense != 0u) return ivec2(gl_GlobalInvocationID.xy);
+    return cellXY().yx;
+}
+
+#else
+
+ivec2 cellXY() { return ivec2(gl_GlobalInvocationID.xy); }
+void markMoved(int i) {}
+bool cellDispatched(int x, int y) { return true; }
+// Mismo recorrido que sin tiles: la x del work group es la fila
+ivec2 cellRowCol() { return ivec2(gl_GlobalInvocationID.xy); }
+
+#endif
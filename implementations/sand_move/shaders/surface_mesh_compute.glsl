@@ -0,0 +1,112 @@
+#version 430
+
+layout(local_size_x = 32, local_size_y = 32) in;
+
+// Genera la malla visible del heightfield: caras superiores (fusionadas en
+// tramos a lo largo de j) y solo las paredes laterales expuestas. Cada quad se
+// guarda comprimido y el vertex shader lo expande con gl_VertexID.
+
+layout(std430, binding = 0) buffer BedrockSlabs { uint bedrock_slabs[]; };
+layout(std430, binding = 1) buffer SandSlabs { uint sand_slabs[]; };
+layout(std430, binding = 7) buffer Obstacles { uint obstacles[]; };
+
+// quad = (celda i*N + j, cara | material << 4 | largo << 8, bits(y0), bits(y1))
+layout(std430, binding = 8) buffer SurfaceQuads { uvec4 quads[]; };
+
+// Comando de glDrawArraysIndirect: count avanza 6 vértices por quad
+layout(std430, binding = 9) buffer DrawCommand
+{
+    uint vertex_count;
+    uint instance_count;
+    uint first_vertex;
+    uint base_instance;
+};
+
+uniform int N;
+uniform int topheight;
+uniform int max_quads;
+
+// --- CONSTANTES ---
+const uint FACE_TOP = 0u;
+const uint FACE_POS_X = 1u;
+const uint FACE_NEG_X = 2u;
+const uint FACE_POS_Z = 3u;
+const uint FACE_NEG_Z = 4u;
+
+const uint MAT_BEDROCK = 0u;
+const uint MAT_SAND = 1u;
+const uint MAT_OBSTACLE = 2u;
+
+const int MAX_RUN = 256;
+
+// Mismo índice que el buffer de posiciones: (i - N/2, j - N/2)
+int idx(int i, int j) {
+    return i * N + j;
+}
+
+// Altura de la cara superior, como la dibuja terrain_vs
+float topHeight(int i, int j) {
+    int k = idx(i, j);
+    float b = float(bedrock_slabs[k]);
+    if (obstacles[k] > 0u) return max(float(topheight), b);
+    return b + float(sand_slabs[k]);
+}
+
+uint topMaterial(int i, int j) {
+    int k = idx(i, j);
+    if (obstacles[k] > 0u) return MAT_OBSTACLE;
+    if (sand_slabs[k] != 0u) return MAT_SAND;
+    return MAT_BEDROCK;
+}
+
+void emit(int cell, uint face, uint material, uint run, float y0, float y1) {
+    // max_quads se dimensiona con la cota 5N² + 8N (una cara superior por celda
+    // y a lo sumo dos paredes por borde entre celdas), así que nunca se llena
+    uint slot = atomicAdd(vertex_count, 6u) / 6u;
+    if (slot >= uint(max_quads)) return;
+    quads[slot] = uvec4(uint(cell), face | (material << 4) | (run << 8), floatBitsToUint(y0), floatBitsToUint(y1));
+}
+
+// Pared entre la altura del vecino y la propia, partida en el nivel del bedrock
+void emitWall(int cell, uint face, float h, float h_n, float bedrock, uint material) {
+    if (h_n >= h) return;
+    if (material == MAT_OBSTACLE) {
+        emit(cell, face, material, 1u, h_n, h);
+        return;
+    }
+    if (h_n < bedrock) emit(cell, face, MAT_BEDROCK, 1u, h_n, min(h, bedrock));
+    if (h > bedrock) emit(cell, face, MAT_SAND, 1u, max(h_n, bedrock), h);
+}
+
+void main() {
+    int j = int(gl_GlobalInvocationID.x);
+    int i = int(gl_GlobalInvocationID.y);
+    if (i >= N || j >= N) return;
+
+    int cell = idx(i, j);
+    float h = topHeight(i, j);
+    uint material = topMaterial(i, j);
+
+    // 1. Cara superior: solo la primera celda de un tramo igual la emite. Los
+    // tramos se cortan en múltiplos de MAX_RUN para que la celda siguiente a un
+    // tramo cortado también empiece uno.
+    bool starts_run = (j % MAX_RUN == 0) || topHeight(i, j - 1) != h || topMaterial(i, j - 1) != material;
+    if (starts_run) {
+        int run = 1;
+        while (j + run < N && (j + run) % MAX_RUN != 0 && topHeight(i, j + run) == h && topMaterial(i, j + run) == material)
+            run++;
+        emit(cell, FACE_TOP, material, uint(run), h, h);
+    }
+
+    // 2. Paredes: solo donde el vecino es más bajo (fuera del mapa cuenta como 0)
+    float bedrock = float(bedrock_slabs[cell]);
+    if (material == MAT_OBSTACLE) bedrock = 0.0;
+    float h_px = (i + 1 < N) ? topHeight(i + 1, j) : 0.0;
+    float h_nx = (i - 1 >= 0) ? topHeight(i - 1, j) : 0.0;
+    float h_pz = (j + 1 < N) ? topHeight(i, j + 1) : 0.0;
+    float h_nz = (j - 1 >= 0) ? topHeight(i, j - 1) : 0.0;
+    emitWall(cell, FACE_POS_X, h, h_px, bedrock, material);
+    emitWall(cell, FACE_NEG_X, h, h_nx, bedrock, material);
+    emitWall(cell, FACE_POS_Z, h, h_pz, bedrock, material);
+    emitWall(cell, FACE_NEG_Z, h, h_nz, bedrock, material);
+}
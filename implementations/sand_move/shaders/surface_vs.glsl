@@ -0,0 +1,67 @@
+#version 430
+
+// Expande los quads generados por surface_mesh_compute.glsl (6 vértices por quad,
+// sin VBO: todo sale de gl_VertexID).
+
+layout(std430, binding = 8) buffer SurfaceQuads { uvec4 quads[]; };
+
+uniform mat4 model;
+uniform mat4 view;
+uniform mat4 projection;
+uniform int N;
+
+out vec3 fragColor;
+out vec3 vNormal;
+out vec3 FragPos;
+
+const vec2 CORNERS[6] = vec2[](
+    vec2(0.0, 0.0), vec2(1.0, 0.0), vec2(1.0, 1.0),
+    vec2(1.0, 1.0), vec2(0.0, 1.0), vec2(0.0, 0.0)
+);
+
+const vec3 COLORS[3] = vec3[](
+    vec3(0.77, 0.70, 0.56),  // bedrock
+    vec3(0.94, 0.87, 0.73),  // arena
+    vec3(0.60, 0.53, 0.39)   // obstáculo
+);
+
+void main()
+{
+    uvec4 q = quads[gl_VertexID / 6];
+    vec2 c = CORNERS[gl_VertexID % 6];
+
+    int cell = int(q.x);
+    uint face = q.y & 15u;
+    uint material = (q.y >> 4) & 15u;
+    float run = float(q.y >> 8);
+    float y0 = uintBitsToFloat(q.z);
+    float y1 = uintBitsToFloat(q.w);
+
+    // Centro de la columna, igual que globPosition en el render con cubos
+    float gx = float(cell / N) - float(N) * 0.5;
+    float gz = float(cell % N) - float(N) * 0.5;
+
+    vec3 pos;
+    vec3 normal;
+    if (face == 0u) {
+        pos = vec3(gx - 0.5 + c.x, y1, gz - 0.5 + c.y * run);
+        normal = vec3(0.0, 1.0, 0.0);
+    } else if (face == 1u) {
+        pos = vec3(gx + 0.5, mix(y0, y1, c.y), gz - 0.5 + c.x);
+        normal = vec3(1.0, 0.0, 0.0);
+    } else if (face == 2u) {
+        pos = vec3(gx - 0.5, mix(y0, y1, c.y), gz - 0.5 + c.x);
+        normal = vec3(-1.0, 0.0, 0.0);
+    } else if (face == 3u) {
+        pos = vec3(gx - 0.5 + c.x, mix(y0, y1, c.y), gz + 0.5);
+        normal = vec3(0.0, 0.0, 1.0);
+    } else {
+        pos = vec3(gx - 0.5 + c.x, mix(y0, y1, c.y), gz - 0.5);
+        normal = vec3(0.0, 0.0, -1.0);
+    }
+
+    FragPos = vec3(model * vec4(pos, 1.0));
+    fragColor = COLORS[material];
+    vNormal = normal;
+    gl_Position = projection * view * model * vec4(pos, 1.0);
+}
@@ -1,8 +1,10 @@
-#version 330
+#version 430
 
-in vec3 fragColor;
 in vec3 FragPos;
 in vec3 vNormal;
+in float height;
+flat in float bedrockHeight;
+flat in uint material;
 
 out vec4 outColor;
 
@@ -10,8 +12,19 @@ uniform vec3 lightDir;   // dirección del sol
 uniform vec3 camPos;
 uniform vec3 lightColor;
 
+const vec3 BEDROCK_COLOR = vec3(0.77, 0.70, 0.56);
+const vec3 SAND_COLOR = vec3(0.94, 0.87, 0.73);
+const vec3 OBSTACLE_COLOR = vec3(0.60, 0.53, 0.39);
+
 void main()
 {
+    // Bajo el nivel del bedrock la columna es roca; sobre él, arena u obstáculo
+    vec3 fragColor = BEDROCK_COLOR;
+    if (height > bedrockHeight + 1e-3) {
+        if (material == 2u) fragColor = OBSTACLE_COLOR;
+        else if (material == 1u) fragColor = SAND_COLOR;
+    }
+
     float ambientStrength = 0.2;
     vec3 ambient = ambientStrength * lightColor;
 
@@ -28,4 +41,4 @@ void main()
 
     vec3 result = (ambient + diffuse + specular) * fragColor;
     outColor = vec4(result, 1.0);
-}
\ No newline at end of file
+}
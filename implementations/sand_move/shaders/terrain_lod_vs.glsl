@@ -0,0 +1,83 @@
+#version 430
+layout(location = 0) in vec3 position;
+layout(location = 1) in vec3 normal;
+
+// Cada chunk visible se dibuja como chunk_size x chunk_size columnas; en los
+// chunks lejanos cada columna cubre step x step celdas y toma su altura de la
+// pirámide de máximos (nivel log2(step)).
+// item = (i0, j0, step, nivel)
+layout(std430, binding = 0) buffer BedrockSlabs { uint bedrock_slabs[]; };
+layout(std430, binding = 1) buffer SandSlabs { uint sand_slabs[]; };
+layout(std430, binding = 7) buffer Obstacles { uint obstacles[]; };
+layout(std430, binding = 10) buffer HeightPyramid { vec2 pyramid[]; };
+layout(std430, binding = 11) buffer LodItems { uvec4 items[]; };
+
+uniform mat4 model;
+uniform mat4 view;
+uniform mat4 projection;
+uniform int topheight;
+uniform int N;
+uniform int chunk_size;
+
+out vec3 vNormal;
+out vec3 FragPos;
+out float height;
+flat out float bedrockHeight;
+flat out uint material;
+
+int levelOffset(int l) {
+    int offset = 0;
+    for (int k = 1; k < l; ++k) {
+        int n = N >> k;
+        offset += n * n;
+    }
+    return offset;
+}
+
+void main()
+{
+    int per_item = chunk_size * chunk_size;
+    uvec4 item = items[gl_InstanceID / per_item];
+    int local = gl_InstanceID % per_item;
+    int step = int(item.z);
+    int lvl = int(item.w);
+    int i = int(item.x) + (local / chunk_size) * step;
+    int j = int(item.y) + (local % chunk_size) * step;
+
+    float top;
+    float b;
+    if (lvl == 0) {
+        int k = i * N + j;
+        b = float(bedrock_slabs[k]);
+        if (obstacles[k] != 0u) {
+            top = max(float(topheight), b);
+            material = 2u;
+        } else {
+            top = b + float(sand_slabs[k]);
+            material = (sand_slabs[k] != 0u) ? 1u : 0u;
+        }
+    } else {
+        int n = N >> lvl;
+        vec2 c = pyramid[levelOffset(lvl) + (i >> lvl) * n + (j >> lvl)];
+        top = c.x;
+        if (c.y < 0.0) {
+            b = -c.y - 1.0;
+            material = 2u;
+        } else {
+            b = c.y;
+            material = (top > b) ? 1u : 0u;
+        }
+    }
+
+    // Esquina de la columna en coordenadas de mundo, como globPosition - 0.5
+    vec2 corner = vec2(float(i), float(j)) - float(N) * 0.5 - 0.5;
+    vec3 pos = vec3(corner.x + (position.x + 0.5) * float(step),
+                    (position.y > 0.0) ? top : 0.0,
+                    corner.y + (position.z + 0.5) * float(step));
+
+    height = pos.y;
+    bedrockHeight = b;
+    FragPos = vec3(model * vec4(pos, 1.0));
+    vNormal = normal;
+    gl_Position = projection * view * model * vec4(pos, 1.0f);
+}
@@ -0,0 +1,43 @@
+#version 430
+layout(location = 0) in vec3 position;
+layout(location = 1) in vec3 normal;
+layout(location = 2) in vec2 globPosition;
+layout(location = 3) in uint sand_slabs;
+layout(location = 4) in uint bedrock_slabs;
+layout(location = 5) in uint obstacles;
+
+uniform mat4 model;
+uniform mat4 view;
+uniform mat4 projection;
+uniform int topheight;
+
+out vec3 vNormal;
+out vec3 FragPos;
+out float height;
+flat out float bedrockHeight;
+flat out uint material;
+
+// Una sola columna por celda, de 0 hasta la cima (arena + bedrock, o topheight
+// si es obstáculo). El fragment shader decide el color según la altura, así
+// que arena, bedrock y obstáculos salen en un único draw instanciado.
+void main()
+{
+    vec3 pos = position + vec3(globPosition.x, 0.5, globPosition.y);
+
+    float b = float(bedrock_slabs);
+    float top;
+    if (obstacles != uint(0)) {
+        top = max(float(topheight), b);
+        material = 2u;
+    } else {
+        top = b + float(sand_slabs);
+        material = (sand_slabs != uint(0)) ? 1u : 0u;
+    }
+    pos.y = (pos.y > 0.0) ? top : 0.0;
+
+    height = pos.y;
+    bedrockHeight = b;
+    FragPos = vec3(model * vec4(pos, 1.0));
+    vNormal = normal;
+    gl_Position = projection * view * model * vec4(pos, 1.0f);
+}
@@ -0,0 +1,184 @@
+#version 430
+
+layout(local_size_x = 32, local_size_y = 32) in;  // 32*32 hilos por work group
+
+// Pase fusionado de análisis contra el viento: reemplaza a
+// wind_heightfield_compute + wind_update_compute + sticky_mask_generation en un
+// solo dispatch. Cada hilo calcula A(p) y W(p) una vez (F_50 y F_200 con los
+// gradientes de H_50 y H_200, de height_smooth_compute.glsl) y hace una única
+// marcha de R_s pasos que alimenta a la vez el factor de sombra y la búsqueda
+// de cliff de las máscaras.
+//
+// Escribe los mismos buffers que los tres shaders originales, con los mismos
+// índices: el viento y la sombra usan x*N + y, y las máscaras y*N + x. Por eso
+// la celda de máscaras que comparte el índice plano con (x, y) es (y, x), y la
+// marcha de las máscaras muestrea la línea transpuesta a la de la sombra.
+
+// Buffers de estado y sus accesos (layout completo o compacto)
+#include "cell_state.glsl"
+
+uniform int N;
+uniform int R_s;
+uniform ivec2 origin;   // coordenada global (px, py) de la celda 0 si la grilla es una ventana
+
+// Despacho completo o solo los tiles activos
+#include "sparse_tiles.glsl"
+
+// wind_update_compute.glsl
+uniform float k_W = 0.005;
+uniform float k_H_50 = 5.0;
+uniform float k_H_200 = 30.0;
+uniform float theta_min = radians(10.0);
+uniform float theta_max = radians(15.0);
+// Con shadow_mode "sweep" la sombra sale de wind_shadow_sweep_compute.glsl: la
+// marcha solo busca la cliff y la sombra de la celda queda como estaba
+uniform bool compute_shadow = true;
+
+// sticky_mask_generation.glsl
+uniform float cell_size_m;
+uniform float h_max;
+uniform float kb;
+uniform float slope_deg_thresh;
+
+// Marco del viento: índice x*N + y
+float Hw(int x, int y)
+{
+    return heightAt(x*N + y);
+}
+
+// Marco de las máscaras: índice y*N + x
+float Hs(int x, int y)
+{
+    return heightAt(y*N + x);
+}
+
+// Gradiente de H_50 (c = 0) o H_200 (c = 1) en el marco del viento, bordes clampeados
+vec2 gradSmoothed(int x, int y, int c)
+{
+    int xm1 = max(x-1, 0);
+    int xp1 = min(x+1, N-1);
+    int ym1 = max(y-1, 0);
+    int yp1 = min(y+1, N-1);
+    return vec2((smoothedAt(xp1*N + y)[c] - smoothedAt(xm1*N + y)[c]) * 0.5,
+                (smoothedAt(x*N + yp1)[c] - smoothedAt(x*N + ym1)[c]) * 0.5);
+}
+
+bool isCliff(float h0, float h1, float horiz_dist)
+{
+    return degrees(atan((h0 - h1) / max(horiz_dist, 1e-6))) > slope_deg_thresh;
+}
+
+void main()
+{
+    ivec2 cell = cellRowCol();
+    int px = cell.x;
+    int py = cell.y;
+    if (px >= N || py >= N) return;
+
+    int k = px*N + py;
+    float Hp = heightAt(k);
+
+    // 1. A(p): campo base
+    float alpha_A = atan(float(py + origin.y), float(px + origin.x) + 0.01);
+    vec2 A = log(max(Hp, 1.0))*vec2(cos(alpha_A), sin(alpha_A));
+    storeWindHeightField(k, A);
+
+    // 2. W(p) = 0.2 * (F_50 o V) + 0.8 * (F_200 o V), cada F con el gradiente de su escala
+    vec2 g50 = gradSmoothed(px, py, 0);
+    vec2 g200 = gradSmoothed(px, py, 1);
+    float a50 = length(g50);
+    float a200 = length(g200);
+    vec2 V = A * (1 + k_W * Hp);
+    vec2 W = 0.2 * ((1.0 - a50) * V + a50 * k_H_50 * vec2(-g50.y, g50.x))
+           + 0.8 * ((1.0 - a200) * V + a200 * k_H_200 * vec2(-g200.y, g200.x));
+    storeWind(k, W);
+
+    // 3. Marcha contra el viento compartida
+    // Sombra: mayor diferencia de altura en R_s pasos (marco del viento)
+    vec2 upwind_w = -normalize(W);
+    float maxDiff = -1e9;
+    ivec2 q = ivec2(px, py);
+
+    // Máscaras: primera celda cliff contra el viento (marco de las máscaras)
+    int sx = py;
+    int sy = px;
+    float windLen = length(W);
+    bool searching = windLen >= 1e-6;
+    vec2 upwind_s = searching ? -W / windLen : vec2(0.0);
+    bool found_cliff = false;
+    int cliff_x = sx;
+    int cliff_y = sy;
+    float H_cliff = Hp;
+    int cx = sx;
+    int cy = sy;
+    float Hc = Hp;
+
+    for (int step = 1; step <= max(R_s, 1); ++step) {
+        if (!compute_shadow && !searching) break;
+        if (compute_shadow && step <= R_s) {
+            int qx = clamp(px + int(round(upwind_w.x * step)), 0, N-1);
+            int qy = clamp(py + int(round(upwind_w.y * step)), 0, N-1);
+
+            float diff = Hw(qx, qy) - Hp;
+            if (diff > maxDiff) {
+                maxDiff = diff;
+                q = ivec2(qx, qy);
+            }
+        }
+
+        if (searching) {
+            int nx = clamp(sx + int(round(upwind_s.x * step)), 0, N-1);
+            int ny = clamp(sy + int(round(upwind_s.y * step)), 0, N-1);
+            float Hn = Hs(nx, ny);
+
+            if (isCliff(Hc, Hn, length(vec2(nx - cx, ny - cy)) * cell_size_m)) {
+                found_cliff = true;
+                searching = false;
+                // En el primer paso el dropoff es el de la propia celda: ella es la cliff
+                if (step > 1) {
+                    cliff_x = nx;
+                    cliff_y = ny;
+                    H_cliff = Hn;
+                }
+            } else if (step > R_s) {
+                searching = false;
+            } else {
+                cx = nx;
+                cy = ny;
+                Hc = Hn;
+            }
+        }
+    }
+
+    // 4. Factor de sombra
+    float dist = length(vec2(q.x - px, q.y - py));
+    float alpha = atan(maxDiff / max(dist, 1e-6));
+    float shadow = compute_shadow ? clamp((alpha - theta_min) / (theta_max - theta_min), 0.0, 1.0) : shadowAt(k);
+
+    // 5. Máscaras sticky/erosión según la distancia a la cliff
+    float sticky_val = kb;
+    float erosion_val = 0.0;
+    if (found_cliff) {
+        int nx = clamp(cliff_x + int(round(upwind_s.x)), 0, N-1);
+        int ny = clamp(cliff_y + int(round(upwind_s.y)), 0, N-1);
+        float h_o = min(max(H_cliff - Hs(nx, ny), 0.0), h_max);
+
+        float d_min_sticky = 0.4 * h_o;
+        float d_max_sticky = 2.0 * h_o;
+
+        if (d_max_sticky > 1e-6) {
+            float d_from_cliff = length(vec2(sx - cliff_x, sy - cliff_y)) * cell_size_m;
+            if (d_from_cliff <= d_min_sticky) {
+                erosion_val = 1.0;
+            } else if (d_from_cliff <= d_max_sticky) {
+                float t = (d_from_cliff - d_min_sticky) / max(d_max_sticky - d_min_sticky, 1e-6);
+                sticky_val = kb + (1.0 - t) * (1.0 - kb);
+            }
+            sticky_val = clamp(sticky_val, 0.0, 1.0);
+            erosion_val = clamp(erosion_val, 0.0, 1.0);
+        }
+    }
+
+    // sticky/erosion de la celda de máscaras (sx, sy), índice sy*N + sx == k
+    storeMasks(k, sticky_val, erosion_val, shadow);
+}
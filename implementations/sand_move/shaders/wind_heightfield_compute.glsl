@@ -18,6 +18,7 @@ layout(std430, binding = 2) buffer WindHeightField
 };
 
 uniform int N;
+uniform ivec2 origin;   // coordenada global (px, py) de la celda 0 si la grilla es una ventana
 
 // total height
 float H(int x, int y)
@@ -37,7 +38,7 @@ void main()
     ///////////////////
     float Hp = max(H(px, py), 1.0);
 
-    float alpha = atan(float(py), float(px) + 0.01);
+    float alpha = atan(float(py + origin.y), float(px + origin.x) + 0.01);
     wind_height_field[px*N + py] = log(Hp)*vec2(cos(alpha), sin(alpha));
     ///////////////////
     
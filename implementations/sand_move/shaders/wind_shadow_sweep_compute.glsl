@@ -0,0 +1,131 @@
+#version 430
+
+layout(local_size_x = 64) in;
+
+// Sombra de viento por barridos de horizonte (shadow_mode "sweep", ver
+// cpu_engine.horizontes y cpu_engine.sombra_barrido). Reemplaza la sombra de la
+// marcha de R_s pasos: el factor sale del mayor ángulo de elevación hacia
+// cualquier celda contra el viento, sin límite de distancia, en O(N^2) por
+// dirección.
+//
+// La dirección contra el viento de cada celda se interpola entre las dos de
+// DIRECCIONES que la rodean. Pases:
+//   pass 0 (por celda, grid (N/64, N)): pone en cero la suma de la celda y
+//           habilita en sweep_commands las direcciones que usa (las demás no
+//           se barren).
+//   pass 1 (por línea, con glDispatchComputeIndirect desde el comando de
+//           `direction`): recorre la línea desde su extremo contra el viento
+//           con la envolvente convexa superior de las celdas vistas en una
+//           pila, y suma peso * factor en las celdas que usan la dirección.
+//   pass 2 (por celda, grid (N/64, N)): guarda la suma como sombra.
+// Índices del marco del viento (x*N + y), como wind_update_compute.glsl.
+
+#include "cell_state.glsl"
+
+layout(std430, binding = 23) buffer ShadowSweep { float shadow_sweep[]; };
+// Pila de cada línea, guardada sobre las celdas de la propia línea (posición j
+// de la pila en la celda j de la línea): cabe justo y no se pisa con otras
+layout(std430, binding = 24) buffer HorizonStack { int horizon_stack[]; };
+// Un comando (num_groups_x, 1, 1) por dirección; el host los deja en (0, 1, 1)
+layout(std430, binding = 25) buffer SweepCommands { uint sweep_commands[]; };
+
+uniform int N;
+uniform int pass;
+uniform int direction;
+uniform float theta_min = radians(10.0);
+uniform float theta_max = radians(15.0);
+
+const float PI = 3.14159265358979;
+const ivec2 DIRECCIONES[8] = ivec2[8](ivec2(1, 0), ivec2(1, 1), ivec2(0, 1), ivec2(-1, 1),
+                                      ivec2(-1, 0), ivec2(-1, -1), ivec2(0, -1), ivec2(1, -1));
+
+// Líneas de la dirección k: N en los ejes, 2N - 1 en las diagonales
+int lineas(int k) { return (k % 2 == 0) ? N : 2 * N - 1; }
+
+// Peso de la dirección k para la celda i (0 si no la usa)
+float pesoDireccion(int i, int k)
+{
+    vec2 W = windAt(i);
+    if (length(W) < 1e-6) return 0.0;  // sin viento no hay sombra
+    float t = mod(atan(-W.y, -W.x) / (PI / 4.0), 8.0);
+    int k0 = int(floor(t)) % 8;
+    float f = t - floor(t);
+    if (k == k0) return 1.0 - f;
+    if (k == (k0 + 1) % 8) return f;
+    return 0.0;
+}
+
+// Primera celda (la más contra el viento) de la línea l de la dirección d
+ivec2 inicioLinea(int l, ivec2 d)
+{
+    int a0 = d.x > 0 ? N - 1 : 0;
+    int b0 = d.y > 0 ? N - 1 : 0;
+    if (d.y == 0) return ivec2(a0, l);
+    if (d.x == 0) return ivec2(l, b0);
+    // Diagonal: N líneas desde el borde a = a0 y N - 1 desde el borde b = b0 (sin la esquina)
+    if (l < N) return ivec2(a0, l);
+    return ivec2(d.x > 0 ? l - N : l - N + 1, b0);
+}
+
+bool dentro(ivec2 p) { return p.x >= 0 && p.x < N && p.y >= 0 && p.y < N; }
+int indice(ivec2 p) { return p.x * N + p.y; }
+
+void barrerLinea(int l)
+{
+    ivec2 d = DIRECCIONES[direction];
+    ivec2 p0 = inicioLinea(l, d);
+    float largo = length(vec2(d));
+    int tope = 0;
+    for (int t = 0; dentro(p0 - t * d); ++t) {
+        int i = indice(p0 - t * d);
+        float h = heightAt(i);
+
+        // Desapilar mientras el penúltimo se vea más alto que el último desde t.
+        // Productos cruzados de alturas enteras: exactos en double
+        while (tope >= 2) {
+            int t1 = horizon_stack[indice(p0 - (tope - 1) * d)];
+            int t2 = horizon_stack[indice(p0 - (tope - 2) * d)];
+            double h1 = double(heightAt(indice(p0 - t1 * d)));
+            double h2 = double(heightAt(indice(p0 - t2 * d)));
+            if ((h2 - double(h)) * double(t - t1) >= (h1 - double(h)) * double(t - t2))
+                --tope;
+            else
+                break;
+        }
+
+        float w = pesoDireccion(i, direction);
+        if (w > 0.0) {
+            float S = 0.0;
+            if (tope >= 1) {
+                int th = horizon_stack[indice(p0 - (tope - 1) * d)];
+                float alpha = atan((heightAt(indice(p0 - th * d)) - h) / (float(t - th) * largo));
+                S = clamp((alpha - theta_min) / (theta_max - theta_min), 0.0, 1.0);
+            }
+            // Las direcciones se barren en orden (0 a 7): la suma es reproducible
+            shadow_sweep[i] += w * S;
+        }
+
+        horizon_stack[indice(p0 - tope * d)] = t;
+        ++tope;
+    }
+}
+
+void main()
+{
+    ivec2 gid = ivec2(gl_GlobalInvocationID.xy);
+    if (pass == 1) {
+        if (gid.x < lineas(direction)) barrerLinea(gid.x);
+        return;
+    }
+    if (gid.x >= N) return;
+    int g = gid.y * N + gid.x;
+    if (pass == 0) {
+        shadow_sweep[g] = 0.0;
+        for (int k = 0; k < 8; ++k) {
+            if (pesoDireccion(g, k) > 0.0)
+                atomicMax(sweep_commands[3 * k], uint((lineas(k) + 63) / 64));
+        }
+    } else {
+        storeShadow(g, shadow_sweep[g]);
+    }
+}
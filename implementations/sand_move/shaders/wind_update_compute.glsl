@@ -27,11 +27,19 @@ layout(std430, binding = 4) buffer WindShadowing
     float wind_shadowing[];
 };
 
+// (H_50, H_200) de height_smooth_compute.glsl
+layout(std430, binding = 21) buffer SmoothedHeights
+{
+    vec2 smoothed_heights[];
+};
+
 uniform int N;
 uniform float k_W = 0.005;
 uniform float k_H_50 = 5.0;
 uniform float k_H_200 = 30.0;
 uniform int R_s;
+// Con shadow_mode "sweep" la sombra sale de wind_shadow_sweep_compute.glsl y la marcha se salta
+uniform bool compute_shadow = true;
 
 uniform float theta_min = radians(10.0);
 uniform float theta_max = radians(15.0);
@@ -39,7 +47,7 @@ uniform float theta_max = radians(15.0);
 // V(p) = A(p) * (1 + k_W*H(p))
 // W(p) = 0.2 * (F_50(p) o V(p)) + 0.8 * (F_200(p) o V(p))
 // F_i(p) o V(p) = (1 - a) * V(p) + a * k_H_i * grad(H_i_perp(p))
-// a = grad(H_i(p))
+// a = grad(H_i(p)), con H_i la altura suavizada en ventanas de i metros
 
 // total height
 float H(int x, int y)
@@ -59,7 +67,8 @@ vec2 V(int x, int y)
     return A(x, y) * (1 + k_W * H(x, y));
 }
 
-vec2 gradH(int x, int y) 
+// Gradiente de H_50 (c = 0) o H_200 (c = 1)
+vec2 gradH(int x, int y, int c) 
 {
     // manejo de bordes: clamp
     int xm1 = max(x-1, 0);
@@ -67,33 +76,33 @@ vec2 gradH(int x, int y)
     int ym1 = max(y-1, 0);
     int yp1 = min(y+1, N-1);
 
-    float dx = (H(xp1, y) - H(xm1, y)) * 0.5;
-    float dy = (H(x, yp1) - H(x, ym1)) * 0.5;
+    float dx = (smoothed_heights[xp1*N + y][c] - smoothed_heights[xm1*N + y][c]) * 0.5;
+    float dy = (smoothed_heights[x*N + yp1][c] - smoothed_heights[x*N + ym1][c]) * 0.5;
 
     return vec2(dx, dy);
 }
 
-vec2 gradH_perp(int x, int y) 
+vec2 gradH_perp(int x, int y, int c) 
 {
-    vec2 g = gradH(x, y);
+    vec2 g = gradH(x, y, c);
     return vec2(-g.y, g.x);
 }
 
-float a(int x, int y) {
-    vec2 g = gradH(x, y);
+float a(int x, int y, int c) {
+    vec2 g = gradH(x, y, c);
     return length(g);
 }
 
 vec2 F_50oV(int x, int y)
 {
-    float alpha = a(x, y);
-    return (1.0 - alpha) * V(x, y) + alpha * k_H_50 * gradH_perp(x, y);
+    float alpha = a(x, y, 0);
+    return (1.0 - alpha) * V(x, y) + alpha * k_H_50 * gradH_perp(x, y, 0);
 }
 
 vec2 F_200oV(int x, int y)
 {
-    float alpha = a(x, y);
-    return (1.0 - alpha) * V(x, y) + alpha * k_H_200 * gradH_perp(x, y);
+    float alpha = a(x, y, 1);
+    return (1.0 - alpha) * V(x, y) + alpha * k_H_200 * gradH_perp(x, y, 1);
 }
 
 // Final wind field
@@ -110,6 +119,7 @@ void main()
 
     vec2 wind_vec = W(coords.x, coords.y);
     wind_field[coords.x*N + coords.y] = wind_vec;
+    if (!compute_shadow) return;
 
     vec2 upwind = -normalize(wind_vec);
 
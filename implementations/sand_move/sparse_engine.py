@@ -0,0 +1,317 @@
+"""
+Seguimiento de actividad por tiles: las etapas solo se ejecutan donde la arena
+se movió hace poco.
+
+La grilla se divide en tiles de `tile` x `tile` celdas (32, como los work
+groups de los shaders). El transporte y la cascada marcan los tiles donde
+algo se movió (celdas que sueltan arena y celdas que la reciben; un flujo
+que entra y sale en la misma cantidad también cuenta). En el paso siguiente
+solo se procesan esos tiles más sus vecinos hasta `radio` tiles, con
+
+    radio = ceil(margen / tile),  margen = paged.margen(R_s, cell_size_m, cascade_iterations)
+
+el alcance de un paso completo. Es exacto: si nada se movió a menos de
+`margen` de una celda, el paso le da exactamente el mismo resultado que el
+anterior (mismas entradas, y el paso no depende del tiempo), así que nada se
+mueve ahí tampoco y sus buffers (arena, viento, máscaras) ya tienen el valor
+correcto para los vecinos que sí se procesan.
+
+Las alturas suavizadas H_50 y H_200 no entran en el margen: se recalculan
+sobre todo el grid (es barato) y los tiles donde cambian se marcan como
+activos, igual que si la arena se hubiera movido ahí. Como H_200 cambia hasta
+su radio alrededor de la arena que se mueve, con `smoothing_interval` > 1 los
+pasos sin recálculo procesan bastante menos. La sombra por barridos
+(shadow_mode "sweep") no tiene alcance acotado y no se admite.
+
+Cambiar un parámetro, cargar un checkpoint o reemplazar el terreno vuelve a
+marcar todo como activo. Si en un paso hay que procesar todos los tiles, las
+etapas corren como en NumpySandEngine: solo el transporte y la cascada siguen
+marcando la actividad, y dejan de hacerlo en cuanto todo queda marcado.
+"""
+import math
+from collections import deque
+
+import numpy as np
+
+from implementations.sand_move.cpu_engine import (
+    NumpySandEngine, VECINOS, wind_heightfield, wind_update, sticky_mask, sand_transport_destinos,
+    sand_levantada, _mover, sand_cascade, sand_cascade_flujo, sand_cascade_recoger,
+)
+from implementations.sand_move.paged import margen
+from implementations.sand_move.tiled_engine import alcance_transporte
+
+ACTIVITY_TILE = 32
+
+# Desplazamiento de cada dirección de VECINOS
+_DX = np.array([d[0] for d in VECINOS])
+_DY = np.array([d[1] for d in VECINOS])
+
+
+def radio_actividad(R_s, cell_size_m, cascade_iterations, tile=ACTIVITY_TILE, cascade_reach=2):
+    """Tiles alrededor de uno activo que hay que procesar en el paso siguiente."""
+    return math.ceil(margen(R_s, cell_size_m, cascade_iterations, cascade_reach) / tile)
+
+
+def dilatar(activos, radio):
+    """Dilatación (Chebyshev) de una máscara 2D de tiles."""
+    if radio <= 0:
+        return activos.copy()
+    n0, n1 = activos.shape
+    pad = np.pad(activos, radio)
+    # Primero por filas y después por columnas (la vecindad cuadrada es separable)
+    filas = np.zeros((n0, n1 + 2 * radio), dtype=bool)
+    for d in range(2 * radio + 1):
+        filas |= pad[d:d + n0, :]
+    out = np.zeros(activos.shape, dtype=bool)
+    for d in range(2 * radio + 1):
+        out |= filas[:, d:d + n1]
+    return out
+
+
+def regiones(mascara):
+    """
+    Rectángulos (t0, t1, u0, u1) en tiles que cubren la máscara: uno por
+    componente conexa, fusionando los que se solapan para que sean disjuntos.
+    """
+    n0, n1 = mascara.shape
+    visto = np.zeros_like(mascara)
+    cajas = []
+    for t, u in zip(*np.nonzero(mascara)):
+        if visto[t, u]:
+            continue
+        visto[t, u] = True
+        caja = [t, t + 1, u, u + 1]
+        cola = deque([(t, u)])
+        while cola:
+            a, b = cola.popleft()
+            caja = [min(caja[0], a), max(caja[1], a + 1), min(caja[2], b), max(caja[3], b + 1)]
+            for da in (-1, 0, 1):
+                for db in (-1, 0, 1):
+                    na, nb = a + da, b + db
+                    if 0 <= na < n0 and 0 <= nb < n1 and mascara[na, nb] and not visto[na, nb]:
+                        visto[na, nb] = True
+                        cola.append((na, nb))
+        cajas.append(caja)
+
+    fusionadas = True
+    while fusionadas:
+        fusionadas = False
+        for i in range(len(cajas)):
+            for j in range(i + 1, len(cajas)):
+                a, b = cajas[i], cajas[j]
+                if a[0] < b[1] and b[0] < a[1] and a[2] < b[3] and b[2] < a[3]:
+                    cajas[i] = [min(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3])]
+                    del cajas[j]
+                    fusionadas = True
+                    break
+            if fusionadas:
+                break
+    return [tuple(int(v) for v in c) for c in cajas]
+
+
+class SparseSandEngine(NumpySandEngine):
+    """
+    NumpySandEngine que solo procesa los tiles activos y sus vecinos, con el
+    mismo resultado bit a bit.
+
+    Cada etapa corre sobre los rectángulos de tiles a procesar más el halo
+    que la etapa lee (el mismo que en tiled_engine.py) y escribe solo los
+    rectángulos. `active_fraction` es la fracción de celdas procesadas en el
+    último paso y `dense` indica si el paso procesó el grid completo.
+    """
+
+    def __init__(self, bedrock, sand, obstacles, N=None, tile=ACTIVITY_TILE, **params):
+        super().__init__(bedrock, sand, obstacles, N, **params)
+        self.tile = tile
+        self.n_tiles = -(-self.N // tile)
+        self.activity = np.ones((self.n_tiles, self.n_tiles), dtype=bool)
+        self.regions = []
+        self.active_fraction = 1.0
+        self.dense = True
+        self._params_plan = None
+
+    def mark_all_active(self):
+        self.activity[:] = True
+
+    def _plan_params(self):
+        return (self.R_s, self.kb, self.repose_angle, self.transfer_rate, self.cascade_iterations,
+                self.cell_size_m, self.h_max, self.slope_deg_thresh, self.sand_transport_block_count,
+                tuple(self.origin))
+
+    def _planificar(self):
+        """Rectángulos (en celdas) a procesar en este paso, a partir de la actividad del anterior."""
+        params = self._plan_params()
+        if params != self._params_plan:
+            self.mark_all_active()
+            self._params_plan = params
+        radio = radio_actividad(self.R_s, self.cell_size_m, self.cascade_iterations, self.tile)
+        procesar = dilatar(self.activity, radio)
+        self.activity = np.zeros_like(self.activity)
+        T, N = self.tile, self.N
+        self.dense = bool(procesar.all())
+        if self.dense:
+            self.regions = [(0, N, 0, N)]
+        else:
+            self.regions = [(t0 * T, min(t1 * T, N), u0 * T, min(u1 * T, N)) for t0, t1, u0, u1 in regiones(procesar)]
+        celdas = sum((r1 - r0) * (c1 - c0) for r0, r1, c0, c1 in self.regions)
+        self.active_fraction = celdas / (N * N)
+
+    def _ventanas(self, halo):
+        """Por región: (slices de la ventana, slices de la región en la ventana, región, origen global)."""
+        N = self.N
+        for r0, r1, c0, c1 in self.regions:
+            wr0, wr1 = max(0, r0 - halo), min(N, r1 + halo)
+            wc0, wc1 = max(0, c0 - halo), min(N, c1 + halo)
+            yield ((slice(wr0, wr1), slice(wc0, wc1)),
+                   (slice(r0 - wr0, r1 - wr0), slice(c0 - wc0, c1 - wc0)),
+                   (slice(r0, r1), slice(c0, c1)),
+                   (self.origin[0] + wr0, self.origin[1] + wc0))
+
+    def _marcar(self, filas, columnas):
+        """Marca como activos los tiles de las celdas dadas (coordenadas globales)."""
+        self.activity[np.asarray(filas) // self.tile, np.asarray(columnas) // self.tile] = True
+
+    def _marcar_mascara(self, mascara, fila0, columna0):
+        """Marca los tiles de las celdas True de `mascara`, con esquina global (fila0, columna0)."""
+        if self.activity.all():
+            return
+        T = self.tile
+        a0, b0 = fila0 % T, columna0 % T
+        h, w = mascara.shape
+        if a0 == 0 and b0 == 0 and h % T == 0 and w % T == 0:
+            alineada = mascara
+        else:
+            alineada = np.zeros((-(-(a0 + h) // T) * T, -(-(b0 + w) // T) * T), dtype=bool)
+            alineada[a0:a0 + h, b0:b0 + w] = mascara
+        tiles = alineada.reshape(alineada.shape[0] // T, T, alineada.shape[1] // T, T).any(axis=(1, 3))
+        t0, u0 = fila0 // T, columna0 // T
+        self.activity[t0:t0 + tiles.shape[0], u0:u0 + tiles.shape[1]] |= tiles
+
+    def _marcar_cascada(self, sueltan, target, fila0, columna0):
+        """
+        Marca los tiles de las celdas que sueltan arena en la cascada y de los
+        vecinos que la reciben. Un vecino solo cae en otro tile si la celda está
+        en el borde de su tile, así que el destino se busca solo ahí.
+        """
+        self._marcar_mascara(sueltan, fila0, columna0)
+        T = self.tile
+        h, w = sueltan.shape
+        borde_f = np.nonzero((np.arange(fila0, fila0 + h) + 1) % T <= 1)[0]
+        borde_c = np.nonzero((np.arange(columna0, columna0 + w) + 1) % T <= 1)[0]
+        f1, c1 = np.nonzero(sueltan[borde_f, :])
+        f2, c2 = np.nonzero(sueltan[:, borde_c])
+        filas = np.concatenate([borde_f[f1], f2])
+        columnas = np.concatenate([c1, borde_c[c2]])
+        if filas.size:
+            k = target[filas, columnas]
+            self._marcar(np.clip(filas + _DY[k] + fila0, 0, self.N - 1),
+                         np.clip(columnas + _DX[k] + columna0, 0, self.N - 1))
+
+    # --- Etapas ---
+    def run_smooth_heights(self):
+        # Si ya está todo marcado el paso siguiente es denso: no hace falta comparar
+        if self.activity.all():
+            return super().run_smooth_heights()
+        antes = self.smoothed_heights.copy()
+        if not super().run_smooth_heights():
+            return False
+        cambio = (antes != self.smoothed_heights).any(axis=1).reshape(self.N, self.N)
+        self._marcar_mascara(cambio, 0, 0)
+        return True
+
+    def run_wind_shadow_sweep(self):
+        if self.shadow_mode == "sweep":
+            raise ValueError("La sombra por barridos no tiene alcance acotado: no se puede usar con el motor disperso")
+        return super().run_wind_shadow_sweep()
+
+    def run_wind_heightfield(self):
+        # Primera etapa del paso: decide qué se procesa
+        self._planificar()
+        if self.dense:
+            return super().run_wind_heightfield()
+        g = self._grid
+        for v, local, region, origen in self._ventanas(0):
+            g(self.wind_height_field)[region] = wind_heightfield(g(self.bedrock_slabs)[v], g(self.sand_slabs)[v],
+                                                                 origen)
+
+    def run_wind_update(self):
+        if self.dense:
+            return super().run_wind_update()
+        g = self._grid
+        for v, local, region, _ in self._ventanas(max(self.R_s, 1)):
+            W, S = wind_update(g(self.bedrock_slabs)[v], g(self.sand_slabs)[v], g(self.wind_height_field)[v],
+                               self.R_s, smoothed=g(self.smoothed_heights)[v])
+            g(self.wind_field)[region] = W[local]
+            g(self.wind_shadowing)[region] = S[local]
+
+    def run_sticky_mask(self):
+        if self.dense:
+            return super().run_sticky_mask()
+        g = self._grid
+        for v, local, region, _ in self._ventanas(self.R_s + 1):
+            sticky, erosion = sticky_mask(g(self.bedrock_slabs)[v], g(self.sand_slabs)[v], g(self.wind_field)[v],
+                                          self.R_s, self.cell_size_m, self.h_max, self.kb, self.slope_deg_thresh)
+            g(self.sticky_mask)[region] = sticky[local]
+            g(self.erosion_mask)[region] = erosion[local]
+
+    def run_sand_transport(self):
+        g = self._grid
+        resultados = []
+        for v, local, region, origen in self._ventanas(2 * alcance_transporte(self.R_s, self.cell_size_m)):
+            sand = g(self.sand_slabs)[v]
+            dest, quieta = sand_transport_destinos(g(self.obstacles)[v], g(self.wind_field)[v],
+                                                   g(self.wind_shadowing)[v], g(self.sticky_mask)[v], self.R_s,
+                                                   self.cell_size_m, origen)
+            levantada = sand_levantada(sand, g(self.erosion_mask)[v], quieta, self.sand_transport_block_count)
+            nueva = _mover(sand, levantada.ravel(), dest)
+
+            # Celdas que sueltan arena hacia otra y celdas que reciben de otra:
+            # lo recibido de otras es nueva - sand + lo que la celda soltó hacia otra
+            if not self.activity.all():
+                mueve = ((levantada.ravel() > 0) & (dest != np.arange(dest.size))).reshape(sand.shape)
+                recibe = (nueva.astype(np.int64) - sand + levantada * mueve) > 0
+                self._marcar_mascara(mueve | recibe, v[0].start, v[1].start)
+            resultados.append((region, nueva[local]))
+        # Todas las ventanas leen la arena de antes del transporte
+        for region, nueva in resultados:
+            g(self.sand_slabs)[region] = nueva
+
+    def _iteracion_cascada(self, tan_repose):
+        g = self._grid
+        if self.dense and self.activity.all():
+            # Grid completo y ya todo marcado: la iteración de NumpySandEngine
+            nueva, movidos = sand_cascade(g(self.bedrock_slabs), g(self.sand_slabs), g(self.obstacles), tan_repose,
+                                          self.transfer_rate, self.cell_size_m)
+            self.sand_slabs[:] = nueva.ravel()
+            return movidos
+        resultados = []
+        movidos = 0
+        for v, local, region, _ in self._ventanas(2):
+            sand = g(self.sand_slabs)[v]
+            cantidad, target = sand_cascade_flujo(g(self.bedrock_slabs)[v], sand, g(self.obstacles)[v], tan_repose,
+                                                  self.transfer_rate, self.cell_size_m)
+            nueva = sand_cascade_recoger(sand, cantidad, target)
+            movidos += int(cantidad[local].sum())
+            if not self.activity.all():
+                self._marcar_cascada(cantidad[local] > 0, target[local], region[0].start, region[1].start)
+            resultados.append((region, nueva[local]))
+        for region, nueva in resultados:
+            g(self.sand_slabs)[region] = nueva
+        return movidos
+
+    def run_sand_cascade(self):
+        tan_repose = float(np.tan(np.radians(self.repose_angle)))
+        movidos = 0
+        iteraciones = 0
+        for _ in range(self.cascade_iterations):
+            m = self._iteracion_cascada(tan_repose)
+            movidos += m
+            iteraciones += 1
+            if m <= self.cascade_tolerance:
+                break
+        self.last_cascade_iterations = iteraciones
+        return movidos
+
+    def load_checkpoint(self, path):
+        super().load_checkpoint(path)
+        self.mark_all_active()
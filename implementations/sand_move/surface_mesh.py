@@ -0,0 +1,69 @@
+from OpenGL import GL
+import numpy as np
+from utils.load_pipeline import load_pipeline, compute_program_pipeline
+from utils.gl_utils import SSBO
+
+
+class SurfaceMeshRenderer:
+    """
+    Render del heightfield como malla de superficie en vez de N*N cubos.
+
+    Un compute shader recorre el grid y emite solo las caras superiores (fusionadas
+    en tramos de igual altura a lo largo de j) y las paredes laterales expuestas,
+    como quads comprimidos en un SSBO. El conteo de vértices queda en un buffer de
+    comando indirecto, así que el dibujo no necesita leer nada de vuelta a la CPU.
+    La malla solo se regenera cuando cambia la arena (`dirty`).
+    """
+
+    def __init__(self, shader_path, N, group_size_x=32, group_size_y=32):
+        self.N = N
+        # Una cara superior por celda y a lo sumo dos paredes por borde entre celdas
+        self.max_quads = 5 * N * N + 8 * N
+        self.grid_blocks = ((N + group_size_x - 1) // group_size_x, (N + group_size_y - 1) // group_size_y)
+
+        self.mesh_compute = compute_program_pipeline(shader_path / "surface_mesh_compute.glsl")
+        self.pipeline = load_pipeline(shader_path / "surface_vs.glsl", shader_path / "surface_fs.glsl")
+
+        self.quads_ssbo = SSBO(None, self.max_quads * 16, GL.GL_DYNAMIC_DRAW)
+        self.command_ssbo = SSBO(self._comando_vacio(), 16, GL.GL_DYNAMIC_DRAW)
+
+        # El vertex shader no usa atributos, pero el core profile exige un VAO
+        self.vao = GL.glGenVertexArrays(1)
+        self.dirty = True
+
+    @staticmethod
+    def _comando_vacio():
+        # (count, instanceCount, first, baseInstance) de glDrawArraysIndirect
+        return np.array([0, 1, 0, 0], dtype=np.uint32)
+
+    def rebuild(self, bedrock_ssbo, sand_ssbo, obstacles_ssbo, topheight):
+        """Regenera la malla a partir del estado actual de los SSBOs."""
+        comando = self._comando_vacio()
+        self.command_ssbo.setup_SSBO(comando, comando.nbytes, GL.GL_DYNAMIC_DRAW)
+
+        self.mesh_compute.use()
+        self.mesh_compute["N"] = self.N
+        self.mesh_compute["topheight"] = topheight
+        self.mesh_compute["max_quads"] = self.max_quads
+        bedrock_ssbo.bind_SSBO_to_position(0)
+        sand_ssbo.bind_SSBO_to_position(1)
+        obstacles_ssbo.bind_SSBO_to_position(7)
+        self.quads_ssbo.bind_SSBO_to_position(8)
+        self.command_ssbo.bind_SSBO_to_position(9)
+        self.mesh_compute.dispatch(self.grid_blocks[0], self.grid_blocks[1], 1)
+        GL.glMemoryBarrier(GL.GL_SHADER_STORAGE_BARRIER_BIT | GL.GL_COMMAND_BARRIER_BIT)
+        self.dirty = False
+
+    def draw(self):
+        """Dibuja la malla. Las uniforms de cámara y luz se fijan antes en `pipeline`."""
+        self.pipeline["N"] = self.N
+        GL.glBindVertexArray(self.vao)
+        self.quads_ssbo.bind_SSBO_to_position(8)
+        GL.glBindBuffer(GL.GL_DRAW_INDIRECT_BUFFER, self.command_ssbo.get_SSBO_id())
+        GL.glDrawArraysIndirect(GL.GL_TRIANGLES, None)
+        GL.glBindBuffer(GL.GL_DRAW_INDIRECT_BUFFER, 0)
+        GL.glBindVertexArray(0)
+
+    def quad_count(self):
+        """Quads de la última malla (lee 4 bytes de la GPU, solo para debug)."""
+        return int(self.command_ssbo.read_data((4,), np.uint32)[0]) // 6
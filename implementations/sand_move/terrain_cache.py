@@ -0,0 +1,112 @@
+"""
+Caché en disco de terrenos generados.
+
+Cada entrada es un directorio con un `.npy` por array (sand, bedrock, obstacles)
+y un `params.json` con los parámetros de generación. Los `.npy` se abren con
+`mmap_mode="r"`, así que un arranque con la caché caliente solo mapea archivos.
+El tamaño total se limita desalojando las entradas usadas hace más tiempo (LRU
+por fecha de modificación del directorio, que se actualiza en cada acierto).
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("SAND_MOVE_CACHE_DIR", Path.home() / ".cache" / "sand_move" / "terrain"))
+DEFAULT_MAX_BYTES = 1 << 30  # 1 GiB
+
+
+class TerrainCache:
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(params):
+        """Hash estable de los parámetros de generación."""
+        canon = json.dumps(params, sort_keys=True, default=float)
+        return hashlib.sha1(canon.encode("utf-8")).hexdigest()
+
+    def _entry(self, params):
+        return self.directory / self.key(params)
+
+    def get(self, params):
+        """
+        Devuelve el terreno cacheado para `params` o None si no existe.
+
+        Returns:
+            dict: nombre -> np.memmap de solo lectura.
+        """
+        entry = self._entry(params)
+        if not (entry / "params.json").exists():
+            return None
+        try:
+            arrays = {f.stem: np.load(f, mmap_mode="r") for f in entry.glob("*.npy")}
+        except (OSError, ValueError) as e:
+            print(f"Entrada de caché corrupta ({entry.name}): {e}")
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+        os.utime(entry)  # marca de uso para el LRU
+        return arrays
+
+    def put(self, params, arrays):
+        """Guarda `arrays` (dict nombre -> np.ndarray) bajo `params`."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry = self._entry(params)
+
+        # Escribimos en un directorio temporal y lo renombramos para que otro
+        # proceso nunca vea una entrada a medio escribir.
+        tmp = Path(tempfile.mkdtemp(dir=self.directory, prefix=".tmp-"))
+        try:
+            for name, data in arrays.items():
+                np.save(tmp / f"{name}.npy", np.ascontiguousarray(data))
+            with open(tmp / "params.json", "w") as f:
+                json.dump(params, f, sort_keys=True, indent=2, default=float)
+            if entry.exists():
+                shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+        except OSError as e:
+            print(f"No se pudo guardar el terreno en caché: {e}")
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self.evict()
+
+    def get_or_generate(self, params, generate):
+        """Devuelve el terreno cacheado o lo genera con `generate()` y lo guarda."""
+        arrays = self.get(params)
+        if arrays is not None:
+            return arrays
+        arrays = generate()
+        self.put(params, arrays)
+        return arrays
+
+    def entries(self):
+        """Entradas existentes como lista de (mtime, bytes, path), más antiguas primero."""
+        if not self.directory.exists():
+            return []
+        out = []
+        for entry in self.directory.iterdir():
+            if not entry.is_dir() or entry.name.startswith("."):
+                continue
+            size = sum(f.stat().st_size for f in entry.iterdir() if f.is_file())
+            out.append((entry.stat().st_mtime, size, entry))
+        return sorted(out)
+
+    def evict(self):
+        """Borra las entradas menos usadas hasta quedar bajo `max_bytes`."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        # La más reciente se conserva aunque por sí sola supere el límite
+        for _, size, entry in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,220 @@
+from OpenGL import GL
+import numpy as np
+from utils.load_pipeline import load_pipeline, compute_program_pipeline
+from utils.gl_utils import SSBO, RenderingInstance
+
+
+# --- FUNCIONES AUXILIARES (solo NumPy) ---
+def frustum_planes(view_proj):
+    """
+    Planos del frustum (a, b, c, d) extraídos de projection @ view, con la
+    normal hacia adentro: un punto p está dentro si a*x + b*y + c*z + d >= 0.
+    """
+    m = np.asarray(view_proj, dtype=np.float64)
+    planes = np.array([
+        m[3] + m[0],  # izquierda
+        m[3] - m[0],  # derecha
+        m[3] + m[1],  # abajo
+        m[3] - m[1],  # arriba
+        m[3] + m[2],  # near
+        m[3] - m[2],  # far
+    ])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+
+def aabb_visible(planes, bmin, bmax):
+    """
+    Test de AABBs contra el frustum (vectorizado).
+
+    Args:
+        bmin, bmax (np.ndarray): Esquinas (k, 3) de cada caja.
+
+    Returns:
+        np.ndarray: Máscara (k,) de cajas al menos parcialmente dentro.
+    """
+    visible = np.ones(len(bmin), dtype=bool)
+    for a, b, c, d in planes:
+        # Vértice positivo: la esquina más adentro según la normal del plano
+        px = np.where(a >= 0, bmax[:, 0], bmin[:, 0])
+        py = np.where(b >= 0, bmax[:, 1], bmin[:, 1])
+        pz = np.where(c >= 0, bmax[:, 2], bmin[:, 2])
+        visible &= (a * px + b * py + c * pz + d) >= 0
+    return visible
+
+
+def max_pyramid(heights):
+    """Pirámide de máximos 2x2: [heights, heights/2, ..., 1x1]."""
+    levels = [heights]
+    while levels[-1].shape[0] > 1:
+        h = levels[-1]
+        levels.append(np.maximum.reduce([h[0::2, 0::2], h[0::2, 1::2], h[1::2, 0::2], h[1::2, 1::2]]))
+    return levels
+
+
+class ChunkQuadtree:
+    """
+    Quadtree de chunks sobre el grid N x N para culling y selección de LOD.
+
+    Las hojas son chunks de `chunk_size` x `chunk_size` celdas; sus cotas en
+    altura vienen de la pirámide de máximos. Un nodo se subdivide mientras la
+    cámara esté a menos de `lod_distance` veces su tamaño; si no, se dibuja
+    entero con chunk_size^2 columnas de `step` = tamaño/chunk_size celdas.
+    """
+
+    def __init__(self, N, chunk_size=64, lod_distance=2.0):
+        if N & (N - 1) or chunk_size & (chunk_size - 1) or chunk_size > N:
+            raise ValueError("El render LOD necesita N y chunk_size potencias de 2 con chunk_size <= N")
+        self.N = N
+        self.chunk_size = chunk_size
+        self.lod_distance = lod_distance
+        self.n_chunks = N // chunk_size
+        self.depth = int(np.log2(self.n_chunks))
+        self.node_max = max_pyramid(np.zeros((self.n_chunks, self.n_chunks), dtype=np.float32))
+
+    def update_bounds(self, chunk_max):
+        """`chunk_max` (n_chunks, n_chunks): altura máxima de cada chunk."""
+        self.node_max = max_pyramid(np.asarray(chunk_max, dtype=np.float32))
+
+    def _aabb(self, ni, nj, size, hmax):
+        # Columnas centradas en (i - N/2, j - N/2), de ancho 1
+        x0 = ni * size - self.N * 0.5 - 0.5
+        z0 = nj * size - self.N * 0.5 - 0.5
+        bmin = np.stack([x0, np.zeros_like(x0), z0], axis=1)
+        bmax = np.stack([x0 + size, hmax, z0 + size], axis=1)
+        return bmin, bmax
+
+    def select(self, view_proj, cam_pos):
+        """
+        Recorre el quadtree nivel por nivel (vectorizado) y devuelve los nodos a dibujar.
+
+        Returns:
+            tuple: (items (k, 4) uint32 con (i0, j0, step, nivel), nodos descartados por culling)
+        """
+        planes = frustum_planes(view_proj)
+        cam = np.asarray(cam_pos, dtype=np.float64)
+        items = []
+        culled = 0
+
+        ni = np.zeros(1, dtype=np.int64)
+        nj = np.zeros(1, dtype=np.int64)
+        for lvl in range(self.depth, -1, -1):
+            if len(ni) == 0:
+                break
+            size = self.chunk_size << lvl
+            hmax = self.node_max[lvl][ni, nj].astype(np.float64)
+            bmin, bmax = self._aabb(ni, nj, size, hmax)
+
+            visible = aabb_visible(planes, bmin, bmax)
+            culled += int((~visible).sum())
+            ni, nj, bmin, bmax = ni[visible], nj[visible], bmin[visible], bmax[visible]
+
+            # Distancia de la cámara a la caja
+            dist = np.linalg.norm(np.clip(cam, bmin, bmax) - cam, axis=1)
+            split = (dist < self.lod_distance * size) if lvl > 0 else np.zeros(len(ni), dtype=bool)
+
+            keep = ~split
+            step = size // self.chunk_size
+            draw_level = int(np.log2(step))
+            k = int(keep.sum())
+            if k:
+                items.append(np.stack([ni[keep] * size, nj[keep] * size,
+                                       np.full(k, step), np.full(k, draw_level)], axis=1))
+
+            # Hijos de los nodos subdivididos
+            si, sj = ni[split], nj[split]
+            ni = np.concatenate([2 * si, 2 * si, 2 * si + 1, 2 * si + 1])
+            nj = np.concatenate([2 * sj, 2 * sj + 1, 2 * sj, 2 * sj + 1])
+
+        if not items:
+            return np.zeros((0, 4), dtype=np.uint32), culled
+        return np.concatenate(items).astype(np.uint32), culled
+
+
+class TerrainLODRenderer:
+    """
+    Render por chunks con frustum culling y LOD a partir de la pirámide de máximos.
+
+    La pirámide se construye en la GPU después de cada paso de simulación; a la
+    CPU solo vuelve el nivel de los chunks ((N/chunk_size)^2 floats) para las cotas
+    del quadtree. Cada frame se eligen los nodos visibles y se dibujan todos en un
+    solo draw instanciado.
+    """
+
+    def __init__(self, shader_path, N, cube_data, chunk_size=64, lod_distance=2.0, group_size_x=32, group_size_y=32):
+        self.N = N
+        self.quadtree = ChunkQuadtree(N, chunk_size, lod_distance)
+        self.chunk_size = chunk_size
+        self.group_size = (group_size_x, group_size_y)
+        self.n_indices = len(cube_data["indices"])
+
+        self.pyramid_compute = compute_program_pipeline(shader_path / "height_pyramid_compute.glsl")
+        self.pipeline = load_pipeline(shader_path / "terrain_lod_vs.glsl", shader_path / "terrain_fs.glsl")
+
+        # Niveles 1..log2(N) de la pirámide, (cima, bedrock) por celda
+        self.n_levels = int(np.log2(N))
+        self.level_offsets = [0, 0]
+        for l in range(1, self.n_levels + 1):
+            self.level_offsets.append(self.level_offsets[-1] + (N >> l) ** 2)
+        self.pyramid_ssbo = SSBO(None, max(self.level_offsets[-1], 1) * 8, GL.GL_DYNAMIC_DRAW)
+        self.items_ssbo = SSBO(None, 16, GL.GL_DYNAMIC_DRAW)
+
+        # Cubo unitario sin atributos por instancia: todo sale de los SSBOs
+        self.cube = RenderingInstance()
+        self.cube.setup_vbo_buffer_data(cube_data["position_normals"].nbytes, cube_data["position_normals"], GL.GL_STATIC_DRAW)
+        self.cube.setup_vbo_attribs([0, 1], [3, 3], [GL.GL_FLOAT, GL.GL_FLOAT], [24, 24], [0, 12])
+        self.cube.setup_ibo_buffer_data(cube_data["indices"].nbytes, cube_data["indices"], GL.GL_STATIC_DRAW)
+
+        self.sources = None
+        self.dirty = True
+        self.n_items = 0
+        self.n_culled = 0
+
+    def rebuild(self, bedrock_ssbo, sand_ssbo, obstacles_ssbo, topheight):
+        """Reconstruye la pirámide en la GPU y actualiza las cotas de los chunks."""
+        self.sources = (bedrock_ssbo, sand_ssbo, obstacles_ssbo)
+        self.pyramid_compute.use()
+        self.pyramid_compute["N"] = self.N
+        self.pyramid_compute["topheight"] = topheight
+        bedrock_ssbo.bind_SSBO_to_position(0)
+        sand_ssbo.bind_SSBO_to_position(1)
+        obstacles_ssbo.bind_SSBO_to_position(7)
+        self.pyramid_ssbo.bind_SSBO_to_position(10)
+        for l in range(1, self.n_levels + 1):
+            n = self.N >> l
+            self.pyramid_compute["level"] = l
+            self.pyramid_compute.dispatch((n + self.group_size[0] - 1) // self.group_size[0],
+                                          (n + self.group_size[1] - 1) // self.group_size[1], 1)
+            GL.glMemoryBarrier(GL.GL_SHADER_STORAGE_BARRIER_BIT)
+
+        # Cotas por chunk: nivel log2(chunk_size) de la pirámide
+        chunk_level = int(np.log2(self.chunk_size))
+        n_chunks = self.quadtree.n_chunks
+        if chunk_level == 0:
+            chunk_max = np.full((n_chunks, n_chunks), np.float32(1e9))
+        else:
+            chunk_max = self.pyramid_ssbo.read_data((n_chunks, n_chunks, 2), np.float32,
+                                                    offset=self.level_offsets[chunk_level] * 8)[..., 0]
+        self.quadtree.update_bounds(chunk_max)
+        self.dirty = False
+
+    def draw(self, view_proj, cam_pos):
+        """Selecciona los nodos visibles y los dibuja. Las uniforms de cámara y luz se fijan antes en `pipeline`."""
+        items, self.n_culled = self.quadtree.select(view_proj, cam_pos)
+        self.n_items = len(items)
+        if self.n_items == 0:
+            return
+        self.items_ssbo.setup_SSBO(items, items.nbytes, GL.GL_STREAM_DRAW)
+
+        self.pipeline["N"] = self.N
+        self.pipeline["chunk_size"] = self.chunk_size
+        # Los chunks cercanos (nivel 0) leen directo de los SSBOs de la simulación
+        bedrock_ssbo, sand_ssbo, obstacles_ssbo = self.sources
+        bedrock_ssbo.bind_SSBO_to_position(0)
+        sand_ssbo.bind_SSBO_to_position(1)
+        obstacles_ssbo.bind_SSBO_to_position(7)
+        self.pyramid_ssbo.bind_SSBO_to_position(10)
+        self.items_ssbo.bind_SSBO_to_position(11)
+        self.cube.bind_all()
+        GL.glDrawElementsInstanced(GL.GL_TRIANGLES, self.n_indices, GL.GL_UNSIGNED_INT, None,
+                                   self.n_items * self.chunk_size * self.chunk_size)
+        self.cube.unbind_all()
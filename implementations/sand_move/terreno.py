@@ -0,0 +1,70 @@
+import numpy as np
+from implementations.sand_move.height_map_noise import generar_alturas, generar_obstaculos
+from implementations.sand_move.terrain_cache import TerrainCache
+
+# Terreno inicial de `sand_move`. Vive fuera de `app` para que el modo headless
+# (y el motor NumPy) puedan generarlo sin importar pyglet ni imgui.
+
+# --- CONFIGURACIÓN GLOBAL ---
+N = 512 
+
+top_sand_height = 12
+top_bedrock_height = 12
+
+# Parámetros de generación del terreno (también forman la clave de la caché)
+sand_noise_params = dict(scale=0.05, octaves=3, persistence=0.3, lacunarity=1.0, base=0, top_height=top_sand_height, tolerance=-0.5)
+bedrock_noise_params = dict(scale=0.15, octaves=3, persistence=0.7, lacunarity=1.0, base=1, top_height=top_bedrock_height, tolerance=-0.5)
+obstacles_noise_params = dict(scale=0.02, octaves=2, persistence=0.5, lacunarity=2.0, threshold=0.15, seed=42)
+
+# Versión del generador (height_map_noise y generar_terreno). Entra en la clave
+# de la caché: hay que subirla cada vez que cambie el terreno que se genera con
+# los mismos parámetros, para no servir terrenos viejos desde la caché.
+GENERATOR_VERSION = 1
+
+# Caché en disco de terrenos ya generados
+usar_cache_terreno = True
+terrain_cache = TerrainCache()
+
+def generar_terreno(n=None):
+    n = N if n is None else n
+    # 1. Generar mapas de altura
+    sand_heights = generar_alturas(n, **sand_noise_params)
+    bedrock_heights = generar_alturas(n, **bedrock_noise_params)
+    obstacles_data = generar_obstaculos(n, **obstacles_noise_params)
+
+    # 2. Convertir a uint32 planos para los buffers (truncando como int())
+    return {
+        "sand": sand_heights.astype(np.uint32).ravel(),
+        "bedrock": bedrock_heights.astype(np.uint32).ravel(),
+        "obstacles": obstacles_data.astype(np.uint32),
+    }
+
+def generar_tile(n, origin, shape):
+    """
+    Tile `shape` con esquina `origin` (fila, columna) del terreno de n x n, sin
+    generar el resto: el ruido solo depende de la coordenada global, así que
+    coincide celda a celda con `generar_terreno(n)`. Arrays 2D uint32.
+    """
+    sand_heights = generar_alturas(n, **sand_noise_params, origin=origin, shape=shape)
+    bedrock_heights = generar_alturas(n, **bedrock_noise_params, origin=origin, shape=shape)
+    obstacles_data = generar_obstaculos(n, **obstacles_noise_params, origin=origin, shape=shape)
+    return {
+        "sand": sand_heights.astype(np.uint32),
+        "bedrock": bedrock_heights.astype(np.uint32),
+        "obstacles": obstacles_data.astype(np.uint32).reshape(shape),
+    }
+
+# --- FUNCIÓN PARA GENERAR DATOS (Necesaria para el reinicio) ---
+def generar_datos_iniciales():
+    print("Generando terreno...")
+    if usar_cache_terreno:
+        params = {"generator_version": GENERATOR_VERSION, "N": N, "sand": sand_noise_params, "bedrock": bedrock_noise_params, "obstacles": obstacles_noise_params}
+        terreno = terrain_cache.get_or_generate(params, generar_terreno)
+    else:
+        terreno = generar_terreno()
+
+    # 3. Posiciones de cada columna (índice i*N + j)
+    ii, jj = np.meshgrid(np.arange(N, dtype=np.float32), np.arange(N, dtype=np.float32), indexing="ij")
+    model_matrices = np.stack([ii - N/2, jj - N/2], axis=-1).reshape(N*N, 2)
+    print("Terreno generado.")
+    return model_matrices, terreno["sand"], terreno["bedrock"], terreno["obstacles"]
@@ -0,0 +1,341 @@
+"""
+Motor NumPy multiproceso: la grilla se divide en tiles y cada proceso worker
+avanza el suyo con las mismas funciones de `cpu_engine`.
+
+Todo el estado vive en `multiprocessing.shared_memory`, un bloque por buffer,
+así que no hay copias entre procesos: en cada etapa un worker lee una ventana
+de la grilla global (su tile más un halo) directamente de la memoria
+compartida, ejecuta la etapa sobre la ventana y escribe solo su tile. El
+intercambio de halos es entonces la sincronización entre etapas: el proceso
+principal lanza cada etapa en todos los workers y espera a que terminen, de
+modo que la etapa siguiente lee los halos ya escritos por los vecinos.
+
+Ancho del halo por etapa (en celdas, con R_s los pasos de las marchas):
+- smooth_heights: el radio de la ventana de H_200.
+- wind_heightfield: 0 (por celda).
+- wind_update: R_s (marcha de la sombra; al menos 1 por el gradiente, y solo
+  1 con shadow_mode "sweep", que no hace la marcha).
+- sticky_mask: R_s + 1 (marcha hasta el cliff más el vecino del cliff).
+- sand_transport: 2 * alcance, con alcance = R_s * ceil(cell_size_m): una
+  celda del tile puede recibir arena de cualquier celda a menos de `alcance`,
+  y la marcha de esa celda llega hasta otro `alcance` más allá.
+- sand_cascade: 2 (el flujo de los vecinos depende de sus propios vecinos).
+Con shadow_mode "sweep" los barridos de sombra no tienen alcance acotado: se
+hacen sobre la grilla completa en el proceso principal, que ve la memoria
+compartida igual que los workers.
+Con esos halos cada tile da exactamente el mismo resultado que NumpySandEngine
+sobre la grilla completa: las celdas del borde de la ventana sí se calculan
+mal (los bordes locales se clampean como si fueran los globales), pero nunca
+influyen en el tile.
+
+En las etapas que leen y escriben la arena (transporte y cascada) los workers
+se esperan en una barrera entre la lectura de la ventana y la escritura del
+tile, para que ninguno pise arena que un vecino todavía no leyó.
+"""
+import os
+import traceback
+import weakref
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from implementations.sand_move.cpu_engine import (
+    NumpySandEngine, smoothed_heights, radios_suavizado, wind_heightfield, wind_update, sticky_mask,
+    sand_transport, sand_cascade_flujo, sand_cascade_recoger,
+)
+
+
+def dividir(n, partes):
+    """Límites [inicio, fin) de `partes` franjas lo más parejas posible."""
+    bordes = np.linspace(0, n, partes + 1).round().astype(int)
+    return list(zip(bordes[:-1], bordes[1:]))
+
+
+def tiles_de(N, tiles):
+    """(filas, columnas) de tiles -> lista de (r0, r1, c0, c1) sobre la grilla (N, N)."""
+    filas, columnas = tiles
+    return [(r0, r1, c0, c1) for r0, r1 in dividir(N, filas) for c0, c1 in dividir(N, columnas)]
+
+
+def alcance_transporte(R_s, cell_size_m):
+    """Distancia máxima (por eje) que recorre la marcha de sand_transport."""
+    return R_s * max(1, int(np.ceil(cell_size_m)))
+
+
+def ventana(tile, halo, N):
+    """
+    Returns:
+        tuple: (slices de la ventana en la grilla, slices del tile dentro de la
+        ventana, origen global de la ventana)
+    """
+    r0, r1, c0, c1 = tile
+    wr0, wr1 = max(0, r0 - halo), min(N, r1 + halo)
+    wc0, wc1 = max(0, c0 - halo), min(N, c1 + halo)
+    return ((slice(wr0, wr1), slice(wc0, wc1)),
+            (slice(r0 - wr0, r1 - wr0), slice(c0 - wc0, c1 - wc0)),
+            (wr0, wc0))
+
+
+def _core(tile):
+    r0, r1, c0, c1 = tile
+    return slice(r0, r1), slice(c0, c1)
+
+
+# --- Etapas en el worker ---
+# Cada una recibe los buffers como grillas (N, N[, 2]) sobre la memoria
+# compartida, el tile, los parámetros del paso y la barrera de los workers.
+
+def _etapa_smooth_heights(b, tile, p, barrier):
+    v, local, _ = ventana(tile, max(radios_suavizado(p["cell_size_m"])), b["N"])
+    S = smoothed_heights(b["bedrock_slabs"][v], b["sand_slabs"][v], p["cell_size_m"])
+    b["smoothed_heights"][_core(tile)] = S[local]
+
+
+def _etapa_wind_heightfield(b, tile, p, barrier):
+    core = _core(tile)
+    b["wind_height_field"][core] = wind_heightfield(b["bedrock_slabs"][core], b["sand_slabs"][core],
+                                                    origin=(p["origin"][0] + tile[0], p["origin"][1] + tile[2]))
+
+
+def _etapa_wind_update(b, tile, p, barrier):
+    marcha = p["shadow_mode"] == "march"
+    v, local, _ = ventana(tile, max(p["R_s"], 1) if marcha else 1, b["N"])
+    W, S = wind_update(b["bedrock_slabs"][v], b["sand_slabs"][v], b["wind_height_field"][v], p["R_s"],
+                       smoothed=b["smoothed_heights"][v], shadow=marcha)
+    core = _core(tile)
+    b["wind_field"][core] = W[local]
+    if marcha:
+        b["wind_shadowing"][core] = S[local]
+
+
+def _etapa_sticky_mask(b, tile, p, barrier):
+    v, local, _ = ventana(tile, p["R_s"] + 1, b["N"])
+    sticky, erosion = sticky_mask(b["bedrock_slabs"][v], b["sand_slabs"][v], b["wind_field"][v], p["R_s"],
+                                  p["cell_size_m"], p["h_max"], p["kb"], p["slope_deg_thresh"])
+    core = _core(tile)
+    b["sticky_mask"][core] = sticky[local]
+    b["erosion_mask"][core] = erosion[local]
+
+
+def _etapa_sand_transport(b, tile, p, barrier):
+    halo = 2 * alcance_transporte(p["R_s"], p["cell_size_m"])
+    v, local, origen = ventana(tile, halo, b["N"])
+    nueva = sand_transport(b["sand_slabs"][v], b["obstacles"][v], b["wind_field"][v], b["wind_shadowing"][v],
+                           b["sticky_mask"][v], b["erosion_mask"][v], p["R_s"], p["cell_size_m"],
+                           p["sand_transport_block_count"],
+                           origin=(p["origin"][0] + origen[0], p["origin"][1] + origen[1]))
+    barrier.wait()
+    b["sand_slabs"][_core(tile)] = nueva[local]
+
+
+def _etapa_sand_cascade(b, tile, p, barrier):
+    v, local, _ = ventana(tile, 2, b["N"])
+    sand = b["sand_slabs"][v]
+    cantidad, target = sand_cascade_flujo(b["bedrock_slabs"][v], sand, b["obstacles"][v],
+                                          p["tan_repose"], p["transfer_rate"], p["cell_size_m"])
+    nueva = sand_cascade_recoger(sand, cantidad, target)
+    movidos = int(cantidad[local].sum())
+    barrier.wait()
+    b["sand_slabs"][_core(tile)] = nueva[local]
+    return movidos
+
+
+ETAPAS = {
+    "smooth_heights": _etapa_smooth_heights,
+    "wind_heightfield": _etapa_wind_heightfield,
+    "wind_update": _etapa_wind_update,
+    "sticky_mask": _etapa_sticky_mask,
+    "sand_transport": _etapa_sand_transport,
+    "sand_cascade": _etapa_sand_cascade,
+}
+
+
+def _worker(tile, N, bloques, barrier, conn):
+    """Bucle del proceso worker: ejecuta etapas sobre su tile hasta recibir None."""
+    abiertos = []
+    buffers = {"N": N}
+    for attr, (nombre, shape, dtype) in bloques.items():
+        shm = shared_memory.SharedMemory(name=nombre)
+        abiertos.append(shm)
+        buffers[attr] = np.ndarray((N, N) + tuple(shape[1:]), dtype=dtype, buffer=shm.buf)
+    try:
+        while True:
+            mensaje = conn.recv()
+            if mensaje is None:
+                break
+            etapa, params = mensaje
+            try:
+                conn.send(("ok", ETAPAS[etapa](buffers, tile, params, barrier)))
+            except Exception:
+                # Libera a los demás workers que esperen en la barrera
+                barrier.abort()
+                conn.send(("error", traceback.format_exc()))
+    finally:
+        buffers.clear()
+        for shm in abiertos:
+            shm.close()
+        conn.close()
+
+
+def _detener(procesos, conexiones, bloques):
+    for conn in conexiones:
+        try:
+            conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+    for proceso in procesos:
+        proceso.join(timeout=5)
+        if proceso.is_alive():
+            proceso.terminate()
+            proceso.join()
+    for conn in conexiones:
+        conn.close()
+    for shm in bloques:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class TiledSandEngine(NumpySandEngine):
+    """
+    NumpySandEngine repartido en `workers` procesos, uno por tile.
+
+    Mismos buffers planos, parámetros, etapas (`run_*`), `step` y checkpoints
+    que NumpySandEngine, y el mismo resultado bit a bit; los buffers son vistas
+    sobre la memoria compartida. Hay que cerrarlo con `close()` (o usarlo con
+    `with`): detiene los workers y libera la memoria compartida, dejando en el
+    motor una copia privada del estado final.
+
+    Args:
+        workers (int): Procesos worker (por defecto os.cpu_count()).
+        tiles (tuple): (filas, columnas) de tiles; por defecto (workers, 1),
+            franjas de filas contiguas en memoria. Si se da, fija `workers`.
+        start_method (str): Método de multiprocessing ("fork", "spawn", ...).
+    """
+
+    def __init__(self, bedrock, sand, obstacles, N=None, workers=None, tiles=None, start_method=None,
+                 **params):
+        self._bloques = {}
+        super().__init__(bedrock, sand, obstacles, N, **params)
+
+        if tiles is None:
+            tiles = (workers or os.cpu_count() or 1, 1)
+        self.tiles = tuple(tiles)
+        self.workers = self.tiles[0] * self.tiles[1]
+        if min(self.tiles) < 1 or max(self.tiles) > self.N:
+            raise ValueError(f"Tiles {self.tiles} inválidos para una grilla de {self.N}")
+
+        ctx = mp.get_context(start_method)
+        barrier = ctx.Barrier(self.workers)
+        bloques = {attr: (shm.name, shape, dtype) for attr, (shm, shape, dtype) in self._bloques.items()}
+        self._procesos = []
+        self._conexiones = []
+        for tile in tiles_de(self.N, self.tiles):
+            local, remoto = ctx.Pipe()
+            proceso = ctx.Process(target=_worker, args=(tile, self.N, bloques, barrier, remoto),
+                                  name=f"TiledSandEngine-{len(self._procesos)}", daemon=True)
+            proceso.start()
+            remoto.close()
+            self._procesos.append(proceso)
+            self._conexiones.append(local)
+        self._finalizar = weakref.finalize(self, _detener, self._procesos, self._conexiones,
+                                           [shm for shm, _, _ in self._bloques.values()])
+
+    def _buffer(self, nombre, shape, dtype, data=None, copy=False):
+        shape = (shape,) if np.isscalar(shape) else tuple(shape)
+        dtype = np.dtype(dtype)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+        self._bloques[nombre] = (shm, shape, dtype.str)
+        arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        if data is None:
+            arr[...] = 0
+        else:
+            arr[...] = np.asarray(data, dtype=dtype).reshape(shape)
+        return arr
+
+    def _params(self):
+        return {
+            "R_s": int(self.R_s),
+            "cell_size_m": float(self.cell_size_m),
+            "h_max": float(self.h_max),
+            "kb": float(self.kb),
+            "slope_deg_thresh": float(self.slope_deg_thresh),
+            "sand_transport_block_count": int(self.sand_transport_block_count),
+            "tan_repose": float(np.tan(np.radians(self.repose_angle))),
+            "transfer_rate": float(self.transfer_rate),
+            "origin": (int(self.origin[0]), int(self.origin[1])),
+            "shadow_mode": self.shadow_mode,
+        }
+
+    def _ejecutar(self, etapa):
+        """Corre una etapa en todos los workers y devuelve sus resultados."""
+        if not self._finalizar.alive:
+            raise RuntimeError("El motor ya está cerrado")
+        params = self._params()
+        for conn in self._conexiones:
+            conn.send((etapa, params))
+        respuestas = []
+        for i, conn in enumerate(self._conexiones):
+            try:
+                respuestas.append(conn.recv())
+            except EOFError:
+                respuestas.append(("error", f"El worker {i} terminó inesperadamente"))
+        errores = [r[1] for r in respuestas if r[0] == "error"]
+        if errores:
+            # Con un worker caído la barrera queda rota: el motor no se puede seguir usando
+            self.close()
+            causa = next((e for e in errores if "BrokenBarrierError" not in e), errores[0])
+            raise RuntimeError(f"Falló un worker en {etapa}:\n{causa}")
+        return [r[1] for r in respuestas]
+
+    # --- Etapas ---
+    def run_smooth_heights(self):
+        if not self._toca_suavizar():
+            return False
+        self._ejecutar("smooth_heights")
+        self.smoothed_radii = radios_suavizado(self.cell_size_m)
+        return True
+
+    def run_wind_heightfield(self):
+        self._ejecutar("wind_heightfield")
+
+    def run_wind_update(self):
+        self._ejecutar("wind_update")
+
+    def run_sticky_mask(self):
+        self._ejecutar("sticky_mask")
+
+    def run_sand_transport(self):
+        self._ejecutar("sand_transport")
+
+    def run_sand_cascade(self):
+        """Igual que NumpySandEngine.run_sand_cascade, sumando lo movido en todos los tiles."""
+        movidos = 0
+        iteraciones = 0
+        for _ in range(self.cascade_iterations):
+            m = sum(self._ejecutar("sand_cascade"))
+            movidos += m
+            iteraciones += 1
+            if m <= self.cascade_tolerance:
+                break
+        self.last_cascade_iterations = iteraciones
+        return movidos
+
+    def close(self):
+        """Detiene los workers y pasa el estado a memoria privada antes de liberar la compartida."""
+        if not self._finalizar.alive:
+            return
+        for attr in self._bloques:
+            setattr(self, attr, np.array(getattr(self, attr)))
+        self._finalizar()
+        for shm, _, _ in self._bloques.values():
+            shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -1,21 +1,62 @@
 #!/usr/bin/env python3
+import time
+_t_inicio = time.perf_counter()
 
 import click
 import importlib
+import sys
 
-@click.group()
-def main_cli():
-    pass
+# Subcomandos registrados de forma perezosa: nombre -> "modulo:atributo".
+# El módulo solo se importa cuando el comando se usa (o se lista en --help).
+COMANDOS = {
+    "sand_move": "implementations.sand_move:sand_move",
+    "sand_bench": "implementations.sand_move:sand_bench",
+    # "refraction": "implementations.refraccion:refraction",
+}
 
-from implementations.sand_move import sand_move
-main_cli.add_command(sand_move)
+# Módulos que no deberían cargarse durante el arranque del CLI
+MODULOS_PESADOS = ("numpy", "pyglet", "OpenGL", "imgui", "noise")
 
-# from implementations.refraccion import refraction
-# main_cli.add_command(refraction)
 
-# from implementations.sand_move import sand_move
-# main_cli.add_command(sand_move)
+class LazyGroup(click.Group):
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = dict(lazy_commands or {})
+        self.import_times = {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_commands and cmd_name not in self.commands:
+            t0 = time.perf_counter()
+            module_name, attr = self.lazy_commands[cmd_name].split(":")
+            command = getattr(importlib.import_module(module_name), attr)
+            self.import_times[cmd_name] = time.perf_counter() - t0
+            self.add_command(command, cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+
+def reportar_arranque(group, budget_ms):
+    total_ms = (time.perf_counter() - _t_inicio) * 1000.0
+    print("--- Arranque del CLI ---", file=sys.stderr)
+    for name, t in group.import_times.items():
+        print(f"import {name}: {t * 1000.0:.1f} ms", file=sys.stderr)
+    cargados = [m for m in MODULOS_PESADOS if m in sys.modules]
+    print(f"Módulos pesados cargados: {', '.join(cargados) if cargados else 'ninguno'}", file=sys.stderr)
+    estado = "OK" if total_ms <= budget_ms else "EXCEDIDO"
+    print(f"Total: {total_ms:.1f} ms (presupuesto {budget_ms:.0f} ms) {estado}", file=sys.stderr)
+    print("------------------------", file=sys.stderr)
+
+
+@click.group(cls=LazyGroup, lazy_commands=COMANDOS, invoke_without_command=True, no_args_is_help=True)
+@click.option("--profile-startup", is_flag=True, help="Mide el tiempo de arranque del CLI (imports) antes de ejecutar el comando.")
+@click.option("--startup-budget-ms", default=250.0, show_default=True, help="Presupuesto de arranque para --profile-startup.")
+@click.pass_context
+def main_cli(ctx, profile_startup, startup_budget_ms):
+    if profile_startup:
+        reportar_arranque(ctx.command, startup_budget_ms)
 
 
 if __name__ == '__main__':
-    main_cli()
\ No newline at end of file
+    main_cli()
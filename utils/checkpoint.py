@@ -0,0 +1,229 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Formato de checkpoint: un solo archivo con varios arrays y un diccionario de
+# parámetros.
+#
+#   [MAGIC 8 bytes][versión u32][largo del header u32][header JSON][relleno]
+#   [datos del array 0 (alineado a ALIGN)][datos del array 1]...
+#
+# Cada array se guarda en chunks de `chunk_bytes` bytes, con su propio códec:
+# - "raw": los bytes tal cual, alineados a ALIGN, así que se pueden mapear a
+#   memoria (np.memmap) sin leerlos.
+# - "zlib": cada chunk comprimido por separado (se comprimen y descomprimen en
+#   paralelo, zlib suelta el GIL). Con `shuffle` los bytes de cada chunk se
+#   reordenan por posición dentro del elemento antes de comprimir: los bytes
+#   altos de alturas uint32 o de floats parecidos quedan juntos y forman
+#   corridas largas, que la estrategia Z_RLE comprime igual o mejor que la
+#   normal y bastante más rápido.
+#
+# Los arrays que casi no comprimen (p. ej. campos de viento en float) conviene
+# pasarlos en `raw`: comprimirlos cuesta más que escribirlos.
+#
+# El header guarda por array: dtype, shape, códec y la tabla de chunks
+# (offset, largo guardado, largo original), así que leer un array (o parte)
+# no requiere recorrer el archivo.
+
+MAGIC = b"SANDCKPT"
+VERSION = 1
+ALIGN = 4096
+CHUNK_BYTES = 4 << 20
+_PREFIJO = struct.Struct("<8sII")
+
+
+def _alinear(n, a=ALIGN):
+    return (n + a - 1) // a * a
+
+
+def shuffle_bytes(chunk, itemsize):
+    """Bytes de `chunk` (np.uint8) agrupados por posición dentro de cada elemento."""
+    if itemsize == 1:
+        return chunk
+    return np.ascontiguousarray(chunk.reshape(-1, itemsize).T).tobytes()
+
+
+def unshuffle_bytes(data, itemsize, out):
+    """Inversa de `shuffle_bytes`: escribe en `out` (np.uint8) los bytes en su orden original."""
+    if itemsize == 1:
+        out[:] = np.frombuffer(data, dtype=np.uint8)
+        return
+    out.reshape(-1, itemsize)[:] = np.frombuffer(data, dtype=np.uint8).reshape(itemsize, -1).T
+
+
+def _workers(workers):
+    return workers or min(8, os.cpu_count() or 1)
+
+
+def save_checkpoint(path, arrays, params=None, compress=True, raw=(), level=1, shuffle=True,
+                    chunk_bytes=CHUNK_BYTES, workers=None):
+    """
+    Guarda `arrays` (nombre -> array NumPy) y `params` (serializable a JSON).
+
+    Se escribe en un archivo temporal y se reemplaza al final, así que un
+    checkpoint anterior con el mismo nombre no queda a medio escribir si algo
+    falla.
+
+    Args:
+        compress (bool): "zlib" si es True, "raw" (mapeable) si es False.
+        raw (iterable): Nombres que se guardan "raw" aunque `compress` sea True.
+        level (int): Nivel de zlib (1 es el más rápido).
+        shuffle (bool): Reordenar bytes antes de comprimir.
+        chunk_bytes (int): Tamaño de los chunks sin comprimir (múltiplo de 16).
+    """
+    chunk_bytes = max(16, chunk_bytes // 16 * 16)
+    entradas = []
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        entradas.append((name, arr, arr.reshape(-1).view(np.uint8), compress and name not in raw))
+
+    header = {"params": params or {}, "arrays": {}}
+
+    def comprimir(tarea):
+        chunk, itemsize = tarea
+        data = shuffle_bytes(chunk, itemsize) if shuffle else chunk
+        c = zlib.compressobj(level, zlib.DEFLATED, 15, 9, zlib.Z_RLE)
+        return c.compress(data) + c.flush()
+
+    # 1. Comprimir todos los chunks (en paralelo)
+    bloques = {}
+    tareas = []
+    for name, arr, datos, comprimido in entradas:
+        chunks = [datos[i:i + chunk_bytes] for i in range(0, datos.size, chunk_bytes)]
+        bloques[name] = chunks
+        if comprimido:
+            tareas += [(name, i, (c, arr.itemsize)) for i, c in enumerate(chunks)]
+    with ThreadPoolExecutor(_workers(workers)) as pool:
+        for (name, i, _), bloque in zip(tareas, pool.map(comprimir, [t for _, _, t in tareas])):
+            bloques[name][i] = bloque
+
+    # 2. Header con los offsets relativos al inicio de la zona de datos
+    offset = 0
+    for name, arr, datos, comprimido in entradas:
+        offset = _alinear(offset)
+        tabla = []
+        for i, bloque in enumerate(bloques[name]):
+            largo = len(bloque)
+            tabla.append([offset, largo, min(chunk_bytes, datos.size - i * chunk_bytes)])
+            offset += largo
+        header["arrays"][name] = {
+            "dtype": arr.dtype.str,
+            "shape": list(arr.shape),
+            "codec": "zlib" if comprimido else "raw",
+            "shuffle": bool(shuffle and comprimido),
+            "chunks": tabla,
+        }
+    header_bytes = json.dumps(header).encode()
+    data_start = _alinear(_PREFIJO.size + len(header_bytes))
+
+    # 3. Escribir
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_PREFIJO.pack(MAGIC, VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, arr, datos, comprimido in entradas:
+            for (off, _, _), bloque in zip(header["arrays"][name]["chunks"], bloques[name]):
+                f.seek(data_start + off)
+                f.write(bloque)
+        f.truncate(data_start + offset)
+    os.replace(tmp, path)
+
+
+class Checkpoint:
+    """
+    Lectura de un checkpoint escrito con `save_checkpoint`.
+
+    El archivo se mapea a memoria: los arrays "raw" se devuelven como vistas
+    sobre el mapa (sin leer nada hasta que se usan) y los comprimidos se
+    descomprimen chunk a chunk. `read_into` vuelca un array directo a un buffer
+    de destino ya reservado (por ejemplo un SSBO mapeado), sin arrays
+    intermedios del tamaño completo.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_len = _PREFIJO.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} no es un checkpoint de sand_move")
+        if version > VERSION:
+            self.close()
+            raise ValueError(f"{path}: versión de checkpoint {version} no soportada (máx {VERSION})")
+        header = json.loads(self.map[_PREFIJO.size:_PREFIJO.size + header_len])
+        self.data_start = _alinear(_PREFIJO.size + header_len)
+        self.params = header["params"]
+        self.arrays = header["arrays"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        # Las vistas de arrays "raw" que sigan vivas mantienen el mapa abierto
+        try:
+            self.map.close()
+        except BufferError:
+            pass
+        self.file.close()
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def nbytes(self, name):
+        info = self.arrays[name]
+        return int(np.prod(info["shape"])) * np.dtype(info["dtype"]).itemsize
+
+    def array(self, name):
+        """Array completo: vista sobre el archivo si es "raw", copia descomprimida si no."""
+        info = self.arrays[name]
+        dtype = np.dtype(info["dtype"])
+        if info["codec"] == "raw" and info["chunks"]:
+            inicio = self.data_start + info["chunks"][0][0]
+            return np.frombuffer(self.map, dtype=dtype, count=int(np.prod(info["shape"])),
+                                 offset=inicio).reshape(info["shape"])
+        out = np.empty(info["shape"], dtype=dtype)
+        self.read_into(name, out.reshape(-1).view(np.uint8))
+        return out
+
+    def read_into(self, name, out, workers=None):
+        """
+        Escribe los bytes del array `name` en `out` (buffer escribible de
+        `nbytes(name)` bytes, p. ej. un np.uint8 sobre memoria mapeada).
+        """
+        info = self.arrays[name]
+        out = np.frombuffer(out, dtype=np.uint8) if not isinstance(out, np.ndarray) else out.reshape(-1).view(np.uint8)
+        if out.size != self.nbytes(name):
+            raise ValueError(f"{name}: el destino tiene {out.size} bytes y el array {self.nbytes(name)}")
+        itemsize = np.dtype(info["dtype"]).itemsize
+
+        destinos = []
+        pos = 0
+        for off, largo, original in info["chunks"]:
+            destinos.append((self.data_start + off, largo, out[pos:pos + original]))
+            pos += original
+
+        if info["codec"] == "raw":
+            for inicio, largo, dst in destinos:
+                dst[:] = np.frombuffer(self.map, dtype=np.uint8, count=largo, offset=inicio)
+            return
+
+        def descomprimir(tarea):
+            inicio, largo, dst = tarea
+            data = zlib.decompress(self.map[inicio:inicio + largo], bufsize=dst.size)
+            if info["shuffle"]:
+                unshuffle_bytes(data, itemsize, dst)
+            else:
+                dst[:] = np.frombuffer(data, dtype=np.uint8)
+
+        with ThreadPoolExecutor(_workers(workers)) as pool:
+            list(pool.map(descomprimir, destinos))
@@ -1,6 +1,7 @@
 from OpenGL import GL
 import numpy as np
 import ctypes
+from contextlib import contextmanager
 
 def setInstanceArrayAttribute(buffer_id, position, n_values, type, n_bytes, divisor, offset = 0):
     GL.glBindBuffer(GL.GL_ARRAY_BUFFER, buffer_id)
@@ -21,6 +22,7 @@ class SSBO:
 
     def __init__(self, data=None, n_bytes=None, usage=None):
         self.id = GL.glGenBuffers(1)
+        self.n_bytes = 0
         if n_bytes and usage:
             self.setup_SSBO(data, n_bytes, usage)
 
@@ -30,46 +32,93 @@ class SSBO:
         GL.glBindBuffer(GL.GL_SHADER_STORAGE_BUFFER, self.id)
         GL.glBufferData(GL.GL_SHADER_STORAGE_BUFFER, n_bytes, data, usage)
         GL.glBindBuffer(GL.GL_SHADER_STORAGE_BUFFER, 0)
+        self.n_bytes = n_bytes
+
+    def write(self, data, offset=0):
+        """Escribe `data` desde el byte `offset` sin reasignar el buffer (glBufferSubData)."""
+        data = np.ascontiguousarray(data)
+        self.bind_SSBO()
+        GL.glBufferSubData(GL.GL_SHADER_STORAGE_BUFFER, offset, data.nbytes, data)
+        self.unbind_SSBO()
+
+    def clear(self, offset=0, n_bytes=None):
+        """
+        Pone en cero `n_bytes` (por defecto hasta el final) desde `offset`. Es un
+        comando más de la GPU: no reasigna el buffer ni espera a que se deje de usar.
+        """
+        n_bytes = self.n_bytes - offset if n_bytes is None else n_bytes
+        self.bind_SSBO()
+        GL.glClearBufferSubData(GL.GL_SHADER_STORAGE_BUFFER, GL.GL_R32UI, offset, n_bytes,
+                                GL.GL_RED_INTEGER, GL.GL_UNSIGNED_INT, None)
+        self.unbind_SSBO()
 
     def bind_SSBO(self):
         GL.glBindBuffer(GL.GL_SHADER_STORAGE_BUFFER, self.id)
 
     def bind_SSBO_to_position(self, position):
         GL.glBindBufferBase(GL.GL_SHADER_STORAGE_BUFFER, position, self.id)
+
+    def bind_SSBO_range_to_position(self, position, offset, n_bytes):
+        # `offset` tiene que ser múltiplo de GL_SHADER_STORAGE_BUFFER_OFFSET_ALIGNMENT
+        GL.glBindBufferRange(GL.GL_SHADER_STORAGE_BUFFER, position, self.id, offset, n_bytes)
     
     def unbind_SSBO(self):
         GL.glBindBuffer(GL.GL_SHADER_STORAGE_BUFFER, 0)
 
     def get_SSBO_id(self):
         return self.id
+
+    @contextmanager
+    def map_write(self, n_bytes, offset=0):
+        """
+        Mapea un rango del buffer para escritura (descartando su contenido) y
+        entrega una vista np.uint8 sobre él. Al salir del `with` se desmapea.
+        """
+        self.bind_SSBO()
+        flags = GL.GL_MAP_WRITE_BIT | GL.GL_MAP_INVALIDATE_RANGE_BIT
+        ptr = GL.glMapBufferRange(GL.GL_SHADER_STORAGE_BUFFER, offset, n_bytes, flags)
+        if not ptr:
+            self.unbind_SSBO()
+            raise RuntimeError(f"No se pudo mapear el SSBO {self.id} para escritura")
+        try:
+            yield np.frombuffer((ctypes.c_ubyte * n_bytes).from_address(ptr), dtype=np.uint8)
+        finally:
+            self.bind_SSBO()
+            GL.glUnmapBuffer(GL.GL_SHADER_STORAGE_BUFFER)
+            self.unbind_SSBO()
+
+    def delete(self):
+        GL.glDeleteBuffers(1, [self.id])
+        self.id = 0
     
-    def read_data(self, shape, dtype):
+    def read_data(self, shape, dtype, offset=0):
         """
         Lee el contenido del buffer desde la GPU.
         
         Args:
             shape (tuple): La forma del array resultante (ej. (512, 512) o (N*N,)).
             dtype (type): El tipo de dato de numpy (ej. np.uint32, np.float32).
+            offset (int): Byte desde el que se empieza a leer.
             
         Returns:
             np.array: Un array de numpy con los datos leídos.
         """
         self.bind_SSBO()
+
+        # Calculamos el tamaño total en bytes
+        total_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
         
-        # Mapeamos el buffer de GPU a un puntero en memoria CPU (solo lectura)
-        ptr = GL.glMapBuffer(GL.GL_SHADER_STORAGE_BUFFER, GL.GL_READ_ONLY)
+        # Mapeamos solo el rango pedido a un puntero en memoria CPU (solo lectura)
+        ptr = GL.glMapBufferRange(GL.GL_SHADER_STORAGE_BUFFER, offset, total_bytes, GL.GL_MAP_READ_BIT)
         
         if not ptr:
             print(f"Error: No se pudo mapear el SSBO {self.id}")
             self.unbind_SSBO()
             return np.zeros(shape, dtype=dtype)
-
-        # Calculamos el tamaño total en bytes
-        total_bytes = np.prod(shape) * np.dtype(dtype).itemsize
         
-        # Copiamos los datos crudos a un array de numpy
+        # Copiamos los datos a un array de numpy (una sola copia, directo del puntero)
         try:
-            data = np.frombuffer(ctypes.string_at(ptr, size=total_bytes), dtype=dtype)
+            data = np.frombuffer((ctypes.c_ubyte * total_bytes).from_address(ptr), dtype=dtype).copy()
         except Exception as e:
             print(f"Error leyendo SSBO: {e}")
             data = np.zeros(np.prod(shape), dtype=dtype)
@@ -94,6 +143,135 @@ class SSBO:
         print("--------------------")
     
 
+class AsyncReadback:
+    """
+    Lectura asíncrona de un SSBO a la CPU sin detener el pipeline.
+
+    Mantiene un anillo de `ring_size` buffers de staging mapeados de forma
+    persistente. `request` encola una copia GPU->staging y un fence; `latest`
+    devuelve, sin bloquear, la lectura completada más reciente como vista NumPy
+    sobre la memoria mapeada (sin copias). La vista es válida hasta que su
+    buffer se reutiliza, es decir, durante las siguientes `ring_size - 1`
+    llamadas a `request`; si hace falta conservarla más tiempo, copiarla.
+    """
+
+    def __init__(self, n_bytes, ring_size=3):
+        self.n_bytes = n_bytes
+        self.ring_size = ring_size
+        flags = GL.GL_MAP_READ_BIT | GL.GL_MAP_PERSISTENT_BIT | GL.GL_MAP_COHERENT_BIT
+
+        self.ids = []
+        self.views = []
+        for _ in range(ring_size):
+            buffer_id = GL.glGenBuffers(1)
+            GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, buffer_id)
+            GL.glBufferStorage(GL.GL_COPY_WRITE_BUFFER, n_bytes, None, flags)
+            ptr = GL.glMapBufferRange(GL.GL_COPY_WRITE_BUFFER, 0, n_bytes, flags)
+            self.ids.append(buffer_id)
+            self.views.append(np.frombuffer((ctypes.c_ubyte * n_bytes).from_address(ptr), dtype=np.uint8))
+        GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, 0)
+
+        self.fences = [None] * ring_size
+        self.frames = [-1] * ring_size   # número de request guardado en cada slot
+        self.delivered = [True] * ring_size   # ya entregado por `poll`
+        self.next_slot = 0
+        self.n_requests = 0
+        self.latest_slot = None
+
+        print("Generated readback ring with ids", self.ids)
+
+    def request(self, ssbo, offset=0):
+        """Encola la copia de `n_bytes` de `ssbo` (desde `offset`) al siguiente slot."""
+        slot = self.next_slot
+        if self.fences[slot] is not None:
+            GL.glDeleteSync(self.fences[slot])
+        if slot == self.latest_slot:
+            # La copia nueva va a pisar la última lectura completada
+            self.latest_slot = None
+
+        # Las escrituras de los compute shaders tienen que verse en la copia
+        GL.glMemoryBarrier(GL.GL_BUFFER_UPDATE_BARRIER_BIT)
+        GL.glBindBuffer(GL.GL_COPY_READ_BUFFER, ssbo.get_SSBO_id())
+        GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, self.ids[slot])
+        GL.glCopyBufferSubData(GL.GL_COPY_READ_BUFFER, GL.GL_COPY_WRITE_BUFFER, offset, 0, self.n_bytes)
+        GL.glBindBuffer(GL.GL_COPY_READ_BUFFER, 0)
+        GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, 0)
+
+        self.fences[slot] = GL.glFenceSync(GL.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        self.frames[slot] = self.n_requests
+        self.delivered[slot] = False
+        self.n_requests += 1
+        self.next_slot = (slot + 1) % self.ring_size
+
+    def _ready(self, slot):
+        fence = self.fences[slot]
+        if fence is None:
+            return False
+        # Timeout 0: solo consulta, nunca espera
+        status = GL.glClientWaitSync(fence, 0, 0)
+        if status in (GL.GL_ALREADY_SIGNALED, GL.GL_CONDITION_SATISFIED):
+            GL.glDeleteSync(fence)
+            self.fences[slot] = None
+            return True
+        return False
+
+    def latest(self, shape, dtype):
+        """
+        Lectura completada más reciente, o None si todavía no hay ninguna.
+
+        Returns:
+            tuple: (vista NumPy con forma `shape`, número de request) o None.
+        """
+        for slot in range(self.ring_size):
+            if self.fences[slot] is not None and self._ready(slot):
+                if self.latest_slot is None or self.frames[slot] > self.frames[self.latest_slot]:
+                    self.latest_slot = slot
+
+        if self.latest_slot is None:
+            return None
+        n = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        return self.views[self.latest_slot][:n].view(dtype).reshape(shape), self.frames[self.latest_slot]
+
+    def can_request(self):
+        """True si el próximo `request` no pisa una copia que la GPU todavía no termina."""
+        slot = self.next_slot
+        return self.fences[slot] is None or self._ready(slot)
+
+    def poll(self, shape, dtype):
+        """
+        Todas las lecturas completadas que `poll` aún no entregó, en orden de
+        request (para no perder ninguna, a diferencia de `latest`).
+
+        Returns:
+            list: (vista NumPy con forma `shape`, número de request). Las vistas
+                tienen la misma validez que las de `latest`.
+        """
+        n = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        listos = []
+        for slot in range(self.ring_size):
+            if self.delivered[slot]:
+                continue
+            if self.fences[slot] is None or self._ready(slot):
+                listos.append(slot)
+        listos.sort(key=lambda slot: self.frames[slot])
+        out = []
+        for slot in listos:
+            self.delivered[slot] = True
+            out.append((self.views[slot][:n].view(dtype).reshape(shape), self.frames[slot]))
+        return out
+
+    def release(self):
+        for slot, buffer_id in enumerate(self.ids):
+            if self.fences[slot] is not None:
+                GL.glDeleteSync(self.fences[slot])
+            GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, buffer_id)
+            GL.glUnmapBuffer(GL.GL_COPY_WRITE_BUFFER)
+        GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, 0)
+        GL.glDeleteBuffers(len(self.ids), self.ids)
+        self.ids = []
+        self.views = []
+
+
 class RenderingInstance:
     def __init__(self):
         self.vao = GL.glGenVertexArrays(1)
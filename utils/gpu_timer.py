@@ -0,0 +1,92 @@
+from OpenGL import GL
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+import csv
+import time
+import numpy as np
+
+
+class GPUTimer:
+    """
+    Tiempos de GPU por etapa con timestamp queries.
+
+    Cada `scope(nombre)` deja un `glQueryCounter(GL_TIMESTAMP)` al inicio y otro
+    al final. Los resultados se recogen en `collect()` sin bloquear: solo se leen
+    las queries cuyo resultado ya está disponible (unos frames después). Por etapa
+    se guarda una ventana de las últimas `window` muestras, en milisegundos.
+
+    Además se guardan los intervalos crudos (etapa, t0, t1) en el reloj de la
+    GPU, para dibujarlos en una traza junto a los de CPU (ver utils.tracing).
+    """
+
+    def __init__(self, window=240, max_spans=100_000):
+        self.window = window
+        self.samples = OrderedDict()   # etapa -> deque de ms, en orden de aparición
+        self.spans = deque(maxlen=max_spans)
+        self.pending = deque()         # (etapa, query inicio, query fin)
+        self.free_queries = []
+        self.enabled = True
+
+    def _query(self):
+        if self.free_queries:
+            return self.free_queries.pop()
+        return GL.glGenQueries(1)
+
+    @contextmanager
+    def scope(self, stage):
+        if not self.enabled:
+            yield
+            return
+        q0 = self._query()
+        q1 = self._query()
+        GL.glQueryCounter(q0, GL.GL_TIMESTAMP)
+        try:
+            yield
+        finally:
+            GL.glQueryCounter(q1, GL.GL_TIMESTAMP)
+            self.pending.append((stage, q0, q1))
+            self.samples.setdefault(stage, deque(maxlen=self.window))
+
+    def collect(self):
+        """Lee los resultados ya disponibles (en orden de emisión) sin esperar a la GPU."""
+        while self.pending:
+            stage, q0, q1 = self.pending[0]
+            if not GL.glGetQueryObjectiv(q1, GL.GL_QUERY_RESULT_AVAILABLE):
+                break
+            t0 = GL.glGetQueryObjectui64v(q0, GL.GL_QUERY_RESULT)
+            t1 = GL.glGetQueryObjectui64v(q1, GL.GL_QUERY_RESULT)
+            self.samples[stage].append((int(t1) - int(t0)) * 1e-6)
+            self.spans.append((stage, int(t0), int(t1)))
+            self.free_queries.extend((q0, q1))
+            self.pending.popleft()
+
+    def stats(self):
+        """
+        Returns:
+            OrderedDict: etapa -> (n, min, promedio, p95) en ms de la ventana actual.
+        """
+        out = OrderedDict()
+        for stage, values in self.samples.items():
+            if not values:
+                continue
+            v = np.fromiter(values, dtype=np.float64)
+            out[stage] = (len(v), float(v.min()), float(v.mean()), float(np.percentile(v, 95)))
+        return out
+
+    def reset(self):
+        for values in self.samples.values():
+            values.clear()
+        self.spans.clear()
+
+    def clock_offset_ns(self):
+        """Diferencia aproximada time.perf_counter_ns() - reloj de timestamps de la GPU."""
+        gpu_now = int(GL.glGetInteger64v(GL.GL_TIMESTAMP))
+        return time.perf_counter_ns() - gpu_now
+
+    def export_csv(self, path):
+        """Escribe las estadísticas actuales (una fila por etapa) en `path`."""
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["stage", "n", "min_ms", "avg_ms", "p95_ms"])
+            for stage, (n, vmin, avg, p95) in self.stats().items():
+                writer.writerow([stage, n, f"{vmin:.4f}", f"{avg:.4f}", f"{p95:.4f}"])
@@ -1,4 +1,32 @@
 import pyglet
+import re
+from pathlib import Path
+
+_INCLUDE = re.compile(r'^\s*#include\s+"([^"]+)"\s*$', re.MULTILINE)
+
+
+def preprocesar(source, base_dir, defines=None, _vistos=None):
+    """
+    Resuelve `#include "archivo"` (relativo a `base_dir`) y agrega un `#define`
+    por cada entrada de `defines` justo después de la línea `#version`.
+    """
+    vistos = set() if _vistos is None else _vistos
+
+    def incluir(match):
+        path = (Path(base_dir) / match.group(1)).resolve()
+        if path in vistos:
+            return ""   # cada archivo se incluye una sola vez
+        vistos.add(path)
+        with open(path) as f:
+            return preprocesar(f.read(), path.parent, None, vistos)
+
+    source = _INCLUDE.sub(incluir, source)
+    if defines:
+        lineas = "".join(f"#define {name} {value}\n" for name, value in defines.items())
+        version, _, resto = source.partition("\n")
+        source = f"{version}\n{lineas}{resto}"
+    return source
+
 
 def load_pipeline(vertex_path, fragment_path):
     with open(vertex_path) as f:
@@ -12,8 +40,9 @@ def load_pipeline(vertex_path, fragment_path):
     return pyglet.graphics.shader.ShaderProgram(vert_shader, frag_shader)
 
 
-def compute_program_pipeline(compute_shader_path):
+def compute_program_pipeline(compute_shader_path, defines=None):
     with open(compute_shader_path) as f:
         compute_source_code = f.read()
 
-    return pyglet.graphics.shader.ComputeShaderProgram(compute_source_code)
\ No newline at end of file
+    compute_source_code = preprocesar(compute_source_code, Path(compute_shader_path).parent, defines)
+    return pyglet.graphics.shader.ComputeShaderProgram(compute_source_code)
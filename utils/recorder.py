@@ -0,0 +1,259 @@
+import json
+import os
+import queue
+import threading
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from utils.checkpoint import shuffle_bytes, unshuffle_bytes
+
+# Grabación de series de tiempo de un array (p. ej. la arena cada K pasos) en
+# un directorio de chunks:
+#
+#   meta.json           forma, dtype, códec y la lista de chunks con sus pasos
+#   chunk_000000.bin    `frames_per_chunk` frames comprimidos juntos
+#   ...
+#
+# Dentro de un chunk, con `delta=True` cada frame se guarda como XOR con el
+# anterior (el primero tal cual): entre pasos cercanos cambian pocas celdas,
+# así que casi todo queda en cero. Luego se reordenan los bytes por posición
+# dentro del elemento y se comprime con zlib (Z_RLE). Cada chunk se decodifica
+# solo, sin leer los anteriores.
+#
+# meta.json se reescribe (de forma atómica) después de cada chunk, así que una
+# grabación cortada a la mitad se puede leer hasta el último chunk completo.
+
+FORMAT = "sand_move-recording"
+VERSION = 1
+
+
+def _enteros(frames):
+    """Vista entera sin signo del mismo ancho (para hacer XOR también con floats)."""
+    return frames.view(np.dtype(f"u{frames.dtype.itemsize}"))
+
+
+def codificar_chunk(frames, delta=True, level=1):
+    """frames (F, ...) -> bytes comprimidos."""
+    datos = _enteros(np.ascontiguousarray(frames)).reshape(len(frames), -1)
+    if delta and len(datos) > 1:
+        datos = np.concatenate([datos[:1], datos[1:] ^ datos[:-1]])
+    c = zlib.compressobj(level, zlib.DEFLATED, 15, 9, zlib.Z_RLE)
+    return c.compress(shuffle_bytes(datos.reshape(-1).view(np.uint8), datos.itemsize)) + c.flush()
+
+
+def decodificar_chunk(data, n_frames, shape, dtype, delta=True):
+    """Inversa de `codificar_chunk`: devuelve un array (n_frames, *shape)."""
+    dtype = np.dtype(dtype)
+    out = np.empty((n_frames,) + tuple(shape), dtype=dtype)
+    unshuffle_bytes(zlib.decompress(data), dtype.itemsize, out.reshape(-1).view(np.uint8))
+    if delta and n_frames > 1:
+        enteros = _enteros(out).reshape(n_frames, -1)
+        np.bitwise_xor.accumulate(enteros, axis=0, out=enteros)
+    return out
+
+
+class FrameRecorder:
+    """
+    Graba frames en un hilo de fondo.
+
+    `push(step, frame)` copia el frame a una cola acotada de `queue_size`
+    elementos y vuelve enseguida; el hilo escritor arma los chunks, los
+    comprime y los escribe. Si la cola está llena hay contrapresión según
+    `on_full`:
+    - "drop": el frame se descarta y se cuenta en `dropped` (el llamador nunca
+      espera, útil con la ventana abierta).
+    - "block": se espera a que el escritor libere lugar (para no perder frames
+      en corridas batch).
+    En ningún caso la memoria crece sin límite: a lo más `queue_size` frames en
+    cola más los del chunk que se está armando.
+
+    Args:
+        path (str | Path): Directorio de la grabación (se crea si no existe).
+        shape (tuple): Forma de cada frame.
+        dtype: dtype de cada frame.
+        static (dict): Arrays fijos que se guardan una vez como .npy (p. ej. bedrock).
+        attrs (dict): Metadatos libres que se guardan en meta.json.
+    """
+
+    def __init__(self, path, shape, dtype, frames_per_chunk=16, queue_size=8, on_full="drop",
+                 delta=True, level=1, static=None, attrs=None):
+        if on_full not in ("drop", "block"):
+            raise ValueError(f"on_full debe ser 'drop' o 'block', no {on_full!r}")
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.frames_per_chunk = frames_per_chunk
+        self.on_full = on_full
+        self.delta = delta
+        self.level = level
+
+        self.meta = {
+            "format": FORMAT,
+            "version": VERSION,
+            "shape": list(self.shape),
+            "dtype": self.dtype.str,
+            "codec": "zlib",
+            "delta": "xor" if delta else None,
+            "frames_per_chunk": frames_per_chunk,
+            "static": {},
+            "attrs": attrs or {},
+            "chunks": [],
+        }
+        for name, arr in (static or {}).items():
+            np.save(self.path / f"{name}.npy", arr)
+            self.meta["static"][name] = f"{name}.npy"
+        self._escribir_meta()
+
+        self.recorded = 0       # frames ya escritos a disco
+        self.dropped = 0        # frames descartados por cola llena
+        self.bytes_written = 0
+        self.error = None
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._escritor, name="FrameRecorder", daemon=True)
+        self._thread.start()
+        self._closed = False
+
+    @property
+    def queued(self):
+        return self._queue.qsize()
+
+    def push(self, step, frame):
+        """
+        Encola una copia de `frame` tomada en el paso `step`.
+
+        Returns:
+            bool: False si el frame se descartó por cola llena.
+        """
+        if self._closed:
+            raise RuntimeError("El grabador ya está cerrado")
+        if self.error is not None:
+            raise RuntimeError("Falló el escritor de la grabación") from self.error
+        frame = np.asarray(frame)
+        if frame.size != int(np.prod(self.shape)) or frame.dtype != self.dtype:
+            raise ValueError(f"Frame {frame.dtype} {frame.shape}, se esperaba {self.dtype} {self.shape}")
+        # Si la cola está llena no se copia nada
+        if self.on_full == "drop" and self._queue.full():
+            self.dropped += 1
+            return False
+        item = (int(step), frame.reshape(self.shape).copy())
+        if self.on_full == "block":
+            self._queue.put(item)
+            return True
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def close(self):
+        """Escribe el último chunk (aunque esté incompleto) y espera al escritor."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise RuntimeError("Falló el escritor de la grabación") from self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # --- Hilo escritor ---
+    def _escritor(self):
+        pasos = []
+        frames = []
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue    # se vacía la cola para que push nunca quede esperando
+            pasos.append(item[0])
+            frames.append(item[1])
+            if len(frames) == self.frames_per_chunk:
+                self._escribir_chunk(pasos, frames)
+                pasos, frames = [], []
+        if frames and self.error is None:
+            self._escribir_chunk(pasos, frames)
+
+    def _escribir_chunk(self, pasos, frames):
+        try:
+            data = codificar_chunk(np.stack(frames), self.delta, self.level)
+            nombre = f"chunk_{len(self.meta['chunks']):06d}.bin"
+            with open(self.path / nombre, "wb") as f:
+                f.write(data)
+            self.meta["chunks"].append({"file": nombre, "steps": pasos, "bytes": len(data)})
+            self._escribir_meta()
+            self.recorded += len(frames)
+            self.bytes_written += len(data)
+        except Exception as e:
+            self.error = e
+
+    def _escribir_meta(self):
+        tmp = self.path / "meta.json.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.path / "meta.json")
+
+
+class Recording:
+    """
+    Lectura de una grabación de `FrameRecorder`.
+
+    `steps` tiene el paso de cada frame; `frame(i)` decodifica el chunk que lo
+    contiene (el último chunk leído queda en caché, así que recorrer en orden
+    decodifica cada chunk una sola vez).
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "meta.json") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT:
+            raise ValueError(f"{path} no es una grabación de sand_move")
+        self.shape = tuple(self.meta["shape"])
+        self.dtype = np.dtype(self.meta["dtype"])
+        self.attrs = self.meta["attrs"]
+        self.steps = [s for c in self.meta["chunks"] for s in c["steps"]]
+        self._inicio = np.cumsum([0] + [len(c["steps"]) for c in self.meta["chunks"]])
+        self._cache = (None, None)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def static(self, name):
+        return np.load(self.path / self.meta["static"][name])
+
+    def chunk(self, c):
+        """Frames del chunk c como array (F, *shape)."""
+        if self._cache[0] == c:
+            return self._cache[1]
+        info = self.meta["chunks"][c]
+        with open(self.path / info["file"], "rb") as f:
+            data = f.read()
+        frames = decodificar_chunk(data, len(info["steps"]), self.shape, self.dtype,
+                                   self.meta["delta"] == "xor")
+        self._cache = (c, frames)
+        return frames
+
+    def frame(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        c = int(np.searchsorted(self._inicio, i, side="right")) - 1
+        return self.chunk(c)[i - self._inicio[c]]
+
+    def __iter__(self):
+        for c in range(len(self.meta["chunks"])):
+            for paso, frame in zip(self.meta["chunks"][c]["steps"], self.chunk(c)):
+                yield paso, frame
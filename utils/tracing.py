@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+import time
+
+
+class _NullSpan:
+    """Span vacío que se devuelve cuando el tracing está apagado (sin costo)."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "cat", "args", "t0")
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer._record(self.name, self.cat, self.t0, time.perf_counter_ns(), self.args)
+        return False
+
+
+class Tracer:
+    """
+    Trazas de CPU por spans anidados, exportables al formato de eventos de
+    Chrome (chrome://tracing, Perfetto).
+
+    Con `enabled = False` (por defecto) `span()` devuelve siempre el mismo
+    objeto vacío, así que instrumentar el código no cuesta nada medible. Los
+    spans se guardan como eventos completos ("X") con el hilo que los emitió;
+    el anidamiento sale solo de los tiempos.
+    """
+
+    def __init__(self, max_events=1_000_000):
+        self.enabled = False
+        self.max_events = max_events
+        self.events = []
+        self.dropped = 0
+        self.pid = os.getpid()
+        self.t_origin = time.perf_counter_ns()
+
+    def span(self, name, cat="sand_move", **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, cat, args or None)
+
+    def traced(self, name=None, cat="sand_move"):
+        """Decorador: cada llamada a la función queda como un span."""
+        def decorador(fn):
+            nombre = name or fn.__qualname__
+
+            def envoltura(*a, **kw):
+                with self.span(nombre, cat):
+                    return fn(*a, **kw)
+            envoltura.__name__ = fn.__name__
+            envoltura.__qualname__ = fn.__qualname__
+            envoltura.__doc__ = fn.__doc__
+            return envoltura
+        return decorador
+
+    def _record(self, name, cat, t0, t1, args):
+        if len(self.events) >= self.max_events:
+            self.dropped += 1
+            return
+        self.events.append((name, cat, t0, t1, threading.get_ident(), args))
+
+    def start(self):
+        self.clear()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    def clear(self):
+        self.events = []
+        self.dropped = 0
+
+    def to_chrome_trace(self, gpu_spans=None, gpu_offset_ns=0):
+        """
+        Eventos en formato de Chrome (tiempos en microsegundos).
+
+        Args:
+            gpu_spans (iterable): (etapa, t0_ns, t1_ns) en el reloj de la GPU, que
+                se dibujan en un proceso aparte "GPU" junto a los de CPU.
+            gpu_offset_ns (int): Diferencia perf_counter_ns - reloj GPU.
+        """
+        us = lambda t: (t - self.t_origin) / 1000.0
+        eventos = [
+            {"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": "CPU"}},
+        ]
+        for name, cat, t0, t1, tid, args in self.events:
+            ev = {"name": name, "cat": cat, "ph": "X", "ts": us(t0), "dur": (t1 - t0) / 1000.0,
+                  "pid": self.pid, "tid": tid}
+            if args:
+                ev["args"] = args
+            eventos.append(ev)
+
+        if gpu_spans:
+            gpu_pid = self.pid + 1
+            eventos.append({"name": "process_name", "ph": "M", "pid": gpu_pid, "args": {"name": "GPU"}})
+            for stage, t0, t1 in gpu_spans:
+                eventos.append({"name": stage, "cat": "gpu", "ph": "X", "ts": us(t0 + gpu_offset_ns),
+                                "dur": (t1 - t0) / 1000.0, "pid": gpu_pid, "tid": 0})
+        return {"traceEvents": eventos, "displayTimeUnit": "ms",
+                "otherData": {"dropped_events": self.dropped}}
+
+    def export(self, path, gpu_spans=None, gpu_offset_ns=0):
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(gpu_spans, gpu_offset_ns), f)
+        return len(self.events)
+
+
+# Tracer global del proceso
+tracer = Tracer()